@@ -0,0 +1,627 @@
+"""
+Boba BI API - Shared Server State
+Data, agent system and response payloads used by both the Flask and ASGI servers
+"""
+
+import os
+import json
+import hashlib
+import functools
+import threading
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Any, Callable, Hashable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from boba_bi import (
+    BobaBI,
+    horizon_dates,
+    analyze_traffic_patterns,
+    generate_synthetic_pos_data,
+    generate_employee_data,
+    week_start,
+    ANTHROPIC_API_KEY,
+    STAFFING_MODEL,
+    SHOP_TIMEZONE
+)
+from single_flight import SingleFlight, schedule_request_key
+from llm_limiter import shared_limiter
+from data_store import VersionedStore
+from http_cache import ResponseCache
+from traffic_cube import TrafficCube, build_traffic_cube, buckets_from_transactions, plan_query
+from pos_ingest import PosIngestor
+from scenarios import run_scenarios
+from schedule_repair import repair_schedule
+from schedule_history import ScheduleHistory, HISTORY_PAGE_SIZE, MAX_HISTORY_PAGE_SIZE
+from traffic_anomalies import TrafficAnomalyDetector
+from demand_sketches import DemandSketches, DEFAULT_STORE, parse_percentile
+from precompute import PrecomputeScheduler, ResultCache, SharedResults, PRECOMPUTE_ENABLED
+
+# ============================================================================
+# INITIALIZATION (Lazy, on first use)
+# ============================================================================
+
+# Importing this module is cheap: the POS data, roster and agent system are
+# built by initialize(), which the servers call on startup and every helper
+# below calls on first use. pos_data, employees, boba_bi, pos_ingestor,
+# schedule_history, anomaly_detector, demand_sketches, precompute and shared_results are also
+# reachable as module attributes (api_common.boba_bi) and initialize on first access.
+_LAZY_STATE = ('pos_data', 'employees', 'boba_bi', 'pos_ingestor', 'schedule_history', 'anomaly_detector',
+               'demand_sketches', 'precompute', 'shared_results')
+_init_lock = threading.Lock()
+_initialized = False
+
+DEFAULT_SCHEDULE_QUERY = 'Generate optimal schedule for next week'
+
+# Identical concurrent schedule requests share one orchestrator run
+schedule_flight = SingleFlight()
+
+# Finished orchestrator results by schedule_request_key(), filled on demand and
+# by the off-peak precompute; a data change yields a new key. Results are
+# computed without touching the schedule history and recorded the first time
+# a caller is actually served them, so precomputed drafts never count as
+# real schedules (or against weekly hour caps) until someone asks for them.
+# Workers on shared POS data also publish results to shared_results, so the
+# draft the precompute owner built is served by every worker.
+schedule_results = ResultCache()
+_unrecorded: set = set()
+_unrecorded_lock = threading.Lock()
+
+# Serialized read responses, reused until the data version changes
+response_cache = ResponseCache()
+
+# Prefix-sum traffic index, rebuilt lazily when the POS data version changes
+# and updated incrementally by POS batch ingestion
+_cube_lock = threading.Lock()
+_cube: Tuple[Hashable, Optional[TrafficCube]] = (None, None)
+
+
+def initialize():
+    """Build the shared data and agent system (runs once; thread-safe)"""
+    global _initialized, _cube, pos_data, employees, boba_bi, pos_ingestor, schedule_history, anomaly_detector, \
+        demand_sketches, precompute, shared_results
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        print("🚀 Initializing Boba BI API Server...")
+
+        # Generate synthetic data (in production, load from database); versioned so
+        # caches can tell when it changes. With BOBA_BI_SHARED_POS=1 every worker
+        # attaches read-only to the columns published by `python shared_pos.py publish`
+        # instead of building a private copy.
+        # Only then can workers share computed results: private synthetic data differs per process.
+        if os.getenv('BOBA_BI_SHARED_POS', '').lower() in ('1', 'true', 'yes'):
+            from shared_pos import SharedPosView
+            pos_data = SharedPosView()
+            shared_results = SharedResults()
+        else:
+            pos_data = VersionedStore(generate_synthetic_pos_data(weeks=100))
+            shared_results = None
+        employees = VersionedStore(generate_employee_data(num_employees=10))
+
+        # Generated schedules (SCHEDULE_HISTORY_PATH, in memory by default)
+        schedule_history = ScheduleHistory()
+
+        # Traffic anomalies and demand percentiles: replay the hourly history
+        # once, then follow live batches
+        cube = build_traffic_cube(pos_data)
+        _cube = (pos_data.version, cube)
+        first_hour, hourly = cube.hourly()
+        anomaly_detector = TrafficAnomalyDetector()
+        anomaly_detector.seed_hourly(first_hour, hourly)
+        demand_sketches = DemandSketches()
+        demand_sketches.seed_hourly(DEFAULT_STORE, first_hour, hourly)
+
+        # Initialize BobaBI system (BOBA_BI_OFFLINE_LLM=1 swaps in the offline LLM stand-in)
+        boba_bi = BobaBI(
+            api_key=os.getenv('ANTHROPIC_API_KEY', ANTHROPIC_API_KEY),
+            pos_data=pos_data,
+            employees=employees,
+            history=schedule_history,
+            anomaly_detector=anomaly_detector,
+            demand_sketches=demand_sketches
+        )
+
+        # Live POS batches (POST /api/pos/batch)
+        pos_ingestor = PosIngestor(pos_data, on_append=_on_pos_append)
+
+        # Off-peak warm-up (PRECOMPUTE_TIMES); the servers start it, see start_precompute().
+        # This server holds one store's data, so it registers that store's jobs.
+        precompute = PrecomputeScheduler(_precompute_jobs(DEFAULT_STORE))
+
+        _initialized = True
+        print(f"✅ System ready with {len(pos_data)} POS transactions and {len(employees)} employees")
+
+
+def __getattr__(name: str):
+    if name in _LAZY_STATE:
+        initialize()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _uses_state(func: Callable) -> Callable:
+    """Initialize the shared state before func reads it"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _initialized:
+            initialize()
+        return func(*args, **kwargs)
+    return wrapper
+
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+@_uses_state
+def run_orchestrator(query: str, horizon_weeks: int = 1, record: bool = True) -> Dict[str, Any]:
+    """
+    Orchestrator result for a query over horizon_weeks
+    
+    Served from schedule_results (or another worker's shared_results) when
+    the query, dates and data version match an earlier (or precomputed) run;
+    otherwise runs the agents, joining an identical run already in flight. record=False (precompute) leaves the
+    schedule history untouched.
+    """
+    dates = horizon_dates(horizon_weeks)
+    key = schedule_request_key(query, dates, boba_bi.data_version)
+    result = schedule_results.get(key)
+    if result is None:
+        result = shared_schedule_result(key)
+    if result is None:
+        result, shared = schedule_flight.do(
+            key, lambda: store_schedule_result(key, boba_bi.orchestrator(query, dates=dates, record=False)))
+        if shared:
+            print(f"🔗 Joined in-flight schedule run for: {query}")
+    if record:
+        record_served_schedule(key, result)
+    return result
+
+
+@_uses_state
+def store_schedule_result(key: Hashable, result: Dict[str, Any], publish: bool = True) -> Dict[str, Any]:
+    """Cache a freshly computed (not yet recorded) orchestrator result and share it with other workers"""
+    with _unrecorded_lock:
+        schedule_results.put(key, result)
+        _unrecorded.add(key)
+        _unrecorded.difference_update([k for k in _unrecorded if k not in schedule_results])  # Evicted drafts
+    if publish and shared_results is not None:
+        shared_results.put(_shared_key(key), result)
+    return result
+
+
+@_uses_state
+def shared_schedule_result(key: Hashable) -> Optional[Dict[str, Any]]:
+    """A result another worker computed for key (None without shared POS data), cached locally"""
+    if shared_results is None:
+        return None
+    result = shared_results.get(_shared_key(key))
+    if result is not None:
+        store_schedule_result(key, result, publish=False)  # Each worker records what it serves
+    return result
+
+
+def _shared_key(key: Hashable) -> Tuple[Hashable, str]:
+    """key plus a digest of the roster, which every worker still generates itself"""
+    roster = json.dumps(employees.records, sort_keys=True, default=str).encode()
+    return key, hashlib.sha1(roster).hexdigest()
+
+
+@_uses_state
+def record_served_schedule(key: Hashable, result: Dict[str, Any]):
+    """Record a result in the schedule history the first time it is served"""
+    with _unrecorded_lock:
+        if key not in _unrecorded:
+            return
+        _unrecorded.discard(key)
+    boba_bi.record_schedule(result['schedule'])
+
+
+def _precompute_jobs(store: str) -> Dict[str, Callable[[], Any]]:
+    """Off-peak jobs for one store: traffic analysis, next week's forecasts, the draft schedule"""
+    def traffic_analysis():
+        boba_bi.traffic_summary()
+        traffic_cube()
+        if STAFFING_MODEL == 'queueing':
+            boba_bi.capacity_model()
+
+    return {
+        f"{store}:traffic_analysis": traffic_analysis,
+        f"{store}:forecasts": lambda: boba_bi.weather_multipliers(horizon_dates(1)),
+        f"{store}:draft_schedule": lambda: run_orchestrator(DEFAULT_SCHEDULE_QUERY, record=False)
+    }
+
+
+def start_precompute():
+    """Start the off-peak precompute thread unless BOBA_BI_PRECOMPUTE=0"""
+    initialize()
+    if PRECOMPUTE_ENABLED:
+        precompute.start()
+        print(f"⏰ Precompute scheduled at {', '.join(precompute.stats()['times'])} (shop time)")
+
+
+@_uses_state
+def traffic_cube() -> TrafficCube:
+    """TrafficCube for the current POS data version"""
+    global _cube
+    version = pos_data.version
+    with _cube_lock:
+        if _cube[0] != version:
+            _cube = (version, build_traffic_cube(pos_data))
+        return _cube[1]
+
+
+def _apply_to_cube(orders, old_version, new_version):
+    """Merge ingested orders into the current cube instead of rebuilding it"""
+    global _cube
+    with _cube_lock:
+        if _cube[1] is not None and _cube[0] == old_version:
+            _cube = (new_version, _cube[1].with_buckets(buckets_from_transactions(orders)))
+
+
+def _on_pos_append(orders, old_version, new_version):
+    """Ingested orders update the traffic cube, the anomaly detector and the demand sketches"""
+    _apply_to_cube(orders, old_version, new_version)
+    anomaly_detector.observe_orders(orders)
+    demand_sketches.observe_orders(orders)
+
+
+@_uses_state
+def ingest_pos_batch(body: bytes, content_type: Optional[str]) -> Dict[str, Any]:
+    """Validate and append a batch of orders (raises ValueError for an unusable body)"""
+    return pos_ingestor.ingest(body, content_type)
+
+
+def parse_local_datetime(value: str) -> datetime:
+    """ISO datetime as naive shop-local time (offset-aware values are converted)"""
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid datetime: {value!r}")
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(ZoneInfo(SHOP_TIMEZONE)).replace(tzinfo=None)
+    return dt
+
+
+# ============================================================================
+# RESPONSE PAYLOADS
+# ============================================================================
+
+def home_payload() -> Dict[str, Any]:
+    return {
+        'service': 'Boba BI API',
+        'status': 'running',
+        'version': '1.0.0',
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+@_uses_state
+def employees_payload(limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """One page of the roster by employee_id; next_cursor is None on the last page"""
+    rows, next_cursor = page_records(employees.records, 'employee_id', limit, cursor)
+    return {
+        'success': True,
+        'data': rows,
+        'count': len(rows),
+        'total': len(employees),
+        'next_cursor': next_cursor
+    }
+
+
+@_uses_state
+def traffic_analysis_payload(days_back: int) -> Dict[str, Any]:
+    return {
+        'success': True,
+        'data': analyze_traffic_patterns(pos_data, days_back=days_back),
+        'period_days': days_back
+    }
+
+
+def traffic_query_payload(start: datetime, end: datetime, granularity: str) -> Dict[str, Any]:
+    return {
+        'success': True,
+        'data': traffic_cube().query(start, end, granularity),
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'granularity': granularity
+    }
+
+
+@_uses_state
+def scenarios_payload(grid: Dict[str, Any], dates: Optional[List[str]] = None,
+                      horizon_weeks: int = 1) -> Dict[str, Any]:
+    """What-if metrics for each variant in the grid (raises ValueError for a bad grid or dates)"""
+    if not isinstance(grid, dict):
+        raise ValueError("grid must be an object of parameter -> list of values")
+    dates = dates or horizon_dates(horizon_weeks)
+    if not isinstance(dates, list):
+        raise ValueError("dates must be a list of ISO dates")
+    for date in dates:
+        try:
+            datetime.fromisoformat(str(date))
+        except ValueError:
+            raise ValueError(f"Invalid date: {date!r}")
+    capacity = boba_bi.capacity_model() if STAFFING_MODEL == 'queueing' else None
+    results = run_scenarios(boba_bi.traffic_summary(), dates, employees, boba_bi.weather_multipliers(dates), grid,
+                            capacity=capacity, hours_worked=boba_bi.hours_worked(dates))
+    return {
+        'success': True,
+        'data': results,
+        'count': len(results),
+        'dates': dates
+    }
+
+
+@_uses_state
+def repair_payload(schedule: List[Dict], changes: List[Dict]) -> Dict[str, Any]:
+    """Patch a schedule for roster/demand changes (raises ValueError for malformed input)"""
+    if not isinstance(schedule, list) or not isinstance(changes, list):
+        raise ValueError("schedule and changes must be lists")
+    try:
+        repaired, diff = repair_schedule(schedule, employees, changes)
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Malformed schedule entry: missing or invalid {e}")
+    return {
+        'success': True,
+        'data': {'schedule': repaired, 'diff': diff},
+        'changed_shifts': len(diff)
+    }
+
+
+@_uses_state
+def schedule_history_payload(start: Optional[str], end: Optional[str], limit: int,
+                             cursor: Optional[str]) -> Dict[str, Any]:
+    """One page of recorded shifts; next_cursor is None on the last page"""
+    rows, next_cursor = schedule_history.shifts(start, end, limit, cursor)
+    return {
+        'success': True,
+        'data': rows,
+        'count': len(rows),
+        'next_cursor': next_cursor
+    }
+
+
+@_uses_state
+def employee_hours_payload(start: str, end: str) -> Dict[str, Any]:
+    """Scheduled hours per employee between two dates (inclusive)"""
+    hours = schedule_history.employee_hours(start, end)
+    return {
+        'success': True,
+        'data': [{'employee_id': employee_id, **totals} for employee_id, totals in hours.items()],
+        'start': start,
+        'end': end
+    }
+
+
+def check_limit(limit: Any) -> int:
+    """Validated page size (1 to MAX_HISTORY_PAGE_SIZE)"""
+    if not isinstance(limit, int) or not 1 <= limit <= MAX_HISTORY_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_HISTORY_PAGE_SIZE}")
+    return limit
+
+
+def page_records(records: List[Dict], key: str, limit: int,
+                 cursor: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Keyset page of records ordered by a unique key; returns (rows, next cursor)
+
+    The cursor is the last key of the previous page, so inserts and deletes
+    between requests never shift or repeat rows.
+    """
+    ordered = sorted(records, key=lambda record: record[key])
+    if cursor:
+        keys = [record[key] for record in ordered]
+        after: Any = cursor
+        if keys and isinstance(keys[0], int):
+            try:
+                after = int(cursor)
+            except ValueError:
+                raise ValueError(f"Invalid cursor: {cursor!r}")
+        ordered = ordered[bisect_right(keys, after):]
+    rows = ordered[:limit]
+    return rows, str(rows[-1][key]) if len(ordered) > limit else None
+
+
+def parse_fields(fields: Any) -> Optional[Dict[str, Any]]:
+    """
+    'schedule.date,schedule.employees,dates' -> {'schedule': {'date': None, 'employees': None}, 'dates': None}
+
+    Accepts a comma-separated string or a list. None in the tree keeps the
+    whole value; a dotted path selects inside a nested object or inside each
+    element of a list. Returns None when no fields are given.
+    """
+    if not fields:
+        return None
+    names = fields.split(',') if isinstance(fields, str) else fields
+    tree: Dict[str, Any] = {}
+    for name in names:
+        parts = str(name).strip().split('.')
+        if parts == ['']:
+            continue
+        if not all(parts):
+            raise ValueError(f"Invalid field: {name!r}")
+        node = tree
+        for part in parts[:-1]:
+            if part in node and node[part] is None:
+                break  # The whole parent is already selected
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = None
+    return tree or None
+
+
+def project(value: Any, tree: Optional[Dict[str, Any]]) -> Any:
+    """Keep only the fields in tree (see parse_fields()), applied to each element of lists"""
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {name: project(value[name], subtree) for name, subtree in tree.items() if name in value}
+    return value
+
+
+def project_payload(payload: Dict[str, Any], fields: Any) -> Dict[str, Any]:
+    """Payload with its 'data' projected to fields (unchanged without fields)"""
+    tree = parse_fields(fields)
+    if tree is None or 'data' not in payload:
+        return payload
+    return {**payload, 'data': project(payload['data'], tree)}
+
+
+def parse_int(value: Optional[str], name: str, default: int) -> int:
+    """Integer query parameter, default when absent; raises ValueError when malformed"""
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer: {value!r}")
+
+
+def parse_json_object(data: Any) -> Dict[str, Any]:
+    """A decoded JSON request body; raises ValueError unless it is an object"""
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    return data
+
+
+def parse_date(value: str) -> str:
+    """Validated ISO date string"""
+    try:
+        return datetime.fromisoformat(value).date().isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid date: {value!r}")
+
+
+@_uses_state
+def traffic_anomalies_payload(since: Optional[datetime], limit: int,
+                              before: Optional[datetime] = None) -> Dict[str, Any]:
+    """Flagged hours, newest first, with the detector's counters; next_cursor pages to older hours"""
+    anomalies = anomaly_detector.anomalies(since, limit + 1, before)
+    rows = anomalies[:limit]
+    return {
+        'success': True,
+        'data': rows,
+        'count': len(rows),
+        'next_cursor': rows[-1]['hour'] if len(anomalies) > limit else None,
+        'detector': anomaly_detector.stats()
+    }
+
+
+def parse_quantiles(value: Optional[str]) -> List[float]:
+    """'p50,p90' or '50,90' or '0.5,0.9' -> [0.5, 0.9] (default [0.5, 0.9]); raises ValueError"""
+    quantiles = [parse_percentile(part) for part in (value or '').split(',') if part.strip()]
+    return quantiles or [0.5, 0.9]
+
+
+@_uses_state
+def traffic_percentiles_payload(quantiles: List[float], stores: Optional[List[str]]) -> Dict[str, Any]:
+    """Hourly order-count quantiles per weekday and hour, merged across the requested stores"""
+    return {
+        'success': True,
+        'data': demand_sketches.quantile_rows(quantiles, stores),
+        'stores': stores or demand_sketches.stores(),
+        'sketches': demand_sketches.stats()
+    }
+
+
+@_uses_state
+def stats_payload() -> Dict[str, Any]:
+    return {
+        'success': True,
+        'data': {
+            'total_transactions': len(pos_data),
+            'total_employees': len(employees),
+            'data_period_weeks': 100,
+            'shifts_per_week': 14,  # 2 shifts * 7 days
+            'location': 'San Diego, CA'
+        }
+    }
+
+
+@_uses_state
+def metrics_payload() -> Dict[str, Any]:
+    """Live operational metrics (never cached)"""
+    return {
+        'success': True,
+        'data': {
+            'llm_limiter': shared_limiter().metrics(),
+            'llm_guard': boba_bi.guard.stats(),
+            'schedule_coalescing': schedule_flight.stats(),
+            'response_cache': response_cache.stats(),
+            'pos_ingestion': pos_ingestor.stats(),
+            'precompute': {**precompute.stats(), 'schedule_results': schedule_results.stats(),
+                           'shared_results': shared_results.stats() if shared_results is not None else None}
+        }
+    }
+
+
+@_uses_state
+def read_endpoint(name: str, days_back: int = 28, start: str = None, end: str = None,
+                  granularity: str = 'day', limit: int = HISTORY_PAGE_SIZE,
+                  cursor: str = None, quantiles: str = None,
+                  stores: str = None, fields: str = None) -> Tuple[Hashable, Hashable, Callable[[], Dict]]:
+    """
+    (cache key, data version, payload builder) for a cacheable read endpoint
+
+    fields (e.g. 'employee_id,name') projects the payload's data. Raises
+    ValueError for invalid query parameters (servers answer 400).
+    """
+    key, version, build = _read_endpoint(name, days_back, start, end, granularity, limit, cursor, quantiles, stores)
+    tree = parse_fields(fields)
+    if tree is None:
+        return key, version, build
+    return key + ('fields', json.dumps(tree, sort_keys=True)), version, lambda: project_payload(build(), fields)
+
+
+def _read_endpoint(name: str, days_back: int, start: Optional[str], end: Optional[str], granularity: str,
+                   limit: int, cursor: Optional[str], quantiles: Optional[str],
+                   stores: Optional[str]) -> Tuple[Hashable, Hashable, Callable[[], Dict]]:
+    if name == 'employees':
+        check_limit(limit)
+        key = ('employees', limit, cursor)
+        return key, employees.version, lambda: employees_payload(limit, cursor)
+    if name == 'stats':
+        return ('stats',), (pos_data.version, employees.version), stats_payload
+    if name == 'traffic_analysis':
+        # The analysis window is relative to now, so it also rolls over each minute
+        minute = datetime.now().strftime('%Y-%m-%dT%H:%M')
+        return ('traffic_analysis', days_back), (pos_data.version, minute), lambda: traffic_analysis_payload(days_back)
+    if name == 'traffic_query':
+        end_dt = parse_local_datetime(end) if end else datetime.now().replace(minute=0, second=0, microsecond=0)
+        start_dt = parse_local_datetime(start) if start else end_dt - timedelta(days=28)
+        plan_query(start_dt, end_dt, granularity)
+        key = ('traffic_query', start_dt.isoformat(), end_dt.isoformat(), granularity)
+        return key, pos_data.version, lambda: traffic_query_payload(start_dt, end_dt, granularity)
+    if name == 'traffic_anomalies':
+        since = parse_local_datetime(start) if start else None
+        before = parse_local_datetime(cursor) if cursor else None
+        check_limit(limit)
+        key = ('traffic_anomalies', since.isoformat() if since else None, limit, before.isoformat() if before else None)
+        return key, (pos_data.version, anomaly_detector.version), \
+            lambda: traffic_anomalies_payload(since, limit, before)
+    if name == 'traffic_percentiles':
+        qs = parse_quantiles(quantiles)
+        store_list = sorted({store.strip() for store in stores.split(',') if store.strip()}) if stores else None
+        key = ('traffic_percentiles', tuple(qs), tuple(store_list) if store_list else None)
+        return key, demand_sketches.version, lambda: traffic_percentiles_payload(qs, store_list)
+    if name == 'schedule_history':
+        start_date, end_date = parse_date(start) if start else None, parse_date(end) if end else None
+        key = ('schedule_history', start_date, end_date, limit, cursor)
+        return key, schedule_history.version, lambda: schedule_history_payload(start_date, end_date, limit, cursor)
+    if name == 'employee_hours':
+        # Default: the current calendar week
+        start_date = parse_date(start) if start else week_start(datetime.now().date().isoformat())
+        end_date = parse_date(end) if end else (datetime.fromisoformat(start_date) + timedelta(days=6)).date().isoformat()
+        key = ('employee_hours', start_date, end_date)
+        return key, schedule_history.version, lambda: employee_hours_payload(start_date, end_date)
+    raise KeyError(name)
+
+
+def cached_read(name: str, if_none_match: str = None, accept_encoding: str = None, accept: str = None, **params):
+    """(status, body, headers) for a read endpoint, honouring ETags, compression and Accept"""
+    return response_cache.respond(*read_endpoint(name, **params), if_none_match, accept_encoding, accept)
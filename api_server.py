@@ -3,40 +3,68 @@ Boba BI API - Flask Wrapper for Frontend Integration
 Example extension showing how to layer a REST API on top of the agent system
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 import os
 from datetime import datetime
-from boba_bi import (
-    BobaBI,
-    generate_synthetic_pos_data,
-    generate_employee_data,
-    generate_csv_report,
-    ANTHROPIC_API_KEY,
-    PARALLEL_API_KEY
+from typing import Any, Dict
+from boba_bi import generate_csv_report
+from llm_limiter import LLMOverloadedError
+from schedule_history import HISTORY_PAGE_SIZE
+from http_cache import JSON_TYPE, choose_media_type, serialize
+from api_common import (
+    initialize,
+    run_orchestrator,
+    ingest_pos_batch,
+    scenarios_payload,
+    repair_payload,
+    cached_read,
+    home_payload,
+    metrics_payload,
+    project_payload,
+    parse_int,
+    parse_json_object,
+    start_precompute,
+    DEFAULT_SCHEDULE_QUERY
 )
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend
 
 # ============================================================================
-# INITIALIZATION (Run once on startup)
+# HELPERS
 # ============================================================================
 
-print("🚀 Initializing Boba BI API Server...")
+def cached_response(name: str, **params) -> Response:
+    """Read endpoint response with ETag/304, gzip/brotli, MessagePack and ?fields= support"""
+    status, body, headers = cached_read(
+        name,
+        if_none_match=request.headers.get('If-None-Match'),
+        accept_encoding=request.headers.get('Accept-Encoding'),
+        accept=request.headers.get('Accept'),
+        fields=request.args.get('fields'),
+        **params
+    )
+    return Response(body, status=status, headers=headers)
 
-# Generate synthetic data (in production, load from database)
-pos_data = generate_synthetic_pos_data(weeks=100)
-employees = generate_employee_data(num_employees=10)
 
-# Initialize BobaBI system
-boba_bi = BobaBI(
-    api_key=os.getenv('ANTHROPIC_API_KEY', ANTHROPIC_API_KEY),
-    pos_data=pos_data,
-    employees=employees
-)
+def json_body() -> Dict[str, Any]:
+    """The request's JSON object ({} for an empty body); ValueError for anything else"""
+    return parse_json_object(request.get_json(force=True, silent=True) if request.get_data() else {})
+
+
+def int_arg(name: str, default: int) -> int:
+    """Integer query parameter; ValueError (answered 400) when malformed"""
+    return parse_int(request.args.get(name), name, default)
+
+
+def negotiated_response(payload, status: int = 200):
+    """JSON, or MessagePack when the Accept header prefers it"""
+    media_type = choose_media_type(request.headers.get('Accept'))
+    if media_type == JSON_TYPE:
+        return jsonify(payload), status
+    return Response(serialize(payload, media_type), status=status, content_type=media_type)
 
-print(f"✅ System ready with {len(pos_data)} POS transactions and {len(employees)} employees")
 
 # ============================================================================
 # API ENDPOINTS
@@ -45,12 +73,7 @@ print(f"✅ System ready with {len(pos_data)} POS transactions and {len(employee
 @app.route('/')
 def home():
     """Health check endpoint"""
-    return jsonify({
-        'service': 'Boba BI API',
-        'status': 'running',
-        'version': '1.0.0',
-        'timestamp': datetime.now().isoformat()
-    })
+    return jsonify(home_payload())
 
 
 @app.route('/api/schedule', methods=['POST'])
@@ -60,9 +83,13 @@ def generate_schedule():
     
     Request body:
     {
-        "query": "How should I schedule my employees for next week?"
+        "query": "How should I schedule my employees for next week?",
+        "horizon_weeks": 4,  (optional, 1-26; weekly hour limits apply per calendar week)
+        "fields": "schedule.date,schedule.employees"   (optional; also ?fields=)
     }
     
+    Send Accept: application/msgpack for a MessagePack body.
+    
     Response:
     {
         "query": "...",
@@ -73,19 +100,31 @@ def generate_schedule():
     }
     """
     try:
-        data = request.get_json()
-        query = data.get('query', 'Generate optimal schedule for next week')
+        data = json_body()
+        query = data.get('query', DEFAULT_SCHEDULE_QUERY)
         
         print(f"\n📊 Processing query: {query}")
         
-        # Run multi-agent orchestration
-        result = boba_bi.orchestrator(query)
+        # Run multi-agent orchestration (coalesced with identical requests)
+        result = run_orchestrator(query, data.get('horizon_weeks', 1))
         
-        return jsonify({
+        return negotiated_response(project_payload({
             'success': True,
             'data': result,
             'timestamp': datetime.now().isoformat()
-        })
+        }, data.get('fields') or request.args.get('fields')))
+    
+    except LLMOverloadedError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503, {'Retry-After': '5'}
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     
     except Exception as e:
         return jsonify({
@@ -107,11 +146,11 @@ def download_schedule():
     Returns: CSV file
     """
     try:
-        data = request.get_json()
-        query = data.get('query', 'Generate optimal schedule for next week')
+        data = json_body()
+        query = data.get('query', DEFAULT_SCHEDULE_QUERY)
         
         # Generate schedule
-        result = boba_bi.orchestrator(query)
+        result = run_orchestrator(query, data.get('horizon_weeks', 1))
         
         # Create CSV
         filename = f"boba_bi_schedule_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
@@ -127,6 +166,18 @@ def download_schedule():
             download_name=filename
         )
     
+    except LLMOverloadedError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503, {'Retry-After': '5'}
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
     except Exception as e:
         return jsonify({
             'success': False,
@@ -134,44 +185,235 @@ def download_schedule():
         }), 500
 
 
+@app.route('/api/schedule/repair', methods=['POST'])
+def patch_schedule():
+    """
+    Patch an existing schedule after a call-out or demand change (no LLM calls)
+    
+    Request body:
+    {
+        "schedule": [...],   (as returned by /api/schedule)
+        "changes": [{"type": "unavailable", "employee_id": 3, "dates": ["2025-06-02"]},
+                    {"type": "demand", "date": "2025-06-03", "shift": "evening", "staff_needed": 4}]
+    }
+    
+    Response: {"schedule": [...], "diff": [{"date", "shift", "removed", "added", ...}]}
+    Only affected shifts change; see schedule_repair.py.
+    """
+    try:
+        data = json_body()
+        return jsonify(repair_payload(data.get('schedule'), data.get('changes', [])))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+@app.route('/api/pos/batch', methods=['POST'])
+def post_pos_batch():
+    """
+    Ingest a batch of live POS orders
+    
+    Body: NDJSON (application/x-ndjson) or binary (application/x-boba-pos),
+    see pos_ingest.py. Valid orders are appended even if others are rejected.
+    
+    Response:
+    {
+        "success": true,
+        "accepted": 998, "duplicates": 0, "rejected": 2,
+        "errors": [{"index": 17, "error": "..."}],
+        "data_version": 42
+    }
+    """
+    try:
+        return jsonify(ingest_pos_batch(request.get_data(), request.content_type))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+@app.route('/api/scenarios', methods=['POST'])
+def evaluate_scenarios():
+    """
+    Evaluate the scheduler over a grid of constraint variants (no LLM calls)
+    
+    Request body:
+    {
+        "grid": {"min_staff_per_shift": [1, 2, 3], "orders_per_staff": [12, 15, 18],
+                 "max_hours_per_week": [32, 40], "weather_scale": [0, 1]},
+        "dates": ["2025-06-02", ...],  (optional, default next week)
+        "horizon_weeks": 4              (optional, used when dates is omitted)
+    }
+    
+    Response: one {"variant", "coverage", "understaffed_shifts", "total_hours", ...}
+    per combination, in grid order
+    """
+    try:
+        data = json_body()
+        return jsonify(scenarios_payload(data.get('grid', {}), data.get('dates'), data.get('horizon_weeks', 1)))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
 @app.route('/api/employees', methods=['GET'])
 def get_employees():
-    """Get list of all employees"""
-    return jsonify({
-        'success': True,
-        'data': employees,
-        'count': len(employees)
-    })
+    """
+    Get the roster, one page at a time
+    
+    Query params: limit (default 100), cursor (next_cursor of the previous page),
+    fields (e.g. employee_id,name)
+    """
+    try:
+        return cached_response(
+            'employees',
+            limit=int_arg('limit', HISTORY_PAGE_SIZE),
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+@app.route('/api/employees/hours', methods=['GET'])
+def get_employee_hours():
+    """
+    Scheduled hours per employee from the schedule history
+    
+    Query params: start, end (ISO dates, inclusive; default the current week)
+    """
+    try:
+        return cached_response('employee_hours', start=request.args.get('start'), end=request.args.get('end'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+@app.route('/api/schedule/history', methods=['GET'])
+def get_schedule_history():
+    """
+    Previously generated shifts, oldest first, one page at a time
+    
+    Query params: start, end (ISO dates), limit (default 100, max 1000),
+    cursor (next_cursor from the previous page)
+    """
+    try:
+        return cached_response(
+            'schedule_history',
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            limit=int_arg('limit', HISTORY_PAGE_SIZE),
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
 
 
 @app.route('/api/traffic/analysis', methods=['GET'])
 def get_traffic_analysis():
     """Get historical traffic analysis"""
-    from boba_bi import analyze_traffic_patterns
+    try:
+        return cached_response('traffic_analysis', days_back=int_arg('days', 28))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+@app.route('/api/traffic/query', methods=['GET'])
+def query_traffic():
+    """
+    Traffic for an arbitrary range and granularity
     
-    days_back = request.args.get('days', default=28, type=int)
-    traffic_summary = analyze_traffic_patterns(pos_data, days_back=days_back)
+    Query params: start, end (ISO datetimes, shop-local unless offset given),
+    granularity (hour | day | week | hour_of_week; default day)
+    """
+    try:
+        return cached_response(
+            'traffic_query',
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            granularity=request.args.get('granularity', 'day')
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+@app.route('/api/traffic/anomalies', methods=['GET'])
+def get_traffic_anomalies():
+    """
+    Hours with unusual order volume, newest first (see traffic_anomalies.py)
     
-    return jsonify({
-        'success': True,
-        'data': traffic_summary,
-        'period_days': days_back
-    })
+    Query params: since (ISO datetime, shop-local unless offset given),
+    limit (default 100), cursor (next_cursor of the previous page)
+    """
+    try:
+        return cached_response(
+            'traffic_anomalies',
+            start=request.args.get('since'),
+            limit=int_arg('limit', HISTORY_PAGE_SIZE),
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+@app.route('/api/traffic/percentiles', methods=['GET'])
+def get_traffic_percentiles():
+    """
+    Hourly order-count percentiles per weekday and hour (see demand_sketches.py)
+    
+    Query params: q (comma-separated, e.g. p50,p90; default p50,p90),
+    stores (comma-separated; default all, merged into one regional view)
+    """
+    try:
+        return cached_response(
+            'traffic_percentiles',
+            quantiles=request.args.get('q'),
+            stores=request.args.get('stores')
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
 
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get system statistics"""
-    return jsonify({
-        'success': True,
-        'data': {
-            'total_transactions': len(pos_data),
-            'total_employees': len(employees),
-            'data_period_weeks': 100,
-            'shifts_per_week': 14,  # 2 shifts * 7 days
-            'location': 'San Diego, CA'
-        }
-    })
+    try:
+        return cached_response('stats')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Get live LLM limiter, coalescing and cache metrics"""
+    return jsonify(metrics_payload())
 
 
 # ============================================================================
@@ -206,14 +448,30 @@ if __name__ == '__main__':
     print("  GET  /                      - Health check")
     print("  POST /api/schedule          - Generate schedule")
     print("  POST /api/schedule/download - Download CSV")
+    print("  POST /api/schedule/repair   - Patch schedule for changes")
+    print("  POST /api/pos/batch         - Ingest live POS orders")
+    print("  POST /api/scenarios         - What-if staffing scenarios")
     print("  GET  /api/employees         - List employees")
+    print("  GET  /api/employees/hours   - Scheduled hours per employee")
+    print("  GET  /api/schedule/history  - Past schedules (paginated)")
     print("  GET  /api/traffic/analysis  - Traffic patterns")
+    print("  GET  /api/traffic/query     - Traffic by range and granularity")
+    print("  GET  /api/traffic/anomalies - Unusual traffic hours")
+    print("  GET  /api/traffic/percentiles - Hourly order percentiles")
     print("  GET  /api/stats             - System statistics")
+    print("  GET  /api/metrics           - Live operational metrics")
     print("\n" + "="*60)
-    print("\n🚀 Starting server on http://localhost:5000\n")
-    
+    port = int(os.getenv('FLASK_PORT', '5000'))
+    print(f"\n🚀 Starting server on http://localhost:{port}\n")
+
+    # Build the data up front instead of on the first request
+    initialize()
+    debug = os.getenv('FLASK_DEBUG', 'True').lower() in ('1', 'true', 'yes')
+    if not debug or os.getenv('WERKZEUG_RUN_MAIN') == 'true':
+        start_precompute()  # Only in the process that serves (not the debug reloader's watcher)
     app.run(
-        host='0.0.0.0',
-        port=5000,
-        debug=True
+        host=os.getenv('FLASK_HOST', '0.0.0.0'),
+        port=port,
+        debug=debug,
+        threaded=True
     )
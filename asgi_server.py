@@ -0,0 +1,239 @@
+"""
+Boba BI API - Async ASGI Server
+Serves the same endpoints as api_server.py with async handlers on one event loop
+
+Run with:
+    python asgi_server.py
+or
+    uvicorn asgi_server:app --port 5001
+
+Schedule requests await LLM I/O instead of holding an OS thread, so one
+process can keep hundreds of orchestrations in flight. CPU-bound steps run
+on a small fixed thread pool (ASGI_THREADS).
+"""
+
+import os
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs
+from typing import Any, Dict, List, Optional, Tuple
+
+from single_flight import AsyncSingleFlight, schedule_request_key
+from llm_limiter import LLMOverloadedError
+from schedule_history import HISTORY_PAGE_SIZE
+from http_cache import JSON_TYPE, choose_media_type, serialize
+
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', '4'))
+
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-headers', b'Content-Type'),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS')
+]
+
+
+class BobaBIASGI:
+    """
+    ASGI application for Boba BI
+
+    Shared state comes from api_common and is loaded on lifespan startup (or
+    on the first request when the server does not send lifespan events).
+    """
+
+    def __init__(self):
+        self.state = None
+        self.flight = AsyncSingleFlight()
+        self._ready = None
+
+    async def __call__(self, scope: Dict, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        await self.startup()
+        method, path = scope['method'], scope['path']
+
+        try:
+            if method == 'OPTIONS':
+                await self._respond(send, 204, None)
+            elif (method, path) == ('GET', '/'):
+                await self._respond(send, 200, self.state.home_payload())
+            elif (method, path) == ('POST', '/api/schedule'):
+                body = await self._read_body(receive)
+                status, payload, headers = await self.generate_schedule(body, self._str_arg(scope, 'fields'))
+                media_type = choose_media_type(dict(scope.get('headers', [])).get(b'accept', b'').decode() or None)
+                await self._respond(send, status, payload, headers, media_type)
+            elif (method, path) == ('POST', '/api/schedule/repair'):
+                data = self.state.parse_json_object(json.loads(await self._read_body(receive) or b'{}'))
+                result = await asyncio.to_thread(self.state.repair_payload, data.get('schedule'), data.get('changes', []))
+                await self._respond(send, 200, result)
+            elif (method, path) == ('POST', '/api/pos/batch'):
+                body = await self._read_body(receive)
+                content_type = dict(scope.get('headers', [])).get(b'content-type', b'').decode() or None
+                result = await asyncio.to_thread(self.state.ingest_pos_batch, body, content_type)
+                await self._respond(send, 200, result)
+            elif (method, path) == ('POST', '/api/scenarios'):
+                data = self.state.parse_json_object(json.loads(await self._read_body(receive) or b'{}'))
+                result = await asyncio.to_thread(self.state.scenarios_payload, data.get('grid', {}),
+                                                 data.get('dates'), data.get('horizon_weeks', 1))
+                await self._respond(send, 200, result)
+            elif (method, path) == ('GET', '/api/employees'):
+                await self._respond_cached(send, scope, 'employees',
+                                           limit=self._int_arg(scope, 'limit', HISTORY_PAGE_SIZE),
+                                           cursor=self._str_arg(scope, 'cursor'))
+            elif (method, path) == ('GET', '/api/employees/hours'):
+                await self._respond_cached(send, scope, 'employee_hours',
+                                           start=self._str_arg(scope, 'start'),
+                                           end=self._str_arg(scope, 'end'))
+            elif (method, path) == ('GET', '/api/schedule/history'):
+                await self._respond_cached(send, scope, 'schedule_history',
+                                           start=self._str_arg(scope, 'start'),
+                                           end=self._str_arg(scope, 'end'),
+                                           limit=self._int_arg(scope, 'limit', HISTORY_PAGE_SIZE),
+                                           cursor=self._str_arg(scope, 'cursor'))
+            elif (method, path) == ('GET', '/api/traffic/analysis'):
+                days_back = self._int_arg(scope, 'days', 28)
+                await self._respond_cached(send, scope, 'traffic_analysis', days_back=days_back)
+            elif (method, path) == ('GET', '/api/traffic/query'):
+                await self._respond_cached(send, scope, 'traffic_query',
+                                           start=self._str_arg(scope, 'start'),
+                                           end=self._str_arg(scope, 'end'),
+                                           granularity=self._str_arg(scope, 'granularity') or 'day')
+            elif (method, path) == ('GET', '/api/traffic/anomalies'):
+                await self._respond_cached(send, scope, 'traffic_anomalies',
+                                           start=self._str_arg(scope, 'since'),
+                                           limit=self._int_arg(scope, 'limit', HISTORY_PAGE_SIZE),
+                                           cursor=self._str_arg(scope, 'cursor'))
+            elif (method, path) == ('GET', '/api/traffic/percentiles'):
+                await self._respond_cached(send, scope, 'traffic_percentiles',
+                                           quantiles=self._str_arg(scope, 'q'),
+                                           stores=self._str_arg(scope, 'stores'))
+            elif (method, path) == ('GET', '/api/stats'):
+                await self._respond_cached(send, scope, 'stats')
+            elif (method, path) == ('GET', '/api/metrics'):
+                payload = self.state.metrics_payload()
+                payload['data']['schedule_coalescing'] = self.flight.stats()
+                await self._respond(send, 200, payload)
+            else:
+                await self._respond(send, 404, {'success': False, 'error': 'Endpoint not found'})
+        except ValueError as e:
+            await self._respond(send, 400, {'success': False, 'error': str(e)})
+        except Exception as e:
+            await self._respond(send, 500, {'success': False, 'error': str(e)})
+
+    async def startup(self):
+        """Load shared state and size the default executor (runs once)"""
+        if self._ready is None:
+            self._ready = asyncio.ensure_future(self._load_state())
+        await self._ready
+
+    async def _load_state(self):
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(ASGI_THREADS))
+        import api_common
+        await asyncio.to_thread(api_common.start_precompute)
+        self.state = api_common
+
+    async def generate_schedule(self, body: bytes, fields: Optional[str] = None) -> Tuple[int, Dict[str, Any], List]:
+        """
+        POST /api/schedule: cached, precomputed or coalesced async orchestration,
+        projected to the requested fields
+        """
+        data = self.state.parse_json_object(json.loads(body or b'{}'))
+        query = data.get('query', self.state.DEFAULT_SCHEDULE_QUERY)
+        boba_bi = self.state.boba_bi
+
+        dates = self.state.horizon_dates(data.get('horizon_weeks', 1))
+        key = schedule_request_key(query, dates, boba_bi.data_version)
+        result = self.state.schedule_results.get(key)
+        if result is None:
+            result = await asyncio.to_thread(self.state.shared_schedule_result, key)
+        if result is None:
+            async def run():
+                result = await boba_bi.orchestrator_async(query, dates=dates, record=False)
+                return await asyncio.to_thread(self.state.store_schedule_result, key, result)
+            try:
+                result, _ = await self.flight.do(key, run)
+            except LLMOverloadedError as e:
+                return 503, {'success': False, 'error': str(e)}, [(b'retry-after', b'5')]
+        await asyncio.to_thread(self.state.record_served_schedule, key, result)
+
+        return 200, self.state.project_payload({
+            'success': True,
+            'data': result,
+            'timestamp': datetime.now().isoformat()
+        }, data.get('fields') or fields), []
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    @staticmethod
+    def _str_arg(scope: Dict, name: str) -> Optional[str]:
+        values = parse_qs(scope.get('query_string', b'').decode()).get(name)
+        return values[0] if values else None
+
+    def _int_arg(self, scope: Dict, name: str, default: int) -> int:
+        """Integer query parameter; raises ValueError (400) when malformed"""
+        return self.state.parse_int(self._str_arg(scope, name), name, default)
+
+    async def _respond_cached(self, send, scope: Dict, name: str, **params):
+        """Read endpoint with ETag/304 and compression; misses are built off the event loop"""
+        request_headers = dict(scope.get('headers', []))
+        status, body, headers = await asyncio.to_thread(
+            self.state.cached_read, name,
+            if_none_match=request_headers.get(b'if-none-match', b'').decode() or None,
+            accept_encoding=request_headers.get(b'accept-encoding', b'').decode() or None,
+            accept=request_headers.get(b'accept', b'').decode() or None,
+            fields=self._str_arg(scope, 'fields'),
+            **params
+        )
+        response_headers = [(k.lower().encode(), v.encode()) for k, v in headers]
+        response_headers.append((b'content-length', str(len(body)).encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers + CORS_HEADERS})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def _respond(send, status: int, payload: Any, headers: List = None, media_type: str = JSON_TYPE):
+        body = b'' if payload is None else serialize(payload, media_type)
+        response_headers = [(b'content-type', media_type.encode()),
+                            (b'content-length', str(len(body)).encode())]
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': response_headers + CORS_HEADERS + (headers or [])
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+app = BobaBIASGI()
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.getenv('ASGI_PORT', '5001'))
+    print("\n" + "="*60)
+    print("🧋 BOBA BI ASYNC API SERVER")
+    print("="*60)
+    print(f"\n🚀 Starting ASGI server on http://localhost:{port} ({ASGI_THREADS} worker threads)\n")
+
+    uvicorn.run(app, host=os.getenv('ASGI_HOST', '0.0.0.0'), port=port, log_level='warning')
@@ -0,0 +1,259 @@
+"""
+Historical Backtesting for Boba BI
+Replays POS history week by week: forecast, schedule, then score against actual orders
+
+For every complete Monday-Sunday week with days_back days of history before
+it, the forecast is rebuilt from those preceding days only (the same
+weekday x shift summary analyze_traffic_patterns() gives scheduler_agent),
+build_schedule() staffs the week from it, and the plan is scored against the
+orders that actually came in:
+
+  - staffing: an hour is scored with build_schedule()'s own rule on the scale of
+    its input, max(min_staff_per_shift, int(orders * days_back / 7 / orders_per_staff)),
+    so a perfect forecast is neither under- nor overstaffed; hours with fewer
+    assigned are understaffed, with more overstaffed
+  - window scale: the traffic summary build_schedule() reads as orders per hour
+    is days_back / 7 times the hourly rate, so plans carry extra staff against
+    max(min_staff_per_shift, int(orders / orders_per_staff)); that excess is
+    reported on its own as window_scale_staff_hours, not in the rates above
+  - forecast: MAE, RMSE, MAPE and bias of the forecast orders/hr of each shift
+    against its actual average orders/hr
+
+Each store's history is reduced once to hourly order counts (a TrafficCube),
+and every week is shipped to the worker processes as a slice of those counts,
+so a store-week costs a few hundred integers of IPC. Weeks and stores are
+fanned out in chunks over the shared scenario process pool.
+
+Usage:
+    report = run_backtest({'downtown': pos_data}, employees)
+    report['total']                    # summary over every store-week
+    python backtest.py --stores 4 --weeks 100 --output backtest.json
+"""
+
+import json
+import math
+import time
+import argparse
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from boba_bi import (
+    build_schedule,
+    generate_employee_data,
+    generate_synthetic_pos_data,
+    MIN_STAFF_PER_SHIFT,
+    ORDERS_PER_STAFF
+)
+from scenarios import SCENARIO_WORKERS, scenario_pool, schedule_metrics
+from time_buckets import SHIFT_HOURS, shift_traffic_summary
+from traffic_cube import HOURS_PER_WEEK, TrafficCube, build_traffic_cube
+
+BACKTEST_DAYS_BACK = 28  # History behind each forecast, as in analyze_traffic_patterns()
+PARALLEL_MIN_WEEKS = 400  # Fewer store-weeks finish faster in-process than the IPC round trip
+
+
+# ============================================================================
+# ONE WEEK
+# ============================================================================
+
+def backtest_week(inputs: Dict[str, Any], store: str, week_hour: int,
+                  history: List[int], actual: List[int]) -> Dict[str, Any]:
+    """
+    Forecast, schedule and score one week
+
+    week_hour is the local hour index of the week's Monday 00:00; history
+    holds the hourly orders of the days_back days before it and actual the
+    168 hourly orders of the week itself.
+    """
+    # history ends at Monday 00:00, so its last hour is Sunday 23:00
+    counts = [0] * HOURS_PER_WEEK
+    for i, orders in enumerate(history):
+        counts[(i - len(history)) % HOURS_PER_WEEK] += orders
+    traffic = shift_traffic_summary(counts)
+    weeks = inputs['days_back'] / 7  # The summary is on a days_back scale, not per week
+
+    monday = date.fromordinal(week_hour // 24)
+    dates = [date.fromordinal(monday.toordinal() + day).isoformat() for day in range(7)]
+    orders_per_staff = inputs['orders_per_staff']
+    min_staff = inputs['min_staff_per_shift']
+    schedule = build_schedule(traffic, dates, inputs['employees'], orders_per_staff=orders_per_staff,
+                              min_staff_per_shift=min_staff)
+
+    hours = understaffed = overstaffed = short = excess = scale_excess = 0
+    abs_errors, sq_errors, pct_errors, errors = [], [], [], []
+    for shift in schedule:
+        start, end = SHIFT_HOURS[shift['shift']]
+        base = dates.index(shift['date']) * 24
+        shift_orders = actual[base + start:base + end]
+        staffed = shift['staff_assigned']
+        for orders in shift_orders:
+            needed = max(min_staff, int(orders * weeks / orders_per_staff))  # build_schedule()'s rule and scale
+            hours += 1
+            understaffed += staffed < needed
+            overstaffed += staffed > needed
+            short += max(0, needed - staffed)
+            excess += max(0, staffed - needed)
+            scale_excess += max(0, min(staffed, needed) - max(min_staff, int(orders / orders_per_staff)))
+
+        forecast = shift['predicted_orders_per_hour'] / weeks
+        observed = sum(shift_orders) / len(shift_orders)
+        errors.append(forecast - observed)
+        abs_errors.append(abs(forecast - observed))
+        sq_errors.append((forecast - observed) ** 2)
+        if observed:
+            pct_errors.append(abs(forecast - observed) / observed)
+
+    return {
+        'store': store,
+        'week': monday.isoformat(),
+        'hours': hours,
+        'understaffed_hours': understaffed,
+        'overstaffed_hours': overstaffed,
+        'staff_hours_short': short,
+        'staff_hours_excess': excess,
+        'window_scale_staff_hours': scale_excess,
+        'forecast_mae': round(sum(abs_errors) / len(abs_errors), 3),
+        'forecast_rmse': round(math.sqrt(sum(sq_errors) / len(sq_errors)), 3),
+        'forecast_mape': round(100 * sum(pct_errors) / len(pct_errors), 2) if pct_errors else None,
+        'forecast_bias': round(sum(errors) / len(errors), 3),
+        'plan_coverage': schedule_metrics(schedule)['coverage'],
+        'actual_orders': sum(actual)
+    }
+
+
+def _backtest_chunk(args: Tuple[Dict[str, Any], List[Tuple]]) -> List[Dict[str, Any]]:
+    inputs, tasks = args
+    return [backtest_week(inputs, *task) for task in tasks]
+
+
+# ============================================================================
+# WEEKS, STORES AND SUMMARIES
+# ============================================================================
+
+def backtest_weeks(first_hour: int, n_hours: int, days_back: int = BACKTEST_DAYS_BACK) -> List[int]:
+    """Monday 00:00 hour indexes of every complete week with days_back days of history before it"""
+    earliest = first_hour + days_back * 24
+    day = -(-earliest // 24)
+    day += (1 - day) % 7  # Ordinal 1 (0001-01-01) is a Monday
+    return list(range(day * 24, first_hour + n_hours - HOURS_PER_WEEK + 1, HOURS_PER_WEEK))
+
+
+def summarize_weeks(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals and rates over week results (forecast errors are averaged per week)"""
+    hours = sum(r['hours'] for r in results)
+    mapes = [r['forecast_mape'] for r in results if r['forecast_mape'] is not None]
+    mean = lambda key: round(sum(r[key] for r in results) / len(results), 3) if results else None
+    return {
+        'weeks': len(results),
+        'hours': hours,
+        'understaffed_hours': sum(r['understaffed_hours'] for r in results),
+        'overstaffed_hours': sum(r['overstaffed_hours'] for r in results),
+        'understaffed_rate': round(sum(r['understaffed_hours'] for r in results) / hours, 4) if hours else None,
+        'overstaffed_rate': round(sum(r['overstaffed_hours'] for r in results) / hours, 4) if hours else None,
+        'staff_hours_short': sum(r['staff_hours_short'] for r in results),
+        'staff_hours_excess': sum(r['staff_hours_excess'] for r in results),
+        'window_scale_staff_hours': sum(r['window_scale_staff_hours'] for r in results),
+        'forecast_mae': mean('forecast_mae'),
+        'forecast_rmse': round(math.sqrt(sum(r['forecast_rmse'] ** 2 for r in results) / len(results)), 3)
+                         if results else None,
+        'forecast_mape': round(sum(mapes) / len(mapes), 2) if mapes else None,
+        'forecast_bias': mean('forecast_bias'),
+        'plan_coverage': mean('plan_coverage')
+    }
+
+
+def run_backtest(stores: Dict[str, Any], employees: List[Dict], weeks: Optional[int] = None,
+                 days_back: int = BACKTEST_DAYS_BACK, orders_per_staff: float = ORDERS_PER_STAFF,
+                 min_staff_per_shift: int = MIN_STAFF_PER_SHIFT,
+                 workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Backtest every store's history ({store: POS data or TrafficCube})
+
+    weeks limits each store to its most recent weeks (default: all of them).
+    Store-weeks are split into one chunk per worker process; workers=1 (or
+    fewer than PARALLEL_MIN_WEEKS store-weeks) runs in this process.
+    Returns {'weeks': [...], 'stores': {store: summary}, 'total': summary}.
+    """
+    if days_back < 7:
+        raise ValueError("days_back must be at least 7")
+    if weeks is not None and weeks < 1:
+        raise ValueError("weeks must be at least 1")
+
+    tasks = []
+    for store, data in stores.items():
+        cube = data if isinstance(data, TrafficCube) else build_traffic_cube(data)
+        first_hour, orders = cube.hourly()
+        starts = backtest_weeks(first_hour, cube.n_hours, days_back)
+        for week_hour in starts[-weeks:] if weeks else starts:
+            offset = week_hour - first_hour
+            tasks.append((store, week_hour, orders[offset - days_back * 24:offset],
+                          orders[offset:offset + HOURS_PER_WEEK]))
+
+    inputs = {
+        'employees': [dict(emp) for emp in employees],
+        'days_back': days_back,
+        'orders_per_staff': orders_per_staff,
+        'min_staff_per_shift': min_staff_per_shift
+    }
+    workers = SCENARIO_WORKERS if workers is None else workers
+    if workers <= 1 or len(tasks) < PARALLEL_MIN_WEEKS:
+        results = _backtest_chunk((inputs, tasks))
+    else:
+        size = math.ceil(len(tasks) / workers)
+        chunks = [(inputs, tasks[i:i + size]) for i in range(0, len(tasks), size)]
+        results = [result for chunk in scenario_pool().map(_backtest_chunk, chunks) for result in chunk]
+
+    return {
+        'weeks': results,
+        'stores': {store: summarize_weeks([r for r in results if r['store'] == store]) for store in stores},
+        'total': summarize_weeks(results)
+    }
+
+
+# ============================================================================
+# COMMAND LINE
+# ============================================================================
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n{'Store':<12} {'Weeks':>5} {'Under':>7} {'Over':>7} {'MAE':>7} {'MAPE':>7} {'Bias':>7}")
+    rows = list(report['stores'].items()) + [('total', report['total'])]
+    for store, summary in rows:
+        if not summary['weeks']:
+            print(f"{store:<12} {0:>5}   (not enough history)")
+            continue
+        mape = f"{summary['forecast_mape']:.1f}%" if summary['forecast_mape'] is not None else '-'
+        print(f"{store:<12} {summary['weeks']:>5} {summary['understaffed_rate']:>7.1%} "
+              f"{summary['overstaffed_rate']:>7.1%} {summary['forecast_mae']:>7.2f} {mape:>7} "
+              f"{summary['forecast_bias']:>+7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest forecasts and schedules on synthetic POS history")
+    parser.add_argument('--stores', type=int, default=1, help="Synthetic stores to generate")
+    parser.add_argument('--weeks', type=int, default=100, help="Weeks of POS history per store")
+    parser.add_argument('--days-back', type=int, default=BACKTEST_DAYS_BACK, help="History behind each forecast")
+    parser.add_argument('--employees', type=int, default=10, help="Roster size")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default SCENARIO_WORKERS)")
+    parser.add_argument('--output', help="Write the full report as JSON to this file")
+    args = parser.parse_args()
+
+    stores = {f"store-{i + 1}": generate_synthetic_pos_data(weeks=args.weeks) for i in range(args.stores)}
+    employees = generate_employee_data(num_employees=args.employees)
+
+    started = time.perf_counter()
+    cubes = {store: build_traffic_cube(data) for store, data in stores.items()}
+    indexed = time.perf_counter()
+    report = run_backtest(cubes, employees, days_back=args.days_back, workers=args.workers)
+    finished = time.perf_counter()
+    print(f"⏱️  {report['total']['weeks']} store-weeks: indexed in {indexed - started:.2f}s, "
+          f"backtested in {finished - indexed:.2f}s")
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Results saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Boba BI Bucketing Benchmark - per-row loops vs. the shared time_buckets core
+
+Generates synthetic POS data and times weekday/hour bucketing for the three
+shapes timestamps arrive in:
+  naive   - naive local ISO strings (in-memory POS data)
+  utc     - UTC ISO strings with offsets (Supabase rows)
+  epoch   - int64 epoch-microsecond column (shared-memory POS data)
+
+The per-row baselines are the pre-refactor loops: naive strings bucketed
+as-is, UTC strings converted per row with zoneinfo. Each core result is
+checked against the per-row zoneinfo answer.
+
+Usage:
+    python bench_bucketing.py --weeks 100 --repeat 3
+"""
+
+import json
+import time
+import argparse
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+from boba_bi import generate_synthetic_pos_data
+from time_buckets import (
+    np,
+    get_zone,
+    local_now,
+    weekday_hour_counts,
+    weekday_hour_counts_epoch,
+    epoch_us_to_seconds
+)
+
+
+def per_row_counts(timestamps: List[str], zone, since: datetime) -> List[int]:
+    """Reference: parse and convert each row with zoneinfo"""
+    counts = [0] * 168
+    for value in timestamps:
+        dt = datetime.fromisoformat(value)
+        dt = dt.astimezone(zone).replace(tzinfo=None) if dt.tzinfo else dt
+        if dt >= since:
+            counts[dt.weekday() * 24 + dt.hour] += 1
+    return counts
+
+
+def best_of(fn: Callable, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark timestamp bucketing")
+    parser.add_argument('--weeks', type=int, default=100, help="Weeks of synthetic POS data")
+    parser.add_argument('--repeat', type=int, default=3, help="Timing repetitions (best is reported)")
+    parser.add_argument('--tz', default=None, help="Shop timezone (default SHOP_TIMEZONE)")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    zone = get_zone(args.tz)
+    naive = [tx['timestamp'] for tx in generate_synthetic_pos_data(weeks=args.weeks)]
+    aware = [datetime.fromisoformat(ts).replace(tzinfo=zone) for ts in naive]
+    utc = [dt.astimezone(timezone.utc).isoformat() for dt in aware]
+    epoch_us = array('q', [int(dt.timestamp()) * 1000000 for dt in aware])
+    since = local_now(zone) - timedelta(weeks=args.weeks // 2)
+
+    cases: Dict[str, Dict[str, Callable]] = {
+        'naive': {
+            'per_row': lambda: per_row_counts(naive, zone, since),
+            'core': lambda: weekday_hour_counts(naive, zone, since)
+        },
+        'utc': {
+            'per_row': lambda: per_row_counts(utc, zone, since),
+            'core': lambda: weekday_hour_counts(utc, zone, since)
+        },
+        'epoch': {
+            'per_row': lambda: per_row_counts([datetime.fromtimestamp(us // 1000000, timezone.utc).isoformat()
+                                               for us in epoch_us], zone, since),
+            'core': lambda: weekday_hour_counts_epoch(epoch_us_to_seconds(epoch_us), zone, since)
+        }
+    }
+
+    print(f"⏱️  {len(naive)} timestamps, tz {zone.key}, numpy {'on' if np is not None else 'off'}")
+    results = []
+    for shape, fns in cases.items():
+        reference = per_row_counts(utc, zone, since)
+        matches = fns['core']() == reference
+        per_row = best_of(fns['per_row'], args.repeat)
+        core = best_of(fns['core'], args.repeat)
+        results.append({
+            'shape': shape,
+            'rows': len(naive),
+            'per_row_ms': round(per_row * 1000, 1),
+            'core_ms': round(core * 1000, 1),
+            'speedup': round(per_row / core, 1) if core else None,
+            'matches_reference': matches
+        })
+        print(f"   {shape:6s} per-row {per_row * 1000:7.1f}ms  core {core * 1000:7.1f}ms  "
+              f"x{per_row / core:5.1f}  {'✅' if matches else '❌ mismatch'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Boba BI Serving Benchmark - Flask (threaded) vs. ASGI (async)
+
+Starts each server locally with the offline LLM stand-in, fires N concurrent
+POST /api/schedule requests with distinct queries (so nothing is coalesced)
+and reports throughput, latency percentiles and peak server thread count.
+
+Usage:
+    python bench_serving.py --requests 300 --latency-ms 1000
+Requires flask/flask-cors for the Flask mode and uvicorn for the ASGI mode.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+from typing import Dict, List, Optional
+
+SERVER_COMMANDS = {
+    'flask': [sys.executable, 'api_server.py'],
+    'asgi': [sys.executable, 'asgi_server.py']
+}
+SERVER_PORTS = {'flask': 5000, 'asgi': 5001}
+
+
+async def http_request(host: str, port: int, method: str, path: str,
+                       body: Optional[Dict] = None, timeout: float = 120.0,
+                       content_type: str = 'application/json'):
+    """
+    Minimal HTTP/1.1 client (one connection per request); returns (status, body)
+
+    body is JSON-encoded unless it is already bytes.
+    """
+    if isinstance(body, bytes):
+        payload = body
+    else:
+        payload = json.dumps(body).encode() if body is not None else b''
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + payload
+        )
+        await writer.drain()
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, response_body = raw.partition(b'\r\n\r\n')
+    return int(head.split(b' ', 2)[1]), response_body
+
+
+def server_threads(pid: int) -> int:
+    """Current OS thread count of a process (Linux /proc)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def server_rss_mb(pid: int) -> float:
+    """Current resident memory of a process in MB (Linux /proc)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def start_server(mode: str, latency_ms: float, port: Optional[int] = None) -> subprocess.Popen:
+    env = dict(os.environ,
+               **{'FLASK_PORT' if mode == 'flask' else 'ASGI_PORT': str(port or SERVER_PORTS[mode])},
+               BOBA_BI_OFFLINE_LLM='1',
+               BOBA_BI_OFFLINE_LATENCY_MS=str(latency_ms),
+               BOBA_BI_OFFLINE_JITTER_MS=str(latency_ms / 10),
+               LLM_REQUESTS_PER_MINUTE='1000000',
+               LLM_TOKENS_PER_MINUTE='1000000000',
+               FLASK_DEBUG='false')
+    return subprocess.Popen(SERVER_COMMANDS[mode], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_until_ready(port: int, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, _ = await http_request('127.0.0.1', port, 'GET', '/', timeout=2)
+            if status == 200:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+async def run_mode(mode: str, requests: int, latency_ms: float) -> Dict:
+    port = SERVER_PORTS[mode]
+    process = start_server(mode, latency_ms)
+    try:
+        await wait_until_ready(port)
+        peak_threads = server_threads(process.pid)
+        latencies, errors = [], 0
+
+        async def one(i: int):
+            nonlocal errors
+            start = time.perf_counter()
+            try:
+                status, _ = await http_request('127.0.0.1', port, 'POST', '/api/schedule',
+                                               {'query': f"Benchmark schedule request {i}"})
+                if status != 200:
+                    errors += 1
+            except (OSError, asyncio.TimeoutError):
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+        async def sample_threads():
+            nonlocal peak_threads
+            while True:
+                peak_threads = max(peak_threads, server_threads(process.pid))
+                await asyncio.sleep(0.05)
+
+        sampler = asyncio.ensure_future(sample_threads())
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+
+        return {
+            'mode': mode,
+            'requests': requests,
+            'errors': errors,
+            'elapsed_s': round(elapsed, 2),
+            'throughput_rps': round(requests / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+            'peak_server_threads': peak_threads
+        }
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Flask and ASGI serving modes")
+    parser.add_argument('--requests', type=int, default=300, help="Concurrent schedule requests")
+    parser.add_argument('--latency-ms', type=float, default=1000, help="Offline LLM latency per call")
+    parser.add_argument('--modes', default='flask,asgi', help="Comma-separated modes to run")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes.split(','):
+        print(f"⏱️  Benchmarking {mode} with {args.requests} concurrent requests...")
+        result = asyncio.run(run_mode(mode, args.requests, args.latency_ms))
+        results.append(result)
+        print(f"   {result['throughput_rps']} req/s, p50 {result['p50_ms']}ms, p95 {result['p95_ms']}ms, "
+              f"p99 {result['p99_ms']}ms, errors {result['errors']}, peak threads {result['peak_server_threads']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
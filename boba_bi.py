@@ -4,18 +4,41 @@ Multi-Agent System for Optimal Employee Scheduling
 
 Architecture:
 - DataAnalyst Agent: Analyzes historical POS traffic patterns
-- WeatherAgent: Fetches weather forecasts and impact analysis
+- WeatherAgent: Fetches weather forecasts and computes traffic multipliers
 - SchedulerAgent: Creates optimal employee schedules
 - Orchestrator: Coordinates agents and generates reports
 """
 
-import anthropic
-import json
+import os
+import asyncio
 import random
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import csv
-from collections import defaultdict
+from weather_provider import (
+    WeatherProvider,
+    FixtureWeatherProvider,
+    compute_weather_multipliers,
+    summarize_weather
+)
+from prompt_builder import (
+    build_data_analyst_request,
+    build_weather_narrative_request,
+    usage_record
+)
+from llm_client import LazyLLMClient, async_client_for, create_llm_client, create_async_llm_client
+from llm_limiter import LLMLimiter, LLMOverloadedError, LimitedLLMClient, AsyncLimitedLLMClient, shared_limiter
+from llm_resilience import LLMGuard, LLMUnavailableError, shared_guard
+from time_buckets import (
+    SHOP_TIMEZONE,
+    local_now,
+    epoch_us_to_seconds,
+    weekday_hour_counts,
+    weekday_hour_counts_epoch,
+    shift_traffic_summary
+)
+from capacity import CapacityModel, build_capacity_model
+from demand_sketches import parse_percentile
 
 # ============================================================================
 # CONFIGURATION
@@ -24,12 +47,18 @@ from collections import defaultdict
 ANTHROPIC_API_KEY = "sk-ant-REDACTED" # Replace with actual API key
 PARALLEL_API_KEY = "C8f8vbPIU0wI0-L0a7RuoUhgGLlPtJ61cW1-scnp"  # Parallel API for weather/external data
 SHOP_LOCATION = "San Diego, CA"
+WEATHER_FIXTURE_PATH = os.getenv('WEATHER_FIXTURE_PATH')  # Optional local forecast fixture (JSON)
 FIXED_SHIFTS = {
     "morning": {"start": "08:00", "end": "16:00", "hours": 8},
     "evening": {"start": "16:00", "end": "00:00", "hours": 8}
 }
 MIN_STAFF_PER_SHIFT = 2
 MAX_HOURS_PER_WEEK = 40
+ORDERS_PER_STAFF = 15  # Orders per hour one employee can handle
+MAX_HORIZON_WEEKS = 26
+EXCLUDE_ANOMALIES = os.getenv('BOBA_BI_EXCLUDE_ANOMALIES', '').lower() in ('1', 'true', 'yes')  # Drop flagged hours from traffic summaries
+STAFFING_PERCENTILE = parse_percentile(os.getenv('BOBA_BI_STAFFING_PERCENTILE'))  # e.g. 'p90'; unset staffs to the mean
+STAFFING_MODEL = os.getenv('BOBA_BI_STAFFING_MODEL', 'ratio')  # 'ratio' (orders / ORDERS_PER_STAFF) or 'queueing'
 
 # ============================================================================
 # SYNTHETIC DATA GENERATION
@@ -40,7 +69,7 @@ def generate_synthetic_pos_data(weeks: int = 100) -> List[Dict]:
     print(f"Generating {weeks} weeks of POS data...")
     
     transactions = []
-    start_date = datetime.now() - timedelta(weeks=weeks)
+    start_date = local_now() - timedelta(weeks=weeks)
     
     # Traffic patterns (orders per hour by day and time)
     traffic_patterns = {
@@ -123,35 +152,62 @@ def generate_employee_data(num_employees: int = 10) -> List[Dict]:
 # TOOL FUNCTIONS
 # ============================================================================
 
-def analyze_traffic_patterns(pos_data: List[Dict], days_back: int = 28) -> Dict:
-    """Analyze historical traffic patterns"""
-    cutoff_date = datetime.now() - timedelta(days=days_back)
+def analyze_traffic_patterns(pos_data: List[Dict], days_back: int = 28, tz: Optional[str] = None,
+                             anomalies: Any = None) -> Dict:
+    """
+    Analyze historical traffic patterns (average orders per shift hour, by shop-local weekday)
     
-    # Group by day of week and shift
-    traffic = defaultdict(lambda: {'morning': [], 'evening': []})
+    With an anomaly detector (see traffic_anomalies.py), hours it flagged
+    count at their expected volume instead of what was observed.
+    """
+    cutoff_date = local_now(tz) - timedelta(days=days_back)
     
-    for transaction in pos_data:
-        tx_time = datetime.fromisoformat(transaction['timestamp'])
-        if tx_time < cutoff_date:
-            continue
-        
-        day_name = tx_time.strftime('%A')
-        hour = tx_time.hour
-        
-        if 8 <= hour < 16:
-            traffic[day_name]['morning'].append(transaction)
-        elif 16 <= hour < 24:
-            traffic[day_name]['evening'].append(transaction)
+    if hasattr(pos_data, 'columns'):
+        # Shared-memory store: bucket the epoch column in one batch
+        epochs = epoch_us_to_seconds(pos_data.columns()['ts_us'])
+        counts = weekday_hour_counts_epoch(epochs, tz, since=cutoff_date)
+    else:
+        counts = weekday_hour_counts((transaction['timestamp'] for transaction in pos_data), tz, since=cutoff_date)
     
-    # Calculate average orders per hour
-    summary = {}
-    for day, shifts in traffic.items():
-        summary[day] = {
-            'morning': len(shifts['morning']) / 8,  # 8 hours
-            'evening': len(shifts['evening']) / 8
-        }
+    if anomalies is not None:
+        for slot, correction in anomalies.count_corrections(cutoff_date).items():
+            counts[slot] = max(0, counts[slot] + correction)
     
-    return summary
+    return shift_traffic_summary(counts)
+
+
+def summarize_traffic_patterns(traffic_summary: Dict[str, Dict[str, float]]) -> str:
+    """Deterministic plain-text traffic analysis, used when the data analyst LLM is unavailable"""
+    shifts = sorted(((orders, day, shift) for day, by_shift in traffic_summary.items()
+                     for shift, orders in by_shift.items()), reverse=True)
+    if not shifts:
+        return "Traffic analysis unavailable. No recent POS data."
+    
+    describe = lambda entries: ', '.join(f"{day} {shift} ({orders:.0f}/hr)" for orders, day, shift in entries)
+    average = sum(orders for orders, _, _ in shifts) / len(shifts)
+    peak_orders, peak_day, peak_shift = shifts[0]
+    peak_staff = max(MIN_STAFF_PER_SHIFT, int(peak_orders / ORDERS_PER_STAFF))
+    return "\n".join([
+        "Local traffic analysis (AI analyst unavailable):",
+        f"- Busiest shifts: {describe(shifts[:3])}",
+        f"- Quietest shifts: {describe(shifts[:-4:-1])}",
+        f"- Average across all shifts: {average:.1f} orders/hr",
+        f"- Staffing: one employee per {ORDERS_PER_STAFF} orders/hr with at least {MIN_STAFF_PER_SHIFT} per shift; "
+        f"{peak_day} {peak_shift} needs {peak_staff}"
+    ])
+
+
+def horizon_dates(horizon_weeks: int = 1, start: Optional[datetime] = None) -> List[str]:
+    """Planning dates for a horizon of whole weeks (1 to MAX_HORIZON_WEEKS) starting tomorrow"""
+    if not isinstance(horizon_weeks, int) or not 1 <= horizon_weeks <= MAX_HORIZON_WEEKS:
+        raise ValueError(f"horizon_weeks must be an integer from 1 to {MAX_HORIZON_WEEKS}")
+    return next_week_dates(start, days=7 * horizon_weeks)
+
+
+def next_week_dates(start: Optional[datetime] = None, days: int = 7) -> List[str]:
+    """ISO dates for the planning window starting the day after start (default: now)"""
+    start = start or local_now()
+    return [(start + timedelta(days=i)).date().isoformat() for i in range(1, days + 1)]
 
 
 def get_available_employees(employees: List[Dict], day: str, shift: str) -> List[Dict]:
@@ -180,6 +236,91 @@ def get_available_employees(employees: List[Dict], day: str, shift: str) -> List
     return available
 
 
+def week_start(date: str) -> str:
+    """ISO date of the Monday starting the calendar week that contains date"""
+    day = datetime.fromisoformat(date).date()
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def build_schedule(traffic_data: Dict, dates: List[str], employees: List[Dict],
+                   weather_multipliers: Optional[Dict[str, float]] = None,
+                   min_staff_per_shift: int = MIN_STAFF_PER_SHIFT,
+                   max_hours_per_week: int = MAX_HOURS_PER_WEEK,
+                   orders_per_staff: float = ORDERS_PER_STAFF,
+                   hours_worked: Optional[Dict[str, Dict[Any, int]]] = None,
+                   capacity: Optional[CapacityModel] = None) -> List[Dict]:
+    """
+    Assign employees to each date's shifts (pure: no agents or I/O)
+    
+    MAX_HOURS_PER_WEEK applies per calendar week (Monday-Sunday), so dates may
+    span any number of weeks. hours_worked ({week_start: {employee_id: hours}})
+    seeds hours already scheduled, e.g. earlier days of a partial first week.
+    With a capacity model, staff needed comes from its queueing tables
+    instead of orders / orders_per_staff.
+    """
+    schedule = []
+    weather_multipliers = weather_multipliers or {}
+    weekly_hours: Dict[str, Dict[Any, int]] = {}
+    
+    # Availability only depends on weekday/weekend and shift: filter the roster once per combination
+    candidates = {
+        (is_weekend, shift_name): get_available_employees(employees, 'Saturday' if is_weekend else 'Monday', shift_name)
+        for is_weekend in (False, True) for shift_name in FIXED_SHIFTS
+    }
+    
+    # Create schedule for each day and shift
+    for date in dates:
+        dt = datetime.fromisoformat(date)
+        day_name = dt.strftime('%A')
+        week = week_start(date)
+        employee_hours = weekly_hours.get(week)
+        if employee_hours is None:
+            employee_hours = {emp['employee_id']: 0 for emp in employees}
+            employee_hours.update((hours_worked or {}).get(week, {}))
+            weekly_hours[week] = employee_hours
+        
+        for shift_name, shift_info in FIXED_SHIFTS.items():
+            # Calculate needed staff
+            base_traffic = traffic_data.get(day_name, {}).get(shift_name, 20)
+            adjusted_traffic = base_traffic * weather_multipliers.get(date, 1.0)
+            if capacity is not None:
+                demand = capacity.shift_staff(day_name, shift_name, weather_multipliers.get(date, 1.0))
+            else:
+                demand = int(adjusted_traffic / orders_per_staff)
+            staff_needed = max(min_staff_per_shift, demand)
+            
+            # Sort available employees by preference score and hours so far this week
+            available = sorted(
+                candidates[(dt.weekday() >= 5, shift_name)],
+                key=lambda x: (x['preference_score'], -employee_hours[x['employee_id']]),
+                reverse=True
+            )
+            
+            # Assign staff
+            assigned = []
+            for emp in available:
+                if len(assigned) >= staff_needed:
+                    break
+                if employee_hours[emp['employee_id']] + shift_info['hours'] <= max_hours_per_week:
+                    assigned.append(emp)
+                    employee_hours[emp['employee_id']] += shift_info['hours']
+            
+            # Add to schedule
+            schedule.append({
+                'date': date,
+                'day': day_name,
+                'shift': shift_name,
+                'shift_time': f"{shift_info['start']}-{shift_info['end']}",
+                'staff_needed': staff_needed,
+                'staff_assigned': len(assigned),
+                'employees': [emp['name'] for emp in assigned],
+                'employee_ids': [emp['employee_id'] for emp in assigned],
+                'predicted_orders_per_hour': round(adjusted_traffic, 1)
+            })
+    
+    return schedule
+
+
 # ============================================================================
 # MULTI-AGENT SYSTEM
 # ============================================================================
@@ -187,201 +328,268 @@ def get_available_employees(employees: List[Dict], day: str, shift: str) -> List
 class BobaBI:
     """Multi-agent orchestrator for Boba BI"""
     
-    def __init__(self, api_key: str, pos_data: List[Dict], employees: List[Dict]):
-        self.client = anthropic.Anthropic(api_key=api_key)
+    def __init__(self, api_key: Optional[str], pos_data: List[Dict], employees: List[Dict],
+                 weather_provider: Optional[WeatherProvider] = None,
+                 narrate_weather: bool = False,
+                 client: Any = None,
+                 limiter: Optional[LLMLimiter] = None,
+                 async_client: Any = None,
+                 history: Any = None,
+                 anomaly_detector: Any = None,
+                 demand_sketches: Any = None,
+                 guard: Optional[LLMGuard] = None):
+        self._init_runtime(api_key, weather_provider=weather_provider, narrate_weather=narrate_weather,
+                           client=client, limiter=limiter, async_client=async_client, history=history,
+                           anomaly_detector=anomaly_detector, demand_sketches=demand_sketches, guard=guard)
         self.pos_data = pos_data
         self.employees = employees
+    
+    def _init_runtime(self, api_key: Optional[str],
+                      weather_provider: Optional[WeatherProvider] = None,
+                      narrate_weather: bool = False,
+                      client: Any = None,
+                      limiter: Optional[LLMLimiter] = None,
+                      async_client: Any = None,
+                      history: Any = None,
+                      anomaly_detector: Any = None,
+                      demand_sketches: Any = None,
+                      guard: Optional[LLMGuard] = None):
+        """State shared by every BobaBI variant apart from its data sources (pos_data, employees)"""
+        # Any object with an Anthropic-style messages.create() can be injected;
+        # all calls go through the shared rate limiter and, for deadlines,
+        # retries and the circuit breaker, the shared guard
+        self.client = LimitedLLMClient(client or LazyLLMClient(lambda: create_llm_client(api_key)),
+                                       limiter or shared_limiter())
+        self.guard = guard or shared_guard()
+        self._api_key = api_key
+        self._async_client = async_client
         self.model = "claude-3-5-haiku-20241022"
+        self.weather_provider = weather_provider or FixtureWeatherProvider(WEATHER_FIXTURE_PATH)
+        self.narrate_weather = narrate_weather
+        self.llm_usage: List[Dict[str, int]] = []
+        self._data_version = 0
+        self._traffic_cache = None
+        self._capacity_cache = None
+        # Optional ScheduleHistory: generated schedules are recorded and count
+        # against weekly hour caps when the same weeks are planned again
+        self.history = history
+        # Optional TrafficAnomalyDetector; with exclude_anomalies its flagged
+        # hours are replaced by their expected volume in traffic_summary()
+        self.anomaly_detector = anomaly_detector
+        self.exclude_anomalies = EXCLUDE_ANOMALIES
+        # Optional DemandSketches; with staffing_percentile set, traffic_summary()
+        # staffs each weekday-hour to that quantile of its hourly orders
+        self.demand_sketches = demand_sketches
+        self.staffing_percentile = STAFFING_PERCENTILE
+    
+    @property
+    def data_version(self) -> tuple:
+        """Combined version of the POS data, the roster and manual change marks"""
+        return (getattr(self.pos_data, 'version', 0), getattr(self.employees, 'version', 0), self._data_version)
     
-    def data_analyst_agent(self, query: str) -> str:
+    def mark_data_changed(self):
+        """Bump the data version after updates to plain-list POS or roster data"""
+        self._data_version += 1
+    
+    def traffic_summary(self) -> Dict[str, Dict[str, float]]:
+        """Average (or staffing_percentile) orders per hour by day and shift over the last 4 weeks"""
+        # Memoized per data version and minute so concurrent requests share one pass
+        anomalies = self.anomaly_detector if self.exclude_anomalies else None
+        sketches = self.demand_sketches if self.staffing_percentile else None
+        key = (self.data_version, datetime.now().strftime('%Y-%m-%dT%H:%M'),
+               anomalies.version if anomalies is not None else None,
+               (sketches.version, self.staffing_percentile) if sketches is not None else None)
+        cached = self._traffic_cache
+        if cached is None or cached[0] != key:
+            if sketches is not None and sketches.stores():
+                summary = sketches.traffic_summary(self.staffing_percentile, days_back=28)
+            else:
+                summary = analyze_traffic_patterns(self.pos_data, days_back=28, anomalies=anomalies)
+            cached = (key, summary)
+            self._traffic_cache = cached
+        return cached[1]
+    
+    def capacity_model(self) -> CapacityModel:
+        """Queueing capacity model over the last 4 weeks, rebuilt when the data changes"""
+        cached = self._capacity_cache
+        if cached is None or cached[0] != self.data_version:
+            cached = (self.data_version, build_capacity_model(self.pos_data, days_back=28))
+            self._capacity_cache = cached
+        return cached[1]
+    
+    def call_llm(self, agent: str, request: Dict[str, Any]) -> Any:
+        """
+        Send one messages.create() request and record its token usage
+        
+        Raises LLMUnavailableError when the call fails, misses its deadline
+        or the circuit is open, and LLMOverloadedError when it is shed.
+        """
+        client = self.client
+        response = self.guard.call(lambda: client.send(request), lambda timeout: client.reserve(request, timeout))
+        self._record_usage(agent, response)
+        return response
+    
+    async def call_llm_async(self, agent: str, request: Dict[str, Any]) -> Any:
+        """Async version of call_llm() using the async client"""
+        client = self.get_async_client()
+        response = await self.guard.call_async(lambda: client.send(request),
+                                               lambda timeout: client.reserve(request, timeout))
+        self._record_usage(agent, response)
+        return response
+    
+    def _fallback(self, agent: str, error: Exception, text: str) -> str:
+        """Local text for an agent whose LLM call could not complete"""
+        self.guard.record_fallback()
+        print(f"[LLM] {agent}: {error}; using local fallback")
+        return text
+    
+    def get_async_client(self) -> Any:
+        """
+        Async LLM client, created on first use and sharing the rate limiter
+
+        Without an injected async_client it follows the sync client: an
+        injected client is adapted by async_client_for(), the default one is
+        built from the API key.
+        """
+        if self._async_client is None:
+            sync_client = self.client.client
+            if isinstance(sync_client, LazyLLMClient):
+                self._async_client = create_async_llm_client(self._api_key)
+            else:
+                self._async_client = async_client_for(sync_client)
+        if not isinstance(self._async_client, AsyncLimitedLLMClient):
+            self._async_client = AsyncLimitedLLMClient(self._async_client, self.client.limiter)
+        return self._async_client
+    
+    def _record_usage(self, agent: str, response: Any):
+        usage = usage_record(agent, response)
+        self.llm_usage.append(usage)
+        print(f"[LLM] {agent}: {usage['input_tokens']} input tokens "
+              f"({usage['cache_read_input_tokens']} cached), {usage['output_tokens']} output tokens")
+    
+    def data_analyst_agent(self, query: str, traffic_summary: Optional[Dict] = None) -> str:
         """Agent specialized in analyzing historical POS data"""
         
-        # Analyze traffic patterns
-        traffic_summary = analyze_traffic_patterns(self.pos_data, days_back=28)
+        traffic_summary = traffic_summary or self.traffic_summary()
+        request = build_data_analyst_request(self.model, traffic_summary, query)
+        try:
+            response = self.call_llm('data_analyst', request)
+        except (LLMUnavailableError, LLMOverloadedError) as e:
+            return self._fallback('data_analyst', e, summarize_traffic_patterns(traffic_summary))
         
-        prompt = f"""You are a Data Analyst Agent for Boba BI. Analyze the following traffic data and provide insights.
-
-Historical Traffic Data (Average Orders per Hour, Last 4 Weeks):
-{json.dumps(traffic_summary, indent=2)}
-
-Business Owner Query: {query}
-
-Provide a concise analysis of:
-1. Peak hours by day
-2. Recommended staffing levels (orders per hour / 15 = staff needed)
-3. Key patterns and trends
-
-Keep response under 200 words."""
-
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1000,
-            messages=[{"role": "user", "content": prompt}]
-        )
+        return response.content[0].text
+    
+    async def data_analyst_agent_async(self, query: str, traffic_summary: Dict) -> str:
+        """Async version of data_analyst_agent()"""
+        
+        request = build_data_analyst_request(self.model, traffic_summary, query)
+        try:
+            response = await self.call_llm_async('data_analyst', request)
+        except (LLMUnavailableError, LLMOverloadedError) as e:
+            return self._fallback('data_analyst', e, summarize_traffic_patterns(traffic_summary))
         
         return response.content[0].text
     
+    def weather_summary(self, dates: List[str]) -> str:
+        """Locally computed forecast and traffic impact summary"""
+        forecasts = self.weather_provider.get_forecasts(SHOP_LOCATION, dates)
+        return summarize_weather(forecasts, compute_weather_multipliers(forecasts))
+    
     def weather_agent(self, dates: List[str]) -> str:
-        """Agent that fetches weather forecasts and analyzes impact"""
-        
-        # Create date range string
-        date_range = f"{dates[0]} to {dates[-1]}"
-        
-        # Use parallel function calling to search for weather
-        tools = [
-            {
-                "name": "web_search",
-                "description": "Search the web for weather forecasts",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": "Search query"
-                        }
-                    },
-                    "required": ["query"]
-                }
-            }
-        ]
-        
-        prompt = f"""You are a Weather Analysis Agent for Boba BI in {SHOP_LOCATION}.
-
-Task: Search for weather forecast for {date_range} and analyze its impact on boba shop traffic.
-
-Use the web_search tool to find:
-1. Weather forecast for {SHOP_LOCATION} for the next 7 days
-2. Temperature and precipitation predictions
-
-Then analyze how weather affects boba shop traffic:
-- Hot weather (>75°F): +20% traffic
-- Rainy weather: -30% traffic
-- Mild weather: baseline traffic
-
-Provide a concise summary with daily weather impact predictions."""
-
-        messages = [{"role": "user", "content": prompt}]
-        
-        # Agent loop with tool use
-        weather_analysis = ""
-        for _ in range(3):  # Max 3 iterations
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,
-                tools=tools,
-                messages=messages
-            )
-            
-            if response.stop_reason == "end_turn":
-                # Extract final text
-                for block in response.content:
-                    if hasattr(block, 'text'):
-                        weather_analysis += block.text
-                break
-            
-            if response.stop_reason == "tool_use":
-                # Process tool calls
-                messages.append({"role": "assistant", "content": response.content})
-                
-                tool_results = []
-                for block in response.content:
-                    if block.type == "tool_use":
-                        # Simulate tool result (in real implementation, this would call web_search)
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": f"Weather forecast for {SHOP_LOCATION}: Next 7 days will be mostly sunny with temperatures ranging from 72-78°F. Light rain expected on day 3 and day 6. No extreme weather conditions."
-                        })
-                
-                messages.append({"role": "user", "content": tool_results})
+        """Agent that fetches weather forecasts and summarizes their impact"""
         
-        return weather_analysis if weather_analysis else "Weather analysis unavailable. Assuming baseline traffic."
+        summary = self.weather_summary(dates)
+        if not self.narrate_weather:
+            return summary
+        
+        # Multipliers are computed locally; the LLM only writes the narrative
+        request = build_weather_narrative_request(self.model, SHOP_LOCATION, summary)
+        try:
+            response = self.call_llm('weather', request)
+        except (LLMUnavailableError, LLMOverloadedError) as e:
+            return self._fallback('weather', e, summary)
+        
+        return response.content[0].text
+    
+    async def weather_agent_async(self, dates: List[str]) -> str:
+        """Async version of weather_agent()"""
+        
+        summary = self.weather_summary(dates)
+        if not self.narrate_weather:
+            return summary
+        
+        request = build_weather_narrative_request(self.model, SHOP_LOCATION, summary)
+        try:
+            response = await self.call_llm_async('weather', request)
+        except (LLMUnavailableError, LLMOverloadedError) as e:
+            return self._fallback('weather', e, summary)
+        
+        return response.content[0].text
     
-    def scheduler_agent(self, traffic_data: Dict, weather_impact: str, dates: List[str]) -> List[Dict]:
+    def weather_multipliers(self, dates: List[str]) -> Dict[str, float]:
+        """Per-date traffic multipliers from the weather provider"""
+        forecasts = self.weather_provider.get_forecasts(SHOP_LOCATION, dates)
+        return compute_weather_multipliers(forecasts)
+    
+    def scheduler_agent(self, traffic_data: Dict, weather_impact: str, dates: List[str],
+                        weather_multipliers: Optional[Dict[str, float]] = None) -> List[Dict]:
         """Agent that creates optimal employee schedules"""
         
-        schedule = []
-        employee_hours = {emp['employee_id']: 0 for emp in self.employees}
+        # Numeric weather impact per date (weather_impact is narrative only)
+        if weather_multipliers is None:
+            weather_multipliers = self.weather_multipliers(dates)
         
-        # Parse weather impact (simplified - in production, use LLM to extract)
-        weather_multipliers = {}
-        for i, date in enumerate(dates):
-            day_name = datetime.fromisoformat(date).strftime('%A')
-            # Simulate weather impact
-            if i in [2, 5]:  # Rainy days
-                weather_multipliers[date] = 0.7
-            else:
-                weather_multipliers[date] = 1.1  # Good weather
+        capacity = self.capacity_model() if STAFFING_MODEL == 'queueing' else None
+        return build_schedule(traffic_data, dates, self.employees, weather_multipliers,
+                              hours_worked=self.hours_worked(dates), capacity=capacity)
+    
+    def hours_worked(self, dates: List[str]) -> Optional[Dict[str, Dict[Any, int]]]:
+        """Hours already scheduled in the weeks of dates (outside dates), from the history"""
+        return self.history.hours_worked(dates) if self.history is not None else None
+    
+    def record_schedule(self, schedule: List[Dict]):
+        """Store a generated schedule in the history (no-op without one)"""
+        if self.history is not None:
+            self.history.record(schedule, self.employees)
+    
+    def orchestrator(self, query: str, dates: Optional[List[str]] = None,
+                     horizon_weeks: int = 1, record: bool = True) -> Dict[str, Any]:
+        """
+        Main orchestrator that coordinates all agents
         
-        # Create schedule for each day and shift
-        for date in dates:
-            dt = datetime.fromisoformat(date)
-            day_name = dt.strftime('%A')
-            
-            for shift_name, shift_info in FIXED_SHIFTS.items():
-                # Calculate needed staff
-                base_traffic = traffic_data.get(day_name, {}).get(shift_name, 20)
-                adjusted_traffic = base_traffic * weather_multipliers.get(date, 1.0)
-                staff_needed = max(MIN_STAFF_PER_SHIFT, int(adjusted_traffic / 15))
-                
-                # Get available employees
-                available = get_available_employees(self.employees, day_name, shift_name)
-                
-                # Sort by preference score and current hours
-                available.sort(key=lambda x: (x['preference_score'], -employee_hours[x['employee_id']]), reverse=True)
-                
-                # Assign staff
-                assigned = []
-                for emp in available:
-                    if len(assigned) >= staff_needed:
-                        break
-                    if employee_hours[emp['employee_id']] + shift_info['hours'] <= MAX_HOURS_PER_WEEK:
-                        assigned.append(emp)
-                        employee_hours[emp['employee_id']] += shift_info['hours']
-                
-                # Add to schedule
-                schedule.append({
-                    'date': date,
-                    'day': day_name,
-                    'shift': shift_name,
-                    'shift_time': f"{shift_info['start']}-{shift_info['end']}",
-                    'staff_needed': staff_needed,
-                    'staff_assigned': len(assigned),
-                    'employees': [emp['name'] for emp in assigned],
-                    'predicted_orders_per_hour': round(adjusted_traffic, 1)
-                })
-        
-        return schedule
-    
-    def orchestrator(self, query: str) -> Dict[str, Any]:
-        """Main orchestrator that coordinates all agents"""
+        With record=False (speculative drafts, e.g. the off-peak precompute)
+        the schedule is not stored in the history; record_schedule() it once
+        it is actually served.
+        """
         
         print("\n" + "="*60)
         print("BOBA BI - MULTI-AGENT SCHEDULING SYSTEM")
         print("="*60)
         
-        # Generate dates for next 7 days
-        dates = [(datetime.now() + timedelta(days=i)).date().isoformat() 
-                 for i in range(1, 8)]
+        # Planning window: horizon_weeks whole weeks starting tomorrow
+        dates = dates or horizon_dates(horizon_weeks)
         
         print("\n[ORCHESTRATOR] Analyzing business query...")
         print(f"Query: {query}")
         
         # Step 1: Data Analyst Agent
         print("\n[DATA ANALYST AGENT] Analyzing historical traffic patterns...")
-        traffic_analysis = self.data_analyst_agent(query)
-        traffic_data = analyze_traffic_patterns(self.pos_data, days_back=28)
+        traffic_data = self.traffic_summary()
+        traffic_analysis = self.data_analyst_agent(query, traffic_data)
         print(traffic_analysis)
         
-        # Step 2: Weather Agent (with parallel search)
+        # Step 2: Weather Agent (local provider, numeric multipliers)
         print("\n[WEATHER AGENT] Fetching weather forecasts and impact analysis...")
         weather_analysis = self.weather_agent(dates)
+        weather_multipliers = self.weather_multipliers(dates)
         print(weather_analysis)
         
         # Step 3: Scheduler Agent
         print("\n[SCHEDULER AGENT] Creating optimal employee schedule...")
-        schedule = self.scheduler_agent(traffic_data, weather_analysis, dates)
+        schedule = self.scheduler_agent(traffic_data, weather_analysis, dates, weather_multipliers)
         print(f"Generated schedule for {len(schedule)} shifts")
+        if record:
+            self.record_schedule(schedule)
         
         # Step 4: Generate Final Report
         print("\n[ORCHESTRATOR] Compiling final report...")
@@ -393,6 +601,36 @@ Provide a concise summary with daily weather impact predictions."""
             'schedule': schedule,
             'dates': dates
         }
+    
+    async def orchestrator_async(self, query: str, dates: Optional[List[str]] = None,
+                                 horizon_weeks: int = 1, record: bool = True) -> Dict[str, Any]:
+        """
+        Async orchestrator for the ASGI server
+        
+        LLM calls are awaited (analyst and weather run concurrently) and the
+        CPU-bound steps run in the event loop's default executor, so many
+        requests can be in flight on a small, fixed number of threads.
+        """
+        dates = dates or horizon_dates(horizon_weeks)
+        
+        traffic_data = await asyncio.to_thread(self.traffic_summary)
+        traffic_analysis, weather_analysis = await asyncio.gather(
+            self.data_analyst_agent_async(query, traffic_data),
+            self.weather_agent_async(dates)
+        )
+        schedule = await asyncio.to_thread(
+            self.scheduler_agent, traffic_data, weather_analysis, dates, self.weather_multipliers(dates)
+        )
+        if record:
+            await asyncio.to_thread(self.record_schedule, schedule)
+        
+        return {
+            'query': query,
+            'traffic_analysis': traffic_analysis,
+            'weather_analysis': weather_analysis,
+            'schedule': schedule,
+            'dates': dates
+        }
 
 
 # ============================================================================
@@ -5,121 +5,174 @@ Modified version that reads from and writes to Supabase
 
 import os
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from boba_bi import (
     BobaBI,
+    horizon_dates,
+    week_start,
     ANTHROPIC_API_KEY,
     FIXED_SHIFTS,
     print_schedule_table,
     generate_csv_report
 )
+from data_store import VersionedStore
+from supabase_sync import SupabaseSync
 from supabase_config import (
+    load_environment,
     get_supabase_client,
     get_all_employees,
     get_pos_transactions,
     save_schedule,
-    get_traffic_analysis
+    get_traffic_analysis,
+    get_employee_week_hours
 )
 
 
+def unplanned_days(dates: List[str]) -> List[Tuple[str, str]]:
+    """(first, last) runs of days in the calendar weeks of dates that are not themselves in dates"""
+    planned = set(dates)
+    runs: List[Tuple[str, str]] = []
+    for week in sorted({week_start(date) for date in dates}):
+        monday = datetime.fromisoformat(week).date()
+        for offset in range(7):
+            day = (monday + timedelta(days=offset)).isoformat()
+            if day in planned:
+                continue
+            if runs and runs[-1][1] == (monday + timedelta(days=offset - 1)).isoformat():
+                runs[-1] = (runs[-1][0], day)
+            else:
+                runs.append((day, day))
+    return runs
+
+
 class BobaBISupabase(BobaBI):
     """Extended BobaBI class that uses Supabase for data storage"""
     
-    def __init__(self, api_key: str):
-        """Initialize with Supabase client"""
+    def __init__(self, api_key: Optional[str], client: Any = None, use_local_cache: bool = True):
+        """
+        Initialize with Supabase client
+        
+        With use_local_cache, data is served from a local SQLite copy kept
+        current by SupabaseSync: the first start does one full load, later
+        starts fetch only rows newer than the stored high-watermark.
+        """
         from datetime import timezone
         
-        # Initialize Anthropic client (use 'client' to match parent class)
-        self.client = __import__('anthropic').Anthropic(api_key=api_key)
-        self.model = "claude-3-5-haiku-20241022"
+        # LLM client, guard and caches as in BobaBI; schedules are saved to
+        # Supabase instead of a local ScheduleHistory
+        self._init_runtime(api_key, client=client)
         
         # Initialize Supabase
         self.supabase = get_supabase_client()
         print("✅ Connected to Supabase")
         
-        # Load data from Supabase
-        print("📊 Loading data from Supabase...")
-        self.employees = get_all_employees(self.supabase)
-        
         # Load last 100 weeks of POS data (timezone-aware)
         start_date = datetime.now(timezone.utc) - timedelta(weeks=100)
-        self.pos_data = get_pos_transactions(
-            self.supabase,
-            start_date=start_date,
-            limit=50000
-        )
-        
-        # Convert timestamp strings to timezone-aware datetime objects
-        for tx in self.pos_data:
-            if isinstance(tx['timestamp'], str):
-                tx['timestamp'] = datetime.fromisoformat(
-                    tx['timestamp'].replace('Z', '+00:00')
-                ).isoformat()
+        self.sync = SupabaseSync(self.supabase) if use_local_cache else None
+        
+        if self.sync is not None:
+            print("📊 Syncing data from Supabase...")
+            self._print_sync_stats(self.sync.sync())
+            self.employees = VersionedStore(self.sync.rows('employees'))
+            self.pos_data = VersionedStore(self.sync.rows('pos_transactions', since=start_date))
+        else:
+            # Load data from Supabase
+            print("📊 Loading data from Supabase...")
+            self.employees = VersionedStore(get_all_employees(self.supabase))
+            self.pos_data = VersionedStore(get_pos_transactions(
+                self.supabase,
+                start_date=start_date,
+                limit=50000
+            ))
         
         print(f"✅ Loaded {len(self.employees)} employees")
         print(f"✅ Loaded {len(self.pos_data)} POS transactions")
     
-    def data_analyst_agent(self, query: str) -> str:
-        """Override to use timezone-aware traffic analysis"""
-        
-        # Use Supabase traffic analysis (already timezone-aware)
-        traffic_summary = get_traffic_analysis(self.supabase, days_back=28)
-        
-        prompt = f"""You are a Data Analyst Agent for Boba BI. Analyze the following traffic data and provide insights.
-
-Historical Traffic Data (Average Orders per Hour, Last 4 Weeks):
-{__import__('json').dumps(traffic_summary, indent=2)}
-
-Business Owner Query: {query}
-
-Provide a concise analysis of:
-1. Peak hours by day
-2. Recommended staffing levels (orders per hour / 15 = staff needed)
-3. Key patterns and trends
-
-Keep response under 200 words."""
+    @staticmethod
+    def _print_sync_stats(stats: Dict[str, Dict]):
+        for table, result in stats.items():
+            print(f"  🔄 {table}: {result['mode']} sync, {result['fetched']} fetched, {result['rows']} cached")
+    
+    def refresh_data(self) -> Dict[str, Dict]:
+        """Pull new rows from Supabase into the local cache and the in-memory stores"""
+        if self.sync is None:
+            raise RuntimeError("refresh_data() requires use_local_cache=True")
+        stats = self.sync.sync()
+        self._print_sync_stats(stats)
+        if stats['employees']['fetched']:
+            self.employees.replace(self.sync.rows('employees'))
+        if stats['pos_transactions']['fetched']:
+            start_date = datetime.now(timezone.utc) - timedelta(weeks=100)
+            self.pos_data.replace(self.sync.rows('pos_transactions', since=start_date))
+        return stats
+    
+    def hours_worked(self, dates: List[str]) -> Optional[Dict[str, Dict[Any, int]]]:
+        """
+        Hours saved in Supabase in the calendar weeks of dates, excluding dates themselves
 
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1000,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        The same seed as ScheduleHistory.hours_worked(), with one aggregate
+        query per run of unplanned days in those weeks (at most two for a
+        plan of consecutive days).
+        """
+        worked: Dict[str, Dict[Any, int]] = {week_start(date): {} for date in dates}
+        for start, end in unplanned_days(dates):
+            for row in get_employee_week_hours(self.supabase, start, end):
+                week = str(row['week_start'])[:10]
+                hours = worked.setdefault(week, {})
+                hours[row['employee_id']] = hours.get(row['employee_id'], 0) + row['hours']
+        return worked
     
-    def orchestrator(self, query: str) -> Dict[str, Any]:
-        """Override to save results to Supabase and use timezone-aware analysis"""
+    def traffic_summary(self) -> Dict[str, Dict[str, float]]:
+        """Shop-local traffic analysis: from the local cache when syncing, else queried from Supabase"""
+        if self.sync is not None:
+            return super().traffic_summary()
+        return get_traffic_analysis(self.supabase, days_back=28)
+    
+    def record_schedule(self, schedule: List[Dict]):
+        """Save a served schedule to Supabase as well as the history"""
+        print("\n[ORCHESTRATOR] Saving schedule to Supabase...")
+        save_schedule(self.supabase, schedule)
+        super().record_schedule(schedule)
+    
+    def orchestrator(self, query: str, dates: Optional[List[str]] = None,
+                     horizon_weeks: int = 1, record: bool = True) -> Dict[str, Any]:
+        """
+        Override to save results to Supabase and use timezone-aware analysis
+        
+        With record=False (precomputed drafts) nothing is saved until
+        record_schedule() is called for the schedule that is served.
+        """
         
         print("\n" + "="*60)
         print("BOBA BI - MULTI-AGENT SCHEDULING SYSTEM")
         print("="*60)
         
-        # Generate dates for next 7 days
-        dates = [(datetime.now() + timedelta(days=i)).date().isoformat() 
-                 for i in range(1, 8)]
+        # Planning window: horizon_weeks whole weeks starting tomorrow
+        dates = dates or horizon_dates(horizon_weeks)
         
         print("\n[ORCHESTRATOR] Analyzing business query...")
         print(f"Query: {query}")
         
         # Step 1: Data Analyst Agent (using timezone-aware version)
         print("\n[DATA ANALYST AGENT] Analyzing historical traffic patterns...")
-        traffic_analysis = self.data_analyst_agent(query)
-        traffic_data = get_traffic_analysis(self.supabase, days_back=28)
+        traffic_data = self.traffic_summary()
+        traffic_analysis = self.data_analyst_agent(query, traffic_data)
         print(traffic_analysis)
         
         # Step 2: Weather Agent (using parent class method)
         print("\n[WEATHER AGENT] Fetching weather forecasts and impact analysis...")
         weather_analysis = self.weather_agent(dates)
+        weather_multipliers = self.weather_multipliers(dates)
         print(weather_analysis)
         
         # Step 3: Scheduler Agent (using parent class method)
         print("\n[SCHEDULER AGENT] Creating optimal employee schedule...")
-        schedule = self.scheduler_agent(traffic_data, weather_analysis, dates)
+        schedule = self.scheduler_agent(traffic_data, weather_analysis, dates, weather_multipliers)
         print(f"Generated schedule for {len(schedule)} shifts")
         
         # Step 4: Save to Supabase
-        print("\n[ORCHESTRATOR] Saving schedule to Supabase...")
-        save_schedule(self.supabase, schedule)
+        if record:
+            self.record_schedule(schedule)
         
         # Step 5: Generate Final Report
         print("\n[ORCHESTRATOR] Compiling final report...")
@@ -140,6 +193,8 @@ def main():
     print("BOBA BI - Supabase Edition")
     print("="*60)
     
+    load_environment()
+
     try:
         # Initialize Boba BI with Supabase
         boba_bi = BobaBISupabase(
@@ -0,0 +1,237 @@
+"""
+Queueing Capacity Model for Boba BI
+Staff needed per hour to meet a target wait time (Erlang C with an M/G/c correction)
+
+Each weekday/hour gets an offered load in Erlangs: the prep minutes of the
+orders observed in that hour, per hour of wall-clock time. The staff needed
+for a load is the smallest c for which
+
+    P(wait > TARGET_WAIT_MINUTES) = C(c, a) * exp(-(c - a) * t / (S * k)) <= 1 - SERVICE_LEVEL
+
+where C is the Erlang C probability of waiting, S the mean prep time and
+k = (1 + cv^2) / 2 the Allen-Cunneen factor for the observed prep-time
+spread (k = 1 is the exponential case). Because the required staff only
+grows with load, it is precomputed once per (target, service time) as a
+lookup table over quantized loads; evaluating any number of hours, days or
+stores is then an index into that table (vectorized with numpy when
+installed).
+"""
+
+import os
+import math
+import threading
+from datetime import timedelta
+from typing import Any, Dict, List, Sequence
+
+from time_buckets import (
+    np,
+    SHIFT_HOURS,
+    WEEKDAYS,
+    local_now,
+    epoch_us_to_seconds,
+    weekday_hour_slots,
+    weekday_hour_slots_epoch
+)
+
+TARGET_WAIT_MINUTES = float(os.getenv('TARGET_WAIT_MINUTES', '5'))
+SERVICE_LEVEL = float(os.getenv('SERVICE_LEVEL', '0.8'))  # Share of customers served within the target
+LOAD_STEP = 0.05          # Erlangs per lookup table entry
+INITIAL_MAX_LOAD = 50.0   # Tables grow on demand past this
+
+
+# ============================================================================
+# ERLANG C
+# ============================================================================
+
+def erlang_c(servers: int, load: float) -> float:
+    """Probability an arrival waits with `servers` staff and `load` Erlangs offered"""
+    if load <= 0:
+        return 0.0
+    if servers <= load:
+        return 1.0
+    blocking = 1.0
+    for k in range(1, servers + 1):  # Erlang B recursion, numerically stable
+        blocking = load * blocking / (k + load * blocking)
+    return servers * blocking / (servers - load * (1 - blocking))
+
+
+def wait_exceeds_probability(servers: int, load: float, wait_ratio: float, spread: float = 1.0) -> float:
+    """P(wait > t) where wait_ratio = t / mean service time and spread = (1 + cv^2) / 2"""
+    if servers <= load:
+        return 1.0
+    return erlang_c(servers, load) * math.exp(-(servers - load) * wait_ratio / spread)
+
+
+class StaffingTable:
+    """Minimum staff per quantized offered load for one (target, service time) setting"""
+
+    def __init__(self, wait_ratio: float, service_level: float = SERVICE_LEVEL, spread: float = 1.0,
+                 step: float = LOAD_STEP):
+        self.wait_ratio = wait_ratio
+        self.service_level = service_level
+        self.spread = spread
+        self.step = step
+        self._staff: List[int] = []
+        self._array = None
+        self._lock = threading.Lock()
+        self._extend(int(INITIAL_MAX_LOAD / step))
+
+    def _extend(self, last_index: int):
+        """Fill entries up to last_index; required staff never decreases, so the search resumes"""
+        allowed = 1 - self.service_level
+        servers = self._staff[-1] if self._staff else 0
+        for index in range(len(self._staff), last_index + 1):
+            load = index * self.step
+            servers = max(servers, math.floor(load) + 1 if load > 0 else 0)
+            while load > 0 and wait_exceeds_probability(servers, load, self.wait_ratio, self.spread) > allowed:
+                servers += 1
+            self._staff.append(servers)
+        self._array = np.asarray(self._staff, dtype=np.int64) if np is not None else None
+
+    def lookup(self, loads: Sequence[float]):
+        """Staff for each load (rounded up to the next table step); array in, array out with numpy"""
+        if np is not None:
+            index = np.ceil(np.asarray(loads, dtype=float) / self.step - 1e-9).astype(np.int64).clip(min=0)
+            if len(index) and index.max() >= len(self._staff):
+                with self._lock:
+                    self._extend(int(index.max()) * 2)
+            return self._array[index]
+
+        index = [max(0, math.ceil(load / self.step - 1e-9)) for load in loads]
+        if index and max(index) >= len(self._staff):
+            with self._lock:
+                self._extend(max(index) * 2)
+        staff = self._staff
+        return [staff[i] for i in index]
+
+
+_tables: Dict[tuple, StaffingTable] = {}
+_tables_lock = threading.Lock()
+
+
+def staffing_table(target_wait_minutes: float, mean_service_minutes: float,
+                   service_level: float = SERVICE_LEVEL, cv2: float = 1.0) -> StaffingTable:
+    """Shared lookup table for a setting (service stats rounded so nearby models share one)"""
+    wait_ratio = round(target_wait_minutes / mean_service_minutes, 2)
+    spread = round((1 + cv2) / 2, 2)
+    key = (wait_ratio, round(service_level, 4), spread)
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is None:
+            table = _tables[key] = StaffingTable(wait_ratio, service_level, spread)
+        return table
+
+
+# ============================================================================
+# WORKLOAD PROFILE
+# ============================================================================
+
+def workload_profile(pos_data: Any, days_back: int = 28, tz=None) -> Dict[str, Any]:
+    """
+    Per weekday/hour arrival rate and offered load from the last days_back days
+
+    Returns {'orders_per_hour', 'load_erlangs', 'items_per_order'} (168 values
+    each, indexed weekday * 24 + hour) plus the window's prep-time
+    'mean_service_minutes' and 'service_cv2'.
+    """
+    since = local_now(tz) - timedelta(days=days_back)
+    weeks = days_back / 7
+
+    if hasattr(pos_data, 'columns'):
+        columns = pos_data.columns()
+        slots = weekday_hour_slots_epoch(epoch_us_to_seconds(columns['ts_us']), tz, since)
+        prep_column, items_column = columns['prep_time_minutes'], columns['items']
+    else:
+        slots = weekday_hour_slots((tx['timestamp'] for tx in pos_data), tz, since)
+        prep_column = [tx['prep_time_minutes'] for tx in pos_data]
+        items_column = [tx['items'] for tx in pos_data]
+
+    if np is not None and len(slots):
+        slots = np.asarray(slots, dtype=np.int64)
+        keep = slots >= 0
+        slots, minutes = slots[keep], np.asarray(prep_column, dtype=float)[keep]
+        orders = np.bincount(slots, minlength=168).tolist()
+        prep = np.bincount(slots, weights=minutes, minlength=168).tolist()
+        items = np.bincount(slots, weights=np.asarray(items_column, dtype=float)[keep], minlength=168).tolist()
+        count, total, total_sq = len(minutes), float(minutes.sum()), float((minutes * minutes).sum())
+    else:
+        orders, prep, items = [0] * 168, [0.0] * 168, [0] * 168
+        total = total_sq = count = 0
+        for slot, minutes, n_items in zip(slots, prep_column, items_column):
+            if slot < 0:
+                continue
+            orders[slot] += 1
+            prep[slot] += minutes
+            items[slot] += n_items
+            total += minutes
+            total_sq += minutes * minutes
+            count += 1
+
+    mean = total / count if count else 5.0
+    variance = max(total_sq / count - mean * mean, 0.0) if count else mean * mean
+    return {
+        'orders_per_hour': [n / weeks for n in orders],
+        'load_erlangs': [minutes / 60 / weeks for minutes in prep],
+        'items_per_order': [items[i] / orders[i] if orders[i] else 0.0 for i in range(168)],
+        'mean_service_minutes': mean,
+        'service_cv2': variance / (mean * mean) if mean else 1.0
+    }
+
+
+def required_staff(loads: Sequence[float], mean_service_minutes: float,
+                   target_wait_minutes: float = TARGET_WAIT_MINUTES,
+                   service_level: float = SERVICE_LEVEL, cv2: float = 1.0):
+    """Staff for any flat sequence of offered loads (hours x days x stores) in one table lookup"""
+    return staffing_table(target_wait_minutes, mean_service_minutes, service_level, cv2).lookup(loads)
+
+
+# ============================================================================
+# CAPACITY MODEL
+# ============================================================================
+
+class CapacityModel:
+    """
+    Hourly staffing from a workload profile
+
+    shift_staff() is what the scheduler calls per shift: the staff needed in
+    the shift's busiest hour, with arrivals scaled by a weather multiplier.
+    Results are cached per multiplier, so a full plan costs one vectorized
+    lookup per distinct multiplier.
+    """
+
+    def __init__(self, profile: Dict[str, Any], target_wait_minutes: float = TARGET_WAIT_MINUTES,
+                 service_level: float = SERVICE_LEVEL):
+        self.profile = profile
+        self.target_wait_minutes = target_wait_minutes
+        self.service_level = service_level
+        self.table = staffing_table(target_wait_minutes, profile['mean_service_minutes'],
+                                    service_level, profile['service_cv2'])
+        self._by_multiplier: Dict[float, Dict[tuple, int]] = {}
+
+    def staff_by_hour(self, multiplier: float = 1.0) -> List[int]:
+        """168 hourly staff levels (weekday * 24 + hour) with arrivals scaled by multiplier"""
+        loads = self.profile['load_erlangs']
+        if np is not None:
+            return self.table.lookup(np.asarray(loads) * multiplier).tolist()
+        return self.table.lookup([load * multiplier for load in loads])
+
+    def shift_staff(self, day_name: str, shift_name: str, multiplier: float = 1.0) -> int:
+        """Staff for a shift: its peak hour's requirement"""
+        key = round(multiplier, 4)
+        shifts = self._by_multiplier.get(key)
+        if shifts is None:
+            hourly = self.staff_by_hour(key)
+            shifts = {
+                (day, name): max(hourly[index * 24 + hour] for hour in range(start, end))
+                for index, day in enumerate(WEEKDAYS)
+                for name, (start, end) in SHIFT_HOURS.items()
+            }
+            self._by_multiplier[key] = shifts
+        return shifts[(day_name, shift_name)]
+
+
+def build_capacity_model(pos_data: Any, days_back: int = 28, tz=None,
+                         target_wait_minutes: float = TARGET_WAIT_MINUTES,
+                         service_level: float = SERVICE_LEVEL) -> CapacityModel:
+    """CapacityModel from POS data (lists, VersionedStore or a shared-memory view)"""
+    return CapacityModel(workload_profile(pos_data, days_back, tz), target_wait_minutes, service_level)
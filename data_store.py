@@ -0,0 +1,48 @@
+"""
+Versioned In-Memory Data Stores for Boba BI
+POS transactions and the employee roster with a data-version counter
+"""
+
+import threading
+from typing import Iterable, Iterator, List, Dict
+
+
+class VersionedStore:
+    """
+    List-like record store whose version increases on every change
+
+    Readers iterate it like a list; caches key on .version so they can tell
+    when the underlying data has changed without comparing contents.
+    """
+
+    def __init__(self, records: Iterable[Dict] = ()):
+        self._records: List[Dict] = list(records)
+        self._lock = threading.Lock()
+        self.version = 1
+
+    @property
+    def records(self) -> List[Dict]:
+        """Current records (treat as read-only)"""
+        return self._records
+
+    def extend(self, records: Iterable[Dict]):
+        """Append records and bump the version"""
+        with self._lock:
+            self._records.extend(records)
+            self.version += 1
+
+    def replace(self, records: Iterable[Dict]):
+        """Swap in a new record list atomically and bump the version"""
+        new_records = list(records)
+        with self._lock:
+            self._records = new_records
+            self.version += 1
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, index):
+        return self._records[index]
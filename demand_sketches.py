@@ -0,0 +1,308 @@
+"""
+Quantile Demand Sketches for Boba BI
+Hourly order-count percentiles per store x weekday x hour in bounded memory
+
+Each bucket holds a KLL sketch of the order counts of its past hours
+(hours without orders count as 0). A KLL sketch keeps a hierarchy of
+compactors: when a level fills up, it is sorted and every other item moves
+up a level with double the weight. Memory is O(k) items per bucket however
+long the history, rank error is about 1/k, and two sketches merge by
+concatenating levels, so store sketches combine into regional views.
+
+Like TrafficAnomalyDetector, events only increment the count of the hour in
+progress; the hour is added to its bucket when the stream moves past it.
+Each weekday-hour also keeps an all-stores sketch, updated as hours close,
+so the default (every store) queries never merge or re-sort 168 buckets.
+
+Percentiles summarize every hour a bucket has seen since it was seeded, not
+the 28-day window analyze_traffic_patterns() uses for the mean.
+
+Usage:
+    sketches = DemandSketches()
+    sketches.seed_hourly('downtown', first_hour, hourly_orders)
+    sketches.observe_orders(batch, store='downtown')
+    sketches.traffic_summary(0.9)                      # scheduler input at p90
+    DemandSketches.from_dict(other_process.to_dict())  # ship and merge
+"""
+
+import os
+import math
+import bisect
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from time_buckets import WEEKDAYS, shift_traffic_summary
+from traffic_cube import HOURS_PER_WEEK, local_hour_index
+
+SKETCH_K = int(os.getenv('DEMAND_SKETCH_K', '128'))  # Items in the top compactor; rank error ~ 1/k
+SKETCH_C = 2 / 3  # Lower compactors shrink geometrically by this factor
+DEFAULT_STORE = os.getenv('SHOP_NAME', 'main')
+MAX_GAP_HOURS = HOURS_PER_WEEK  # Longer silences are a data gap, not a week of zeros
+
+
+def parse_percentile(value: Any) -> Optional[float]:
+    """'p90', '90', 0.9 -> 0.9; None or '' -> None; raises ValueError outside (0, 1]"""
+    if value is None or value == '':
+        return None
+    text = str(value).strip().lower().lstrip('p')
+    try:
+        q = float(text)
+    except ValueError:
+        raise ValueError(f"Invalid percentile: {value!r}")
+    if q > 1:
+        q /= 100
+    if not 0 < q <= 1:
+        raise ValueError(f"Percentile must be between 0 and 100: {value!r}")
+    return q
+
+
+# ============================================================================
+# KLL SKETCH
+# ============================================================================
+
+class KLLSketch:
+    """Mergeable quantile sketch (Karnin-Lang-Liberty) with deterministic compaction"""
+
+    def __init__(self, k: int = SKETCH_K):
+        self.k = k
+        self.count = 0
+        self.levels: List[List[float]] = [[]]
+        self._flips: List[int] = [0]  # Alternating offset per level instead of a coin flip
+        self._cdf = None  # (sorted values, cumulative weights), rebuilt after changes
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * SKETCH_C ** depth)))
+
+    def _size(self) -> int:
+        return sum(len(items) for items in self.levels)
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def _compress(self):
+        while self._size() >= self._max_size():
+            for level, items in enumerate(self.levels):
+                if len(items) >= self._capacity(level):
+                    if level + 1 == len(self.levels):
+                        self.levels.append([])
+                        self._flips.append(0)
+                    items.sort()
+                    # An odd item out stays behind so total weight is preserved
+                    keep = [items.pop()] if len(items) % 2 else []
+                    offset = self._flips[level]
+                    self._flips[level] ^= 1
+                    self.levels[level + 1].extend(items[offset::2])
+                    self.levels[level] = keep
+                    break
+
+    def update(self, value: float):
+        self.levels[0].append(value)
+        self.count += 1
+        self._cdf = None
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        """Fold other into this sketch (other is unchanged); returns self"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+            self._flips.append(0)
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self._cdf = None
+        self._compress()
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q (0..1) of everything added, None when empty"""
+        if self._cdf is None:
+            weighted = sorted((value, 1 << level) for level, items in enumerate(self.levels) for value in items)
+            values, cumulative, seen = [], [], 0
+            for value, weight in weighted:
+                seen += weight
+                values.append(value)
+                cumulative.append(seen)
+            self._cdf = (values, cumulative)
+        values, cumulative = self._cdf
+        if not values:
+            return None
+        return values[min(bisect.bisect_left(cumulative, q * cumulative[-1]), len(values) - 1)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'k': self.k, 'count': self.count, 'levels': [list(items) for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'KLLSketch':
+        sketch = cls(data['k'])
+        sketch.count = data['count']
+        sketch.levels = [list(items) for items in data['levels']] or [[]]
+        sketch._flips = [0] * len(sketch.levels)
+        return sketch
+
+
+# ============================================================================
+# PER-BUCKET DEMAND SKETCHES
+# ============================================================================
+
+def _slot(hour: int) -> int:
+    """Weekday * 24 + hour for a local hour index (ordinal 1 is a Monday)"""
+    return ((hour // 24 - 1) % 7) * 24 + hour % 24
+
+
+class DemandSketches:
+    """KLL sketches of hourly order counts keyed by (store, weekday * 24 + hour)"""
+
+    def __init__(self, k: int = SKETCH_K):
+        self.k = k
+        self.version = 0
+        self._sketches: Dict[tuple, KLLSketch] = {}
+        self._merged: Dict[int, KLLSketch] = {}  # slot -> all stores
+        self._open: Dict[str, List[int]] = {}  # store -> [hour in progress, orders so far]
+        self._lock = threading.Lock()
+
+    def _add(self, store: str, hour: int, count: int):
+        slot = _slot(hour)
+        sketch = self._sketches.get((store, slot))
+        if sketch is None:
+            sketch = self._sketches[(store, slot)] = KLLSketch(self.k)
+        sketch.update(count)
+        self._merged_sketch(slot).update(count)
+
+    def _merged_sketch(self, slot: int) -> KLLSketch:
+        merged = self._merged.get(slot)
+        if merged is None:
+            merged = self._merged[slot] = KLLSketch(self.k)
+        return merged
+
+    def observe(self, hour: int, count: int = 1, store: str = DEFAULT_STORE):
+        """Add count orders to a local hour index; earlier hours close into their sketches"""
+        with self._lock:
+            current = self._open.get(store)
+            if current is None:
+                self._open[store] = [hour, count]
+                return
+            if hour < current[0]:
+                return  # The hour has already been sketched
+            if hour > current[0]:
+                self._add(store, current[0], current[1])
+                if hour - current[0] <= MAX_GAP_HOURS:
+                    for silent in range(current[0] + 1, hour):
+                        self._add(store, silent, 0)
+                current[0], current[1] = hour, 0
+                self.version += 1
+            current[1] += count
+
+    def observe_orders(self, orders: Iterable[Dict], store: str = DEFAULT_STORE):
+        """Feed POS orders with naive shop-local timestamps (ISO strings or datetimes)"""
+        parse = datetime.fromisoformat
+        hours = sorted(local_hour_index(parse(ts) if ts.__class__ is str else ts)
+                       for ts in (order['timestamp'] for order in orders))
+        start = 0
+        for i in range(1, len(hours) + 1):
+            if i == len(hours) or hours[i] != hours[start]:
+                self.observe(hours[start], i - start, store)
+                start = i
+
+    def seed_hourly(self, store: str, first_hour: int, hourly_orders: Sequence[int]):
+        """Replay an hourly history (e.g. TrafficCube.hourly()); the last hour stays open"""
+        for offset, count in enumerate(hourly_orders):
+            self.observe(first_hour + offset, count, store)
+
+    # ----- queries -----
+
+    def stores(self) -> List[str]:
+        with self._lock:
+            return sorted({store for store, _ in self._sketches})
+
+    def sketch(self, slot: int, stores: Optional[Iterable[str]] = None) -> KLLSketch:
+        """One bucket's sketch, merged across stores (default: all)"""
+        merged = KLLSketch(self.k)
+        with self._lock:
+            if stores is None:
+                return merged.merge(self._merged[slot]) if slot in self._merged else merged
+            wanted = set(stores)
+            for store in wanted:
+                sketch = self._sketches.get((store, slot))
+                if sketch is not None:
+                    merged.merge(sketch)
+        return merged
+
+    def _slot_quantiles(self, quantiles: Sequence[float], stores: Optional[Iterable[str]] = None) -> List[tuple]:
+        """(hours observed, [value per quantile]) for each weekday * 24 + hour"""
+        if stores is not None:
+            stores = list(stores)
+            sketches = [self.sketch(slot, stores) for slot in range(HOURS_PER_WEEK)]
+            return [(sketch.count, [sketch.quantile(q) for q in quantiles]) for sketch in sketches]
+        empty = KLLSketch(self.k)
+        with self._lock:
+            # The maintained all-store sketches only re-sort a slot after it changed
+            return [(sketch.count, [sketch.quantile(q) for q in quantiles])
+                    for sketch in (self._merged.get(slot, empty) for slot in range(HOURS_PER_WEEK))]
+
+    def hourly_quantiles(self, q: float, stores: Optional[Iterable[str]] = None) -> List[float]:
+        """168 weekday * 24 + hour values of the q-quantile of hourly orders (0 where unseen)"""
+        return [value if value is not None else 0 for _, (value,) in self._slot_quantiles([q], stores)]
+
+    def traffic_summary(self, q: float, days_back: int = 28,
+                        stores: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, float]]:
+        """
+        {weekday: {shift: orders/hr}} at quantile q, on analyze_traffic_patterns()' scale
+
+        That summary divides days_back of orders by the shift length, so the
+        per-hour quantiles are scaled by the number of weeks in the window
+        to stay comparable with ORDERS_PER_STAFF. days_back only sets that
+        scale: the quantiles themselves cover every hour in the sketches.
+        """
+        weeks = days_back / 7
+        return shift_traffic_summary([value * weeks for value in self.hourly_quantiles(q, stores)])
+
+    def quantile_rows(self, quantiles: Sequence[float], stores: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Per weekday/hour rows with each requested quantile, e.g. for a dashboard"""
+        rows = []
+        for slot, (count, values) in enumerate(self._slot_quantiles(quantiles, stores)):
+            row = {'weekday': WEEKDAYS[slot // 24], 'hour': slot % 24, 'hours_observed': count}
+            for q, value in zip(quantiles, values):
+                row[f"p{round(q * 100, 1):g}"] = value
+            rows.append(row)
+        return rows
+
+    # ----- merging across processes -----
+
+    def merge(self, other: 'DemandSketches') -> 'DemandSketches':
+        """Fold another instance's closed hours into this one (e.g. another store's process)"""
+        with other._lock:
+            incoming = [(key, KLLSketch.from_dict(sketch.to_dict())) for key, sketch in other._sketches.items()]
+        with self._lock:
+            for key, sketch in incoming:
+                self._merged_sketch(key[1]).merge(sketch)
+                if key in self._sketches:
+                    self._sketches[key].merge(sketch)
+                else:
+                    self._sketches[key] = sketch
+            self.version += 1
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'k': self.k, 'sketches': [[store, slot, sketch.to_dict()]
+                                              for (store, slot), sketch in self._sketches.items()]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'DemandSketches':
+        sketches = cls(data['k'])
+        for store, slot, sketch in data['sketches']:
+            sketches._sketches[(store, slot)] = KLLSketch.from_dict(sketch)
+            sketches._merged_sketch(slot).merge(sketches._sketches[(store, slot)])
+        return sketches
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'stores': len({store for store, _ in self._sketches}),
+                'buckets': len(self._sketches),
+                'hours': sum(sketch.count for sketch in self._sketches.values()),
+                'retained_items': sum(sketch._size() for sketch in self._sketches.values())
+            }
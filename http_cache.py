@@ -0,0 +1,185 @@
+"""
+HTTP Response Caching for Boba BI Read Endpoints
+Per-version serialized responses, ETag / If-None-Match, gzip/brotli compression
+and JSON or MessagePack bodies by Accept header
+"""
+
+import os
+import gzip
+import json
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # Optional - gzip is always available
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # Optional - JSON is always available
+    msgpack = None
+
+MIN_COMPRESS_BYTES = 512
+MAX_CACHED_RESPONSES = int(os.getenv('RESPONSE_CACHE_ENTRIES', '512'))  # Keys include client-chosen parameters
+JSON_TYPE = 'application/json'
+MSGPACK_TYPE = 'application/msgpack'
+MSGPACK_ALIASES = (MSGPACK_TYPE, 'application/x-msgpack', 'application/vnd.msgpack')
+
+
+def make_etag(key: Hashable, version: Hashable) -> str:
+    """Strong ETag derived from the cache key and data version (no serialization needed)"""
+    return '"' + hashlib.sha1(repr((key, version)).encode()).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header covers this ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def _qualities(header: Optional[str]) -> Dict[str, float]:
+    """{'gzip': 1.0, 'br': 0.5} from an Accept or Accept-Encoding header"""
+    accepted = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            if param.strip().startswith('q='):
+                try:
+                    quality = float(param.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def choose_media_type(accept: Optional[str]) -> str:
+    """MSGPACK_TYPE when the Accept header prefers it over JSON and msgpack is installed, else JSON_TYPE"""
+    if msgpack is None or not accept:
+        return JSON_TYPE
+    accepted = _qualities(accept)
+    packed = max(accepted.get(name, 0) for name in MSGPACK_ALIASES)
+    return MSGPACK_TYPE if packed > 0 and packed >= accepted.get(JSON_TYPE, 0) else JSON_TYPE
+
+
+def serialize(payload: Any, media_type: str = JSON_TYPE) -> bytes:
+    """Payload as a JSON or MessagePack body"""
+    if media_type == MSGPACK_TYPE:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload).encode()
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header (None = identity)"""
+    accepted = _qualities(accept_encoding)
+
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+class CachedResponse:
+    """One serialized body plus lazily built compressed variants"""
+
+    def __init__(self, etag: str, body: bytes, media_type: str = JSON_TYPE):
+        self.etag = etag
+        self.body = body
+        self.media_type = media_type
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """(body, content-encoding) for the requested encoding"""
+        if encoding is None or len(self.body) < MIN_COMPRESS_BYTES:
+            return self.body, None
+        with self._lock:
+            if encoding not in self._encoded:
+                if encoding == 'br':
+                    self._encoded[encoding] = brotli.compress(self.body)
+                else:
+                    self._encoded[encoding] = gzip.compress(self.body, compresslevel=6)
+            return self._encoded[encoding], encoding
+
+
+class ResponseCache:
+    """
+    Serialized responses keyed by endpoint key, replaced when the data version changes
+
+    Keys carry client-chosen query parameters (ranges, fields, cursors), so
+    the cache is a bounded LRU: past max_entries the least recently used
+    response is evicted.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_RESPONSES):
+        # Salted per process so ETags never survive a restart with different data
+        self.salt = uuid.uuid4().hex[:8]
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, Tuple[Hashable, CachedResponse]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: Hashable, build: Callable[[], Any],
+            media_type: str = JSON_TYPE) -> CachedResponse:
+        """Cached response for key at version, building and serializing it on a miss"""
+        # Each media type is its own entry (and ETag); JSON keeps the plain key
+        key = key if media_type == JSON_TYPE else (key, media_type)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        response = CachedResponse(make_etag((self.salt, key), version), serialize(build(), media_type), media_type)
+        with self._lock:
+            self._entries[key] = (version, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return response
+
+    def respond(self, key: Hashable, version: Hashable, build: Callable[[], Any],
+                if_none_match: Optional[str], accept_encoding: Optional[str],
+                accept: Optional[str] = None) -> Tuple[int, bytes, List[Tuple[str, str]]]:
+        """
+        Framework-neutral conditional GET
+
+        Returns (status, body, headers): 304 with an empty body when the
+        client's ETag is current, otherwise 200 with the cached (and possibly
+        compressed) body, MessagePack if the Accept header asks for it.
+        """
+        media_type = choose_media_type(accept)
+        etag_key = key if media_type == JSON_TYPE else (key, media_type)
+        etag = make_etag((self.salt, etag_key), version)
+        headers = [('ETag', etag), ('Cache-Control', 'no-cache'), ('Vary', 'Accept, Accept-Encoding')]
+        if etag_matches(if_none_match, etag):
+            with self._lock:
+                self.not_modified += 1
+            return 304, b'', headers
+
+        body, encoding = self.get(key, version, build, media_type).encoded(choose_encoding(accept_encoding))
+        headers.append(('Content-Type', media_type))
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        return 200, body, headers
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'not_modified': self.not_modified,
+                    'entries': len(self._entries), 'evictions': self.evictions}
@@ -0,0 +1,251 @@
+"""
+LLM Clients for Boba BI
+Anthropic client factory plus an offline, deterministic stand-in for tests and load testing
+"""
+
+import os
+import time
+import asyncio
+import random
+import hashlib
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from prompt_builder import estimate_tokens
+
+# ============================================================================
+# CLIENT FACTORY
+# ============================================================================
+
+def offline_mode_enabled() -> bool:
+    """True when BOBA_BI_OFFLINE_LLM requests the offline stand-in"""
+    return os.getenv('BOBA_BI_OFFLINE_LLM', '').lower() in ('1', 'true', 'yes')
+
+
+def create_llm_client(api_key: Optional[str] = None, offline: Optional[bool] = None):
+    """
+    Build the client used by the agents
+
+    Any object exposing messages.create(**kwargs) with Anthropic-style
+    responses can be injected into BobaBI instead.
+    """
+    if offline is None:
+        offline = offline_mode_enabled()
+
+    if offline:
+        return OfflineLLMClient(
+            latency_ms=float(os.getenv('BOBA_BI_OFFLINE_LATENCY_MS', '800')),
+            jitter_ms=float(os.getenv('BOBA_BI_OFFLINE_JITTER_MS', '200'))
+        )
+
+    # Retries and deadlines are LLMGuard's job (llm_resilience.py), not the SDK's
+    import anthropic
+    from llm_resilience import LLM_DEADLINE_SECONDS
+    return anthropic.Anthropic(api_key=api_key, max_retries=0, timeout=LLM_DEADLINE_SECONDS)
+
+
+def create_async_llm_client(api_key: Optional[str] = None, offline: Optional[bool] = None):
+    """Async counterpart of create_llm_client() for the ASGI server"""
+    if offline is None:
+        offline = offline_mode_enabled()
+
+    if offline:
+        return AsyncOfflineLLMClient(
+            latency_ms=float(os.getenv('BOBA_BI_OFFLINE_LATENCY_MS', '800')),
+            jitter_ms=float(os.getenv('BOBA_BI_OFFLINE_JITTER_MS', '200'))
+        )
+
+    import anthropic
+    from llm_resilience import LLM_DEADLINE_SECONDS
+    return anthropic.AsyncAnthropic(api_key=api_key, max_retries=0, timeout=LLM_DEADLINE_SECONDS)
+
+
+def async_client_for(client: Any) -> Any:
+    """
+    Async counterpart of an injected sync client
+
+    The offline stand-in gets its async twin (same latency settings); any
+    other client keeps serving the calls, from a worker thread.
+    """
+    if type(client) is OfflineLLMClient:
+        return AsyncOfflineLLMClient(latency_ms=client.latency_ms, jitter_ms=client.jitter_ms)
+    return ThreadedAsyncLLMClient(client)
+
+
+class ThreadedAsyncLLMClient:
+    """Async messages.create() over a sync client, run in a worker thread"""
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.messages = self
+
+    async def create(self, **request) -> Any:
+        return await asyncio.to_thread(self.client.messages.create, **request)
+
+
+class LazyLLMClient:
+    """
+    Builds the wrapped client on first use
+
+    Constructing BobaBI then neither imports the Anthropic SDK nor reads the
+    offline-mode settings until an agent actually calls the LLM.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def resolve(self) -> Any:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name: str):
+        return getattr(self.resolve(), name)
+
+
+# ============================================================================
+# OFFLINE STAND-IN
+# ============================================================================
+
+class TextBlock:
+    def __init__(self, text: str):
+        self.type = 'text'
+        self.text = text
+
+
+class ToolUseBlock:
+    def __init__(self, id: str, name: str, input: Dict):
+        self.type = 'tool_use'
+        self.id = id
+        self.name = name
+        self.input = input
+
+
+class Usage:
+    def __init__(self, input_tokens: int, output_tokens: int, cache_read_input_tokens: int = 0):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_read_input_tokens = cache_read_input_tokens
+        self.cache_creation_input_tokens = 0
+
+
+class Message:
+    def __init__(self, model: str, content: List, stop_reason: str, usage: Usage):
+        self.model = model
+        self.role = 'assistant'
+        self.content = content
+        self.stop_reason = stop_reason
+        self.usage = usage
+
+
+class OfflineLLMClient:
+    """
+    Local stand-in for anthropic.Anthropic
+
+    messages.create() sleeps for latency_ms +/- jitter_ms and returns a
+    deterministic reply derived from the request. When tools are offered and
+    the conversation has no tool results yet, it answers with a tool_use turn
+    for the first tool, like the real model would. Simulated latency is
+    tracked so callers can separate their own overhead from model time.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.messages = self
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cached_prefixes = set()
+        self.calls = 0
+        self.simulated_seconds = 0.0
+
+    def create(self, model: str, max_tokens: int, messages: List[Dict],
+               system: Any = None, tools: Optional[List[Dict]] = None, **kwargs) -> Message:
+        call_id, delay = self._next_call()
+        if delay:
+            time.sleep(delay)
+        return self._respond(call_id, model, max_tokens, messages, system, tools)
+
+    def _next_call(self):
+        """Allocate a call id and draw its simulated latency"""
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            self.calls += 1
+            self.simulated_seconds += delay
+            return self.calls, delay
+
+    def _respond(self, call_id: int, model: str, max_tokens: int, messages: List[Dict],
+                 system: Any, tools: Optional[List[Dict]]) -> Message:
+        input_tokens, cached_tokens = self._count_input(system, messages, tools)
+
+        if tools and not self._has_tool_results(messages):
+            tool = tools[0]
+            block = ToolUseBlock(f"toolu_offline_{call_id}", tool['name'], {'query': self._last_user_text(messages)[:200]})
+            return Message(model, [block], 'tool_use', Usage(input_tokens, 20, cached_tokens))
+
+        text = self._reply(messages)
+        return Message(model, [TextBlock(text)], 'end_turn',
+                       Usage(input_tokens, min(max_tokens, estimate_tokens(text)), cached_tokens))
+
+    def stats(self) -> Dict[str, Any]:
+        """Call count and total simulated model latency"""
+        with self._lock:
+            return {'calls': self.calls, 'simulated_seconds': round(self.simulated_seconds, 3)}
+
+    def _count_input(self, system: Any, messages: List[Dict], tools: Optional[List[Dict]]):
+        """Input tokens split into uncached and cache-read, honouring cache_control blocks"""
+        uncached, cached = 0, 0
+        blocks = [{'text': system}] if isinstance(system, str) else (system or [])
+        for block in blocks:
+            tokens = estimate_tokens(block['text'])
+            if 'cache_control' not in block:
+                uncached += tokens
+                continue
+            with self._lock:
+                hit = block['text'] in self._cached_prefixes
+                self._cached_prefixes.add(block['text'])
+            if hit:
+                cached += tokens
+            else:
+                uncached += tokens
+        for message in messages:
+            uncached += estimate_tokens(str(message['content']))
+        if tools:
+            uncached += estimate_tokens(str(tools))
+        return uncached, cached
+
+    @staticmethod
+    def _has_tool_results(messages: List[Dict]) -> bool:
+        last = messages[-1]['content']
+        return isinstance(last, list) and any(
+            isinstance(block, dict) and block.get('type') == 'tool_result' for block in last
+        )
+
+    @staticmethod
+    def _last_user_text(messages: List[Dict]) -> str:
+        for message in reversed(messages):
+            if message['role'] == 'user' and isinstance(message['content'], str):
+                return message['content']
+        return ''
+
+    def _reply(self, messages: List[Dict]) -> str:
+        prompt = self._last_user_text(messages)
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        return (f"[offline analysis {digest}] Traffic peaks in the evening shift and on weekends. "
+                f"Staff to roughly one employee per 15 orders per hour, keep at least two "
+                f"people on every shift, and add coverage on hot days.")
+
+
+class AsyncOfflineLLMClient(OfflineLLMClient):
+    """OfflineLLMClient whose messages.create() is a coroutine (non-blocking latency)"""
+
+    async def create(self, model: str, max_tokens: int, messages: List[Dict],
+                     system: Any = None, tools: Optional[List[Dict]] = None, **kwargs) -> Message:
+        call_id, delay = self._next_call()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._respond(call_id, model, max_tokens, messages, system, tools)
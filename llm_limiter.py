@@ -0,0 +1,304 @@
+"""
+Outbound LLM Rate Limiting for Boba BI
+Shared token-bucket limiter with priorities, load shedding and queue-time metrics
+"""
+
+import os
+import asyncio
+import heapq
+import time
+import itertools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from prompt_builder import estimate_request_tokens
+
+PRIORITY_INTERACTIVE = 0   # Manager waiting on /api/schedule
+PRIORITY_BATCH = 10        # Precompute and other background jobs
+
+_current_priority = contextvars.ContextVar('llm_priority', default=PRIORITY_INTERACTIVE)
+
+
+class LLMOverloadedError(Exception):
+    """Raised when an LLM call would wait longer than the queue-time budget"""
+
+
+# ============================================================================
+# TOKEN BUCKET
+# ============================================================================
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60 units per second up to per_minute"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until amount units are available (after refill)"""
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+
+class _Waiter:
+    def __init__(self, tokens: float, priority: int, enqueued: float):
+        self.tokens = tokens
+        self.priority = priority
+        self.enqueued = enqueued
+        self.granted = False
+        self.cancelled = False
+
+
+# ============================================================================
+# LIMITER
+# ============================================================================
+
+class LLMLimiter:
+    """
+    Admission control for outbound LLM calls
+
+    Each call needs one request slot and its estimated tokens from two token
+    buckets (requests/minute, tokens/minute). Waiting calls are served in
+    priority order, FIFO within a priority. A call whose estimated wait would
+    exceed max_queue_seconds is rejected up front with LLMOverloadedError,
+    and so is one that actually waits that long.
+    """
+
+    def __init__(self, requests_per_minute: float = 50, tokens_per_minute: float = 40000,
+                 max_queue_seconds: float = 30.0, metrics_window: int = 1000):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_queue_seconds = max_queue_seconds
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._waits = {}
+        self._metrics_window = metrics_window
+        self.granted = 0
+        self.shed = 0
+
+    @contextmanager
+    def priority(self, priority: int):
+        """Run LLM calls in this block at the given priority"""
+        token = _current_priority.set(priority)
+        try:
+            yield
+        finally:
+            _current_priority.reset(token)
+
+    def acquire(self, tokens: float, priority: Optional[int] = None, timeout: Optional[float] = None) -> float:
+        """
+        Block until the call may proceed; returns the time spent queued
+
+        timeout (e.g. what is left of the caller's deadline) shortens the
+        queue-time budget for this call, so a caller that has given up never
+        leaves a waiter behind to be granted later.
+        """
+        with self._cond:
+            waiter, deadline = self._admit(tokens, priority, timeout)
+            while True:
+                now = time.monotonic()
+                self._dispatch(now)
+                if waiter.granted:
+                    break
+                if now >= deadline:
+                    self._expire(waiter)
+                self._cond.wait(min(deadline - now, self._refill_delay()))
+
+        return self._record_wait(waiter, now)
+
+    async def acquire_async(self, tokens: float, priority: Optional[int] = None,
+                            timeout: Optional[float] = None) -> float:
+        """Coroutine version of acquire() that never blocks the event loop thread"""
+        with self._cond:
+            waiter, deadline = self._admit(tokens, priority, timeout)
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    self._dispatch(now)
+                    if waiter.granted:
+                        break
+                    if now >= deadline:
+                        self._expire(waiter)
+                    delay = min(deadline - now, self._refill_delay())
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            # e.g. asyncio.wait_for() at the caller's deadline: leave the queue
+            with self._cond:
+                self._cancel(waiter)
+            raise
+
+        return self._record_wait(waiter, now)
+
+    def settle(self, estimated_tokens: float, actual_tokens: float):
+        """Return over-estimated tokens to the bucket once real usage is known"""
+        refund = estimated_tokens - actual_tokens
+        if refund <= 0:
+            return
+        with self._cond:
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + refund)
+            self._cond.notify_all()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue wait percentiles per priority plus admission counters"""
+        with self._cond:
+            waits = {p: sorted(w) for p, w in self._waits.items()}
+            queued = sum(1 for _, _, w in self._queue if not w.cancelled)
+            summary = {'granted': self.granted, 'shed': self.shed, 'queued': queued, 'wait_ms': {}}
+
+        for priority, values in waits.items():
+            pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1)
+            summary['wait_ms'][priority] = {'p50': pick(0.50), 'p95': pick(0.95), 'max': pick(1.0)}
+        return summary
+
+    def _dispatch(self, now: float):
+        """Grant queued calls in priority order while both buckets allow"""
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        while self._queue:
+            _, _, head = self._queue[0]
+            if head.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            if self.requests.tokens < 1 or self.tokens.tokens < head.tokens:
+                break
+            heapq.heappop(self._queue)
+            self.requests.tokens -= 1
+            self.tokens.tokens -= head.tokens
+            head.granted = True
+            self.granted += 1
+            self._cond.notify_all()
+
+    def _estimated_wait(self, waiter: _Waiter, now: float) -> float:
+        """Time to drain every queued call at this priority or better, plus this one"""
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        ahead = [w for _, _, w in self._queue if not w.cancelled and w.priority <= waiter.priority]
+        need_requests = len(ahead) + 1
+        need_tokens = sum(w.tokens for w in ahead) + waiter.tokens
+        return max(self.requests.time_until(need_requests), self.tokens.time_until(need_tokens))
+
+    def _refill_delay(self) -> float:
+        """How long until the head of the queue could be served (cancelled heads are already popped)"""
+        if not self._queue:
+            return 0.05
+        head = self._queue[0][2]
+        return max(0.001, self.requests.time_until(1), self.tokens.time_until(head.tokens))
+
+    def _admit(self, tokens: float, priority: Optional[int], timeout: Optional[float] = None):
+        """Queue a waiter or shed it if the estimated wait exceeds the budget (lock held)"""
+        priority = _current_priority.get() if priority is None else priority
+        budget = self.max_queue_seconds if timeout is None else max(0.0, min(self.max_queue_seconds, timeout))
+        now = time.monotonic()
+        waiter = _Waiter(min(float(tokens), self.tokens.capacity), priority, now)
+        if self._estimated_wait(waiter, now) > budget:
+            self.shed += 1
+            raise LLMOverloadedError("LLM queue is full; try again shortly")
+        heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+        return waiter, now + budget
+
+    def _cancel(self, waiter: _Waiter):
+        """Withdraw an abandoned waiter, returning its slot if it was already granted (lock held)"""
+        if waiter.granted:
+            self.requests.tokens = min(self.requests.capacity, self.requests.tokens + 1)
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + waiter.tokens)
+            self.granted -= 1
+        waiter.cancelled = True
+        self._cond.notify_all()
+
+    def _expire(self, waiter: _Waiter):
+        """Drop a waiter that ran out of queue time (lock held)"""
+        waiter.cancelled = True
+        self.shed += 1
+        self._cond.notify_all()
+        raise LLMOverloadedError("LLM call exceeded its queue-time budget")
+
+    def _record_wait(self, waiter: _Waiter, granted_at: float) -> float:
+        waited = granted_at - waiter.enqueued
+        with self._cond:
+            waits = self._waits.setdefault(waiter.priority, deque(maxlen=self._metrics_window))
+            waits.append(waited)
+        return waited
+
+
+# ============================================================================
+# CLIENT WRAPPER
+# ============================================================================
+
+class LimitedLLMClient:
+    """Wrap an LLM client so every messages.create() goes through a limiter"""
+
+    def __init__(self, client: Any, limiter: LLMLimiter):
+        self.client = client
+        self.limiter = limiter
+        self.messages = self
+
+    def create(self, **request) -> Any:
+        self.reserve(request)
+        return self.send(request)
+
+    def reserve(self, request: Dict[str, Any], timeout: Optional[float] = None) -> float:
+        """Wait for the limiter to admit request (at most timeout); returns the time queued"""
+        return self.limiter.acquire(self._estimate(request), timeout=timeout)
+
+    def send(self, request: Dict[str, Any]) -> Any:
+        """Make an already reserved call and settle its token estimate"""
+        response = self.client.messages.create(**request)
+        self._settle(self._estimate(request), response)
+        return response
+
+    def _estimate(self, request: Dict[str, Any]) -> int:
+        return estimate_request_tokens(request) + request.get('max_tokens', 0)
+
+    def _settle(self, estimated: int, response: Any):
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            actual = ((getattr(usage, 'input_tokens', 0) or 0)
+                      + (getattr(usage, 'cache_read_input_tokens', 0) or 0)
+                      + (getattr(usage, 'output_tokens', 0) or 0))
+            self.limiter.settle(estimated, actual)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+
+class AsyncLimitedLLMClient(LimitedLLMClient):
+    """LimitedLLMClient for async clients (anthropic.AsyncAnthropic and friends)"""
+
+    async def create(self, **request) -> Any:
+        await self.reserve(request)
+        return await self.send(request)
+
+    async def reserve(self, request: Dict[str, Any], timeout: Optional[float] = None) -> float:
+        return await self.limiter.acquire_async(self._estimate(request), timeout=timeout)
+
+    async def send(self, request: Dict[str, Any]) -> Any:
+        response = await self.client.messages.create(**request)
+        self._settle(self._estimate(request), response)
+        return response
+
+
+_shared_limiter: Optional[LLMLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter() -> LLMLimiter:
+    """Process-wide limiter configured from LLM_* environment variables"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = LLMLimiter(
+                requests_per_minute=float(os.getenv('LLM_REQUESTS_PER_MINUTE', '50')),
+                tokens_per_minute=float(os.getenv('LLM_TOKENS_PER_MINUTE', '40000')),
+                max_queue_seconds=float(os.getenv('LLM_MAX_QUEUE_SECONDS', '30'))
+            )
+        return _shared_limiter
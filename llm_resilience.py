@@ -0,0 +1,289 @@
+"""
+LLM Call Resilience for Boba BI
+Per-call deadlines, jittered retries and a circuit breaker around LLM calls
+
+Every agent call goes through LLMGuard.call() (or call_async()). A call has
+one deadline covering rate-limiter queueing, every attempt and the backoff
+between attempts. Transient failures (timeouts, connection errors, 429 and
+5xx responses) are retried with full-jitter exponential backoff while time
+remains. Consecutive failed calls open the circuit: further calls fail
+immediately until LLM_CIRCUIT_RESET_SECONDS have passed, then one trial
+call decides whether it closes again.
+
+A call that cannot complete raises LLMUnavailableError; the agents catch it
+and fall back to locally computed text, so schedules still return within the
+deadline. LLMOverloadedError from the rate limiter is passed through
+untouched: the limiter already decided not to wait. So are local errors
+without an HTTP status (a TypeError from building the request): they are
+bugs to surface, not outages to hide behind a fallback.
+
+Usage:
+    guard = shared_guard()
+    response = guard.call(lambda: client.messages.create(**request))
+    response = await guard.call_async(lambda: async_client.messages.create(**request))
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from llm_limiter import LLMOverloadedError
+
+LLM_DEADLINE_SECONDS = float(os.getenv('LLM_DEADLINE_SECONDS', '15'))        # Per call, retries included
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))                     # Attempts after the first
+LLM_RETRY_BASE_SECONDS = float(os.getenv('LLM_RETRY_BASE_SECONDS', '0.5'))   # Backoff cap doubles per retry
+LLM_CIRCUIT_FAILURES = int(os.getenv('LLM_CIRCUIT_FAILURES', '5'))           # Consecutive failures that open it
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv('LLM_CIRCUIT_RESET_SECONDS', '30'))
+LLM_CALL_THREADS = 32  # Workers running blocking calls so the caller can stop waiting at the deadline
+
+
+class LLMUnavailableError(Exception):
+    """Raised when an LLM call fails, times out or is refused by the open circuit"""
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Timeouts, connection errors, 429 and 5xx are transient
+
+    Other 4xx responses and errors without a status (a TypeError or KeyError
+    from building the request) are bugs on our side: retrying them would only
+    count them against the circuit.
+    """
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    anthropic = sys.modules.get('anthropic')  # Only loaded once a real client was created
+    return anthropic is not None and isinstance(error, anthropic.APIConnectionError)  # Includes APITimeoutError
+
+
+# ============================================================================
+# CIRCUIT BREAKER
+# ============================================================================
+
+class CircuitBreaker:
+    """closed -> open after failure_threshold consecutive failures -> half_open after reset_seconds"""
+
+    def __init__(self, failure_threshold: int = LLM_CIRCUIT_FAILURES,
+                 reset_seconds: float = LLM_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._trial = False  # A half-open trial call is in flight
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'open' if now - self.opened_at < self.reset_seconds else 'half_open'
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (admits one trial call when half open)"""
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def release(self):
+        """End an admitted call without a verdict (a half-open trial may be retried)"""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial:
+                    self.times_opened += 1
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(now)
+            return {
+                'state': state,
+                'consecutive_failures': self.failures,
+                'times_opened': self.times_opened,
+                'retry_in_seconds': round(self.reset_seconds - (now - self.opened_at), 1) if state == 'open' else 0.0
+            }
+
+
+# ============================================================================
+# GUARD
+# ============================================================================
+
+class LLMGuard:
+    """Deadline, retry and circuit-breaker policy shared by sync and async LLM calls"""
+
+    def __init__(self, breaker: Optional[CircuitBreaker] = None, deadline_seconds: float = LLM_DEADLINE_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES, retry_base_seconds: float = LLM_RETRY_BASE_SECONDS,
+                 seed: Optional[int] = None):
+        self.breaker = breaker or CircuitBreaker()
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self._rng = random.Random(seed)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'retries': 0, 'timeouts': 0, 'failures': 0, 'rejected': 0, 'fallbacks': 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(LLM_CALL_THREADS, thread_name_prefix='llm-call')
+            return self._executor
+
+    def _backoff(self, attempt: int, remaining: float) -> float:
+        """Full jitter: uniform(0, base * 2**attempt), never past the deadline"""
+        with self._lock:
+            delay = self._rng.uniform(0, self.retry_base_seconds * 2 ** attempt)
+        return min(delay, max(0.0, remaining))
+
+    def _admit(self):
+        self._count('calls')
+        if not self.breaker.allow():
+            self._count('rejected')
+            raise LLMUnavailableError("LLM circuit is open")
+
+    def _failed(self, error: Exception, attempt: int, deadline: float) -> float:
+        """Count a failed attempt; returns the backoff before retrying or raises LLMUnavailableError"""
+        if isinstance(error, LLMOverloadedError):
+            self.breaker.release()  # Shedding says nothing about the LLM's health
+            raise error
+        timed_out = isinstance(error, (FutureTimeoutError, asyncio.TimeoutError))
+        self._count('timeouts' if timed_out else 'failures')
+        if not timed_out and not is_retryable(error) and getattr(error, 'status_code', None) is None:
+            self.breaker.release()
+            raise error  # A bug on our side (TypeError, KeyError, ...), not an LLM outage to fall back from
+        remaining = deadline - time.monotonic()
+        if timed_out or not is_retryable(error) or attempt >= self.max_retries or remaining <= 0:
+            if timed_out or is_retryable(error):
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()  # A rejected request says nothing about the LLM's health
+            reason = 'deadline exceeded' if timed_out or remaining <= 0 else str(error) or type(error).__name__
+            raise LLMUnavailableError(f"LLM call failed: {reason}") from error
+        self._count('retries')
+        return self._backoff(attempt, remaining)
+
+    def call(self, fn: Callable[[], Any], reserve: Optional[Callable[[float], Any]] = None) -> Any:
+        """
+        Run a blocking LLM call under the policy; the caller never waits past the deadline
+
+        reserve(timeout), e.g. LimitedLLMClient.reserve, runs in the calling
+        thread before each attempt, so rate-limit queueing keeps its priority
+        order, is bounded by the time left and never happens on a worker
+        thread after the caller has given up.
+        """
+        self._admit()
+        deadline = time.monotonic() + self.deadline_seconds
+        attempt, settled = 0, False
+        try:
+            while True:
+                try:
+                    if reserve is not None:
+                        reserve(deadline - time.monotonic())
+                    # A call abandoned at the deadline finishes in the background; its result is dropped.
+                    # The copied context carries the caller's limiter priority into the worker thread.
+                    future = self._pool().submit(contextvars.copy_context().run, self._attempt, fn, deadline)
+                    result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except Exception as e:
+                    settled = True  # _failed() settles the breaker whenever it raises
+                    delay = self._failed(e, attempt, deadline)
+                    settled = False
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                settled = True
+                self.breaker.record_success()
+                return result
+        except BaseException:
+            if not settled:
+                self.breaker.release()  # Interrupted without a verdict: free a half-open trial
+            raise
+
+    @staticmethod
+    def _attempt(fn: Callable[[], Any], deadline: float) -> Any:
+        # Submissions can queue behind busy workers; one that starts after the deadline is not sent
+        if time.monotonic() >= deadline:
+            raise FutureTimeoutError()
+        return fn()
+
+    async def call_async(self, fn: Callable[[], Awaitable[Any]],
+                         reserve: Optional[Callable[[float], Awaitable[Any]]] = None) -> Any:
+        """Coroutine version of call(); attempts past the deadline are cancelled"""
+        self._admit()
+        deadline = time.monotonic() + self.deadline_seconds
+        attempt, settled = 0, False
+        try:
+            while True:
+                try:
+                    if reserve is not None:
+                        await reserve(deadline - time.monotonic())
+                    result = await asyncio.wait_for(fn(), max(0.0, deadline - time.monotonic()))
+                except Exception as e:
+                    settled = True
+                    delay = self._failed(e, attempt, deadline)
+                    settled = False
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                settled = True
+                self.breaker.record_success()
+                return result
+        except BaseException:
+            if not settled:
+                self.breaker.release()  # Cancelled without a verdict: free a half-open trial
+            raise
+
+    def record_fallback(self):
+        """Count an agent answering with its local fallback"""
+        self._count('fallbacks')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {**counters, 'circuit': self.breaker.stats(), 'deadline_seconds': self.deadline_seconds}
+
+
+_shared_guard: Optional[LLMGuard] = None
+_shared_lock = threading.Lock()
+
+
+def shared_guard() -> LLMGuard:
+    """Process-wide guard (one circuit for the one upstream) configured from LLM_* environment variables"""
+    global _shared_guard
+    with _shared_lock:
+        if _shared_guard is None:
+            _shared_guard = LLMGuard()
+        return _shared_guard
@@ -0,0 +1,257 @@
+"""
+Boba BI Load Test - drives the real HTTP endpoints at a configurable mix
+
+Starts api_server.py (or asgi_server.py) locally with the offline LLM
+stand-in, runs a fixed number of concurrent clients against a weighted mix
+of endpoints and reports, per endpoint, throughput, p50/p95/p99 latency,
+error rate and status codes, plus the server's resident memory. With
+--isolate each endpoint also gets a phase of its own, so memory growth can
+be attributed to it.
+
+Usage:
+    python load_test.py --concurrency 32 --duration 30 --output run.json
+    python load_test.py --mix employees=5,schedule=1 --isolate
+    python load_test.py --no-start --port 5000          # an already running server
+    python load_test.py --output new.json --compare run.json
+
+Results are JSON (one document per run) so deployments can be compared.
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bench_serving import (
+    SERVER_PORTS,
+    http_request,
+    percentile,
+    server_rss_mb,
+    start_server,
+    wait_until_ready
+)
+
+OK_STATUSES = (200, 304)
+MEMORY_SAMPLE_SECONDS = 0.1
+
+
+def _ndjson_batch(i: int) -> Tuple[bytes, str]:
+    now = datetime.now().replace(microsecond=0)
+    lines = [json.dumps({'timestamp': now.isoformat(), 'items': 2, 'prep_time_minutes': 5}) for _ in range(100)]
+    return '\n'.join(lines).encode(), 'application/x-ndjson'
+
+
+# name -> (method, path, body factory(i) -> (body, content type) or None)
+ENDPOINTS: Dict[str, Tuple[str, str, Optional[Callable[[int], Tuple[Any, str]]]]] = {
+    'home': ('GET', '/', None),
+    'employees': ('GET', '/api/employees', None),
+    'traffic_analysis': ('GET', '/api/traffic/analysis?days=28', None),
+    'traffic_query': ('GET', '/api/traffic/query?granularity=day', None),
+    'stats': ('GET', '/api/stats', None),
+    'metrics': ('GET', '/api/metrics', None),
+    'schedule': ('POST', '/api/schedule',
+                 lambda i: ({'query': f"Load test schedule {i % 20}"}, 'application/json')),
+    'scenarios': ('POST', '/api/scenarios',
+                  lambda i: ({'grid': {'min_staff_per_shift': [1, 2, 3], 'orders_per_staff': [12, 15]}},
+                             'application/json')),
+    'pos_batch': ('POST', '/api/pos/batch', _ndjson_batch)
+}
+DEFAULT_MIX = 'employees=3,traffic_analysis=3,traffic_query=3,stats=2,metrics=1,schedule=1'
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """'employees=3,schedule=1' -> {'employees': 3.0, 'schedule': 1.0}"""
+    mix = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+        if mix[name] <= 0:
+            raise ValueError(f"Weight for '{name}' must be positive")
+    if not mix:
+        raise ValueError("Mix is empty")
+    return mix
+
+
+def summarize(samples: List[Tuple[float, Optional[int]]], elapsed: float) -> Dict[str, Any]:
+    """Throughput, latency percentiles and error rate for (latency seconds, status or None) samples"""
+    latencies = [latency for latency, _ in samples]
+    statuses: Dict[str, int] = {}
+    for _, status in samples:
+        key = str(status) if status is not None else 'connection_error'
+        statuses[key] = statuses.get(key, 0) + 1
+    errors = sum(1 for _, status in samples if status not in OK_STATUSES)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'max_ms': round(max(latencies, default=0.0) * 1000, 1),
+        'statuses': statuses
+    }
+
+
+async def run_load(host: str, port: int, mix: Dict[str, float], concurrency: int = 16,
+                   duration: float = 10.0, max_requests: Optional[int] = None,
+                   pid: Optional[int] = None, seed: int = 0, timeout: float = 60.0) -> Dict[str, Any]:
+    """
+    Drive the mix with `concurrency` clients for `duration` seconds (or max_requests)
+
+    Returns {'elapsed_s', 'total', 'endpoints': {name: summary}, 'server_memory_mb'}.
+    Memory is sampled from /proc when the server pid is known.
+    """
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    samples: Dict[str, List[Tuple[float, Optional[int]]]] = {name: [] for name in names}
+    deadline = time.perf_counter() + duration
+    issued = 0
+    memory = {'start': server_rss_mb(pid) if pid else None, 'peak': 0.0}
+
+    async def client():
+        nonlocal issued
+        while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+            i = issued
+            issued += 1
+            name = rng.choices(names, weights)[0]
+            method, path, factory = ENDPOINTS[name]
+            body, content_type = factory(i) if factory else (None, 'application/json')
+            started = time.perf_counter()
+            try:
+                status, _ = await http_request(host, port, method, path, body, timeout, content_type)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                status = None
+            samples[name].append((time.perf_counter() - started, status))
+
+    async def sample_memory():
+        while True:
+            memory['peak'] = max(memory['peak'], server_rss_mb(pid))
+            await asyncio.sleep(MEMORY_SAMPLE_SECONDS)
+
+    sampler = asyncio.ensure_future(sample_memory()) if pid else None
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if sampler is not None:
+        sampler.cancel()
+
+    return {
+        'elapsed_s': round(elapsed, 2),
+        'total': summarize([s for name in names for s in samples[name]], elapsed),
+        'endpoints': {name: summarize(samples[name], elapsed) for name in names if samples[name]},
+        'server_memory_mb': {
+            'start': round(memory['start'], 1),
+            'peak': round(max(memory['peak'], memory['start']), 1),
+            'end': round(server_rss_mb(pid), 1)
+        } if pid else None
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"\n{'Endpoint':<18} {'Reqs':>7} {'RPS':>8} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'Err%':>6} {'RSS MB':>8}")
+    print("-" * 78)
+    rows = list(result['endpoints'].items()) + [('TOTAL', result['total'])]
+    for name, stats in rows:
+        memory = stats.get('server_memory_mb') or {}
+        rss = f"{memory['peak']:.0f}" if memory else ''
+        print(f"{name:<18} {stats['requests']:>7} {stats['throughput_rps']:>8} {stats['p50_ms']:>8} "
+              f"{stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats['error_rate'] * 100:>6.1f} {rss:>8}")
+    if result.get('server_memory_mb'):
+        m = result['server_memory_mb']
+        print(f"\nServer RSS: {m['start']}MB at start, {m['peak']}MB peak, {m['end']}MB at end")
+
+
+def print_comparison(result: Dict[str, Any], baseline: Dict[str, Any]):
+    """Per-endpoint throughput and p95 change against an earlier results file"""
+    print(f"\nCompared with {baseline.get('revision') or 'baseline'} ({baseline.get('timestamp', '?')}):")
+    for name, stats in list(result['endpoints'].items()) + [('TOTAL', result['total'])]:
+        before = baseline['total'] if name == 'TOTAL' else baseline.get('endpoints', {}).get(name)
+        if not before:
+            continue
+        rps = (stats['throughput_rps'] / before['throughput_rps'] - 1) * 100 if before['throughput_rps'] else 0
+        p95 = (stats['p95_ms'] / before['p95_ms'] - 1) * 100 if before['p95_ms'] else 0
+        print(f"   {name:<18} throughput {rps:+6.1f}%   p95 {p95:+6.1f}%   "
+              f"errors {before['error_rate'] * 100:.1f}% -> {stats['error_rate'] * 100:.1f}%")
+
+
+async def run(args) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    port = args.port or SERVER_PORTS[args.server]
+    process = None if args.no_start else start_server(args.server, args.latency_ms, port)
+    pid = process.pid if process else args.pid
+    try:
+        await wait_until_ready(port)
+        result = await run_load('127.0.0.1', port, mix, args.concurrency, args.duration,
+                                args.requests, pid, args.seed)
+        if args.isolate:
+            for name in mix:
+                print(f"   Isolated phase: {name}")
+                phase = await run_load('127.0.0.1', port, {name: 1}, args.concurrency, args.duration,
+                                       args.requests, pid, args.seed)
+                result['endpoints'].setdefault(name, phase['endpoints'].get(name, summarize([], 0)))
+                result['endpoints'][name]['isolated'] = phase['endpoints'].get(name)
+                result['endpoints'][name]['server_memory_mb'] = phase['server_memory_mb']
+        return result
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Boba BI HTTP API")
+    parser.add_argument('--server', choices=list(SERVER_PORTS), default='flask', help="Server to start")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Endpoint weights, e.g. employees=3,schedule=1")
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent clients")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds per run (and per isolated phase)")
+    parser.add_argument('--requests', type=int, help="Stop after this many requests instead")
+    parser.add_argument('--latency-ms', type=float, default=200, help="Offline LLM latency per call")
+    parser.add_argument('--isolate', action='store_true', help="Also run each endpoint alone (per-endpoint memory)")
+    parser.add_argument('--no-start', action='store_true', help="Target an already running server")
+    parser.add_argument('--port', type=int, help="Server port (default: the server's usual port)")
+    parser.add_argument('--pid', type=int, help="Server pid for memory sampling with --no-start")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the request mix")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    parser.add_argument('--compare', help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    target = f"port {args.port}" if args.no_start else args.server
+    print(f"⏱️  Load testing {target} with {args.concurrency} clients, mix {args.mix}")
+    result = asyncio.run(run(args))
+    result = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        **result
+    }
+    print_report(result)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(result, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\n✅ Results saved to: {args.output}")
+    if result['total']['errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+POS Batch Ingestion for Boba BI
+Decodes, validates and appends batches of live orders (NDJSON or compact binary)
+
+Formats (POST /api/pos/batch):
+    application/x-ndjson      one JSON order per line:
+                              {"order_id": 7, "timestamp": "2025-06-01T18:05:00", "items": 2, "prep_time_minutes": 4}
+    application/x-boba-pos    BATCH_HEADER followed by count ORDER_RECORDs (little-endian):
+                              order_id int64 (0 = assign), epoch microseconds int64, items uint16, prep uint16
+
+order_id is optional; orders whose id was already ingested are counted as
+duplicates (so client retries are idempotent). Naive timestamps are
+shop-local wall-clock time, offset-aware and binary timestamps are
+converted to it. Decoding and validation run outside the store lock; only
+the append itself is serialized.
+"""
+
+import json
+import struct
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from time_buckets import epoch_to_local_seconds, get_zone, local_now
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/json')
+BINARY_TYPES = ('application/x-boba-pos', 'application/octet-stream')
+BATCH_MAGIC = b'BPOS'
+BATCH_HEADER = struct.Struct('<4sHHI')  # magic, format version, flags, order count
+ORDER_RECORD = struct.Struct('<qqHH')   # order_id, epoch microseconds, items, prep minutes
+
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+MAX_BATCH_ORDERS = 100000
+MAX_ITEMS_PER_ORDER = 50
+MAX_PREP_MINUTES = 240
+FUTURE_TOLERANCE = timedelta(minutes=5)
+MAX_REPORTED_ERRORS = 100
+
+_NAIVE_EPOCH = datetime(1970, 1, 1)
+
+
+# ============================================================================
+# DECODING
+# ============================================================================
+
+def decode_ndjson(body: bytes) -> List[Any]:
+    """Parse NDJSON in one json.loads call; falls back per line to locate a bad line"""
+    lines = [line for line in body.split(b'\n') if line.strip()]
+    if len(lines) > MAX_BATCH_ORDERS:
+        raise ValueError(f"Batch exceeds {MAX_BATCH_ORDERS} orders")
+    try:
+        return json.loads(b'[' + b','.join(lines) + b']')
+    except ValueError:
+        for number, line in enumerate(lines, 1):
+            try:
+                json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Invalid JSON on line {number}: {e}")
+        raise
+
+
+def encode_binary(orders: Iterable[Tuple[int, int, int, int]]) -> bytes:
+    """Binary batch from (order_id, epoch_us, items, prep_minutes) tuples"""
+    records = [ORDER_RECORD.pack(*order) for order in orders]
+    return BATCH_HEADER.pack(BATCH_MAGIC, 1, 0, len(records)) + b''.join(records)
+
+
+def decode_binary(body: bytes, tz=None) -> List[Dict]:
+    """Orders from a binary batch; timestamps become naive shop-local datetimes"""
+    if len(body) < BATCH_HEADER.size:
+        raise ValueError("Binary batch is shorter than its header")
+    magic, version, _, count = BATCH_HEADER.unpack_from(body)
+    if magic != BATCH_MAGIC or version != 1:
+        raise ValueError("Not a version 1 Boba POS binary batch")
+    if count > MAX_BATCH_ORDERS:
+        raise ValueError(f"Batch exceeds {MAX_BATCH_ORDERS} orders")
+    if len(body) != BATCH_HEADER.size + count * ORDER_RECORD.size:
+        raise ValueError(f"Binary batch length does not match its {count} records")
+
+    records = list(ORDER_RECORD.iter_unpack(memoryview(body)[BATCH_HEADER.size:]))
+    local = epoch_to_local_seconds([us // 1000000 for _, us, _, _ in records], tz)
+    return [
+        {
+            'order_id': order_id or None,
+            'timestamp': _NAIVE_EPOCH + timedelta(seconds=int(seconds), microseconds=us % 1000000),
+            'items': items,
+            'prep_time_minutes': prep
+        }
+        for (order_id, us, items, prep), seconds in zip(records, local)
+    ]
+
+
+def decode_batch(body: bytes, content_type: Optional[str], tz=None) -> List[Any]:
+    """Raw orders from a request body according to its Content-Type"""
+    if len(body) > MAX_BATCH_BYTES:
+        raise ValueError(f"Batch exceeds {MAX_BATCH_BYTES} bytes")
+    media_type = (content_type or 'application/x-ndjson').split(';')[0].strip().lower()
+    if media_type in BINARY_TYPES:
+        return decode_binary(body, tz)
+    if media_type in NDJSON_TYPES:
+        orders = decode_ndjson(body)
+        # A single JSON array body is accepted as well
+        return orders[0] if len(orders) == 1 and isinstance(orders[0], list) else orders
+    raise ValueError(f"Unsupported Content-Type '{media_type}'; use application/x-ndjson or application/x-boba-pos")
+
+
+# ============================================================================
+# VALIDATION
+# ============================================================================
+
+def _bounded_int(value: Any, low: int, high: int) -> bool:
+    return value.__class__ is int and low <= value <= high
+
+
+def validate_orders(raw_orders: List[Any], tz=None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Split raw orders into (valid orders, errors)
+
+    Valid orders are normalized to the store's shape with naive shop-local
+    timestamps; errors are {'index', 'error'} for each rejected order.
+    """
+    zone = get_zone(tz)
+    latest = local_now(zone) + FUTURE_TOLERANCE
+    parse = datetime.fromisoformat
+    valid, errors, aware = [], [], []
+
+    for index, order in enumerate(raw_orders):
+        if not isinstance(order, dict):
+            errors.append({'index': index, 'error': 'order must be a JSON object'})
+            continue
+        items, prep, order_id = order.get('items'), order.get('prep_time_minutes'), order.get('order_id')
+        if not _bounded_int(items, 1, MAX_ITEMS_PER_ORDER):
+            errors.append({'index': index, 'error': f'items must be an integer 1-{MAX_ITEMS_PER_ORDER}'})
+            continue
+        if not _bounded_int(prep, 0, MAX_PREP_MINUTES):
+            errors.append({'index': index, 'error': f'prep_time_minutes must be an integer 0-{MAX_PREP_MINUTES}'})
+            continue
+        if order_id is not None and not _bounded_int(order_id, 1, 2 ** 63 - 1):
+            errors.append({'index': index, 'error': 'order_id must be a positive integer'})
+            continue
+        try:
+            timestamp = order['timestamp']
+            if timestamp.__class__ is not datetime:  # Binary batches are already decoded
+                timestamp = parse(timestamp.replace('Z', '+00:00'))
+        except (KeyError, AttributeError, TypeError, ValueError):
+            errors.append({'index': index, 'error': 'timestamp must be an ISO 8601 string'})
+            continue
+
+        if timestamp.tzinfo is not None:
+            aware.append((len(valid), index, timestamp))
+        elif timestamp > latest:
+            errors.append({'index': index, 'error': 'timestamp is in the future'})
+            continue
+        valid.append({'order_id': order_id, 'timestamp': timestamp, 'items': items, 'prep_time_minutes': prep})
+
+    # Offset-aware timestamps: convert to shop-local time in one batch
+    if aware:
+        local = epoch_to_local_seconds([int(ts.timestamp()) for _, _, ts in aware], zone)
+        late = set()
+        for (position, index, ts), seconds in zip(aware, local):
+            naive = _NAIVE_EPOCH + timedelta(seconds=int(seconds), microseconds=ts.microsecond)
+            if naive > latest:
+                errors.append({'index': index, 'error': 'timestamp is in the future'})
+                late.add(position)
+            valid[position]['timestamp'] = naive
+        if late:
+            valid = [order for position, order in enumerate(valid) if position not in late]
+
+    for order in valid:
+        order['timestamp'] = order['timestamp'].isoformat()
+    errors.sort(key=lambda error: error['index'])
+    return valid, errors
+
+
+# ============================================================================
+# INGESTOR
+# ============================================================================
+
+class PosIngestor:
+    """
+    Appends validated batches to a VersionedStore
+
+    on_append(orders, old_version, new_version) runs under the ingest lock
+    after each append, so incremental aggregates see batches in order.
+    """
+
+    def __init__(self, store: Any, on_append: Optional[Callable[[List[Dict], Any, Any], None]] = None, tz=None):
+        self.store = store
+        self.on_append = on_append
+        self.tz = tz
+        self._lock = threading.Lock()
+        self._seen_ids = None
+        self._next_id = 1
+        self.batches = 0
+        self.accepted = 0
+        self.duplicates = 0
+        self.rejected = 0
+
+    def ingest(self, body: bytes, content_type: Optional[str] = None) -> Dict[str, Any]:
+        """Decode, validate and append one batch; raises ValueError if the body is unusable"""
+        if not hasattr(self.store, 'extend'):
+            raise ValueError("POS data is read-only in shared-memory mode; publish a new generation instead")
+        orders, errors = validate_orders(decode_batch(body, content_type, self.tz), self.tz)
+
+        with self._lock:
+            if self._seen_ids is None:
+                self._seen_ids = {tx['order_id'] for tx in self.store}
+                self._next_id = max(self._seen_ids, default=0) + 1
+            fresh, duplicates = [], 0
+            for order in orders:
+                order_id = order['order_id']
+                if order_id is None:
+                    order_id = order['order_id'] = self._next_id
+                elif order_id in self._seen_ids:
+                    duplicates += 1
+                    continue
+                self._seen_ids.add(order_id)
+                self._next_id = max(self._next_id, order_id + 1)
+                fresh.append(order)
+
+            old_version = self.store.version
+            if fresh:
+                self.store.extend(fresh)
+                if self.on_append is not None:
+                    self.on_append(fresh, old_version, self.store.version)
+            self.batches += 1
+            self.accepted += len(fresh)
+            self.duplicates += duplicates
+            self.rejected += len(errors)
+            version = self.store.version
+
+        return {
+            'success': True,
+            'accepted': len(fresh),
+            'duplicates': duplicates,
+            'rejected': len(errors),
+            'errors': errors[:MAX_REPORTED_ERRORS],
+            'data_version': version
+        }
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'batches': self.batches, 'accepted': self.accepted,
+                    'duplicates': self.duplicates, 'rejected': self.rejected}
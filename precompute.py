@@ -0,0 +1,268 @@
+"""
+Background Precompute for Boba BI
+Off-peak warm-up of traffic analysis, forecasts and next week's draft schedule
+
+PrecomputeScheduler is a small in-process, cron-like runner: at each of
+PRECOMPUTE_TIMES (shop-local "HH:MM" times) it runs its jobs one after
+another on a background thread, at batch priority so interactive LLM calls
+are served first. Jobs warm caches that requests already use (the traffic
+summary memo, the traffic cube, weather forecasts) and fill a ResultCache
+of orchestrator results keyed like schedule_request_key(). A request whose
+query, dates and data version match a cached result is answered without
+running the agents; any data change produces a new key, so the next request
+(or run) recomputes.
+
+Several server processes (gunicorn / uvicorn workers) each start a
+scheduler, but at run time only the process holding an exclusive lock on
+PRECOMPUTE_LOCK_PATH (next to the shared POS control file) runs the jobs;
+the lock is kept until that process stops, then another one takes over.
+Workers attached to the same shared POS data also share SharedResults, a
+small SQLite table at PRECOMPUTE_RESULTS_PATH: the owner's drafts (and any
+result a worker computes on demand) are published there, and the other
+workers load them on a local cache miss instead of running the agents.
+
+Usage:
+    scheduler = PrecomputeScheduler({'draft_schedule': lambda: run_orchestrator(query, record=False)})
+    scheduler.start()                  # runs at PRECOMPUTE_TIMES until stop()
+    scheduler.run_now()                # or on demand
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows - no election, every process runs its own jobs
+    fcntl = None
+
+from llm_limiter import PRIORITY_BATCH, shared_limiter
+from shared_pos import DEFAULT_PREFIX, SHM_DIR
+from time_buckets import local_now
+
+PRECOMPUTE_TIMES = os.getenv('PRECOMPUTE_TIMES', '03:00')  # Comma-separated shop-local HH:MM
+PRECOMPUTE_ENABLED = os.getenv('BOBA_BI_PRECOMPUTE', '1').lower() in ('1', 'true', 'yes')
+PRECOMPUTE_LOCK_PATH = os.getenv('PRECOMPUTE_LOCK_PATH') or os.path.join(SHM_DIR, f"{DEFAULT_PREFIX}_precompute.lock")
+PRECOMPUTE_RESULTS_PATH = (os.getenv('PRECOMPUTE_RESULTS_PATH')
+                           or os.path.join(SHM_DIR, f"{DEFAULT_PREFIX}_precompute.sqlite3"))
+MAX_CACHED_RESULTS = 64
+
+
+def parse_times(spec: str) -> List[Tuple[int, int]]:
+    """'03:00, 14:30' -> [(3, 0), (14, 30)]; raises ValueError for anything else"""
+    times = set()
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        hour, _, minute = part.partition(':')
+        try:
+            hour, minute = int(hour), int(minute or 0)
+        except ValueError:
+            raise ValueError(f"Invalid precompute time: {part!r}")
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            raise ValueError(f"Invalid precompute time: {part!r}")
+        times.add((hour, minute))
+    if not times:
+        raise ValueError("No precompute times given")
+    return sorted(times)
+
+
+def next_run(now: datetime, times: List[Tuple[int, int]]) -> datetime:
+    """First scheduled time strictly after now"""
+    for days in (0, 1):
+        day = (now + timedelta(days=days)).replace(second=0, microsecond=0)
+        for hour, minute in times:
+            candidate = day.replace(hour=hour, minute=minute)
+            if candidate > now:
+                return candidate
+    raise AssertionError("unreachable: times is never empty")
+
+
+# ============================================================================
+# RESULT CACHE
+# ============================================================================
+
+class ResultCache:
+    """Bounded LRU of computed results by key (e.g. schedule_request_key())"""
+
+    def __init__(self, max_entries: int = MAX_CACHED_RESULTS):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class SharedResults:
+    """
+    JSON results by key in a SQLite file every server process on the host opens
+
+    Keys are stored as repr(key), so they must be built from plain values
+    (strings, numbers, tuples) like schedule_request_key(). Only the newest
+    max_entries rows are kept.
+    """
+
+    def __init__(self, path: str = PRECOMPUTE_RESULTS_PATH, max_entries: int = MAX_CACHED_RESULTS):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)")
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM results WHERE key = ?", (repr(key),)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: Hashable, value: Any):
+        payload = json.dumps(value, default=str)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO results (key, value, stored_at) VALUES (?, ?, ?)",
+                               (repr(key), payload, time.time()))
+            self._conn.execute("DELETE FROM results WHERE key NOT IN "
+                               "(SELECT key FROM results ORDER BY stored_at DESC LIMIT ?)", (self.max_entries,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            return {'path': self.path, 'entries': entries, 'hits': self.hits, 'misses': self.misses}
+
+
+# ============================================================================
+# SCHEDULER
+# ============================================================================
+
+class PrecomputeScheduler:
+    """Runs named jobs at fixed shop-local times on one background thread"""
+
+    def __init__(self, jobs: Dict[str, Callable[[], Any]], times: str = PRECOMPUTE_TIMES,
+                 clock: Callable[[], datetime] = local_now, lock_path: Optional[str] = PRECOMPUTE_LOCK_PATH):
+        self.jobs = dict(jobs)
+        self.times = parse_times(times)
+        self.clock = clock
+        self.lock_path = lock_path  # None: always run (single process)
+        self._lock_file = None
+        self.runs = 0
+        self.skipped = 0
+        self.next_run_at: Optional[datetime] = None
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._run_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def run_now(self) -> Dict[str, Dict[str, Any]]:
+        """Run every job once (at batch LLM priority); a failing job does not stop the rest"""
+        with self._run_lock, shared_limiter().priority(PRIORITY_BATCH):
+            for name, job in self.jobs.items():
+                started = time.perf_counter()
+                try:
+                    job()
+                    status = {'ok': True}
+                except Exception as e:
+                    status = {'ok': False, 'error': str(e)}
+                    print(f"⚠️  Precompute job {name} failed: {e}")
+                status.update(at=self.clock().isoformat(timespec='seconds'),
+                              seconds=round(time.perf_counter() - started, 3))
+                with self._lock:
+                    self._last[name] = status
+            with self._lock:
+                self.runs += 1
+                return dict(self._last)
+
+    def start(self):
+        """Start the background thread (no-op if it is already running)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='precompute', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the thread and give up ownership so another process can take over"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._lock:
+            if self._lock_file is not None:
+                self._lock_file.close()  # Releases the flock
+                self._lock_file = None
+
+    def _claim(self) -> bool:
+        """Whether this process runs the jobs: it holds (or now takes) the lock on lock_path"""
+        if self.lock_path is None or fcntl is None:
+            return True
+        with self._lock:
+            if self._lock_file is not None:
+                return True
+            handle = open(self.lock_path, 'a')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                return False
+            self._lock_file = handle
+            return True
+
+    def _loop(self):
+        now = self.clock()
+        while True:
+            at = next_run(now, self.times)
+            with self._lock:
+                self.next_run_at = at
+            if self._stop.wait(max(0.0, (at - self.clock()).total_seconds())):
+                return
+            if self._claim():
+                self.run_now()
+            else:
+                with self._lock:
+                    self.skipped += 1
+            # Never run the same slot twice, even if the clock lags behind it
+            now = max(self.clock(), at)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'times': [f"{hour:02d}:{minute:02d}" for hour, minute in self.times],
+                'next_run': self.next_run_at.isoformat() if self.next_run_at else None,
+                'owner': self.lock_path is None or fcntl is None or self._lock_file is not None,
+                'runs': self.runs,
+                'skipped': self.skipped,
+                'jobs': dict(self._last)
+            }
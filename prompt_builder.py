@@ -0,0 +1,129 @@
+"""
+Prompt Building for Boba BI Agents
+Compact data encoding, stable instruction prefixes and token accounting
+
+Each agent's system prompt is static text and all per-call data goes in the
+user message, so every call of an agent sends byte-identical prefix bytes.
+Providers only cache prefixes above a minimum length (MIN_CACHEABLE_TOKENS);
+the instructions below are far shorter, so cache_control is only attached to
+a prefix that reaches the minimum for the model, where it can take effect.
+"""
+
+from typing import List, Dict, Any
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Shortest prompt prefix the provider will cache, by model family
+MIN_CACHEABLE_TOKENS = {'haiku': 2048}
+DEFAULT_MIN_CACHEABLE_TOKENS = 1024  # Sonnet / Opus
+
+# ============================================================================
+# STATIC INSTRUCTIONS (stable prefixes, identical on every call)
+# ============================================================================
+
+DATA_ANALYST_INSTRUCTIONS = """You are a Data Analyst Agent for Boba BI, an AI scheduling assistant for boba shops.
+
+You receive historical traffic as a pipe-separated table: one row per weekday, columns are average orders per hour for the morning shift (08:00-16:00) and evening shift (16:00-00:00) over the last 4 weeks.
+
+Answer the business owner's query with a concise analysis of:
+1. Peak hours by day
+2. Recommended staffing levels (orders per hour / 15 = staff needed)
+3. Key patterns and trends
+
+Keep response under 200 words."""
+
+WEATHER_NARRATIVE_INSTRUCTIONS = """You are a Weather Analysis Agent for Boba BI, an AI scheduling assistant for boba shops.
+
+You receive a forecast summary with per-day traffic impact that has already been computed (hot weather >75°F: +20% traffic, rain: -30% traffic, mild: baseline).
+
+Rewrite it as a short narrative for the shop owner. Do not change any numbers. Keep response under 150 words."""
+
+
+def min_cacheable_tokens(model: str) -> int:
+    """Minimum prefix length the provider caches for model"""
+    for family, tokens in MIN_CACHEABLE_TOKENS.items():
+        if family in model:
+            return tokens
+    return DEFAULT_MIN_CACHEABLE_TOKENS
+
+
+def cached_system(text: str, model: str) -> List[Dict]:
+    """System prompt block, marked for prompt caching only if it is long enough to be cached"""
+    block = {"type": "text", "text": text}
+    if estimate_tokens(text) >= min_cacheable_tokens(model):
+        block["cache_control"] = {"type": "ephemeral"}
+    return [block]
+
+
+# ============================================================================
+# COMPACT DATA ENCODING
+# ============================================================================
+
+def encode_traffic_table(traffic_summary: Dict[str, Dict[str, float]]) -> str:
+    """Encode a day -> shift -> orders/hr summary as a tight pipe table"""
+    rows = ["day|morning|evening"]
+    for day in WEEKDAYS:
+        if day in traffic_summary:
+            shifts = traffic_summary[day]
+            rows.append(f"{day[:3]}|{shifts.get('morning', 0):.1f}|{shifts.get('evening', 0):.1f}")
+    return "\n".join(rows)
+
+
+# ============================================================================
+# REQUEST BUILDERS
+# ============================================================================
+
+def build_data_analyst_request(model: str, traffic_summary: Dict, query: str) -> Dict[str, Any]:
+    """messages.create() arguments for the data analyst agent"""
+    return {
+        "model": model,
+        "max_tokens": 1000,
+        "system": cached_system(DATA_ANALYST_INSTRUCTIONS, model),
+        "messages": [{
+            "role": "user",
+            "content": f"Traffic:\n{encode_traffic_table(traffic_summary)}\n\nQuery: {query}"
+        }]
+    }
+
+
+def build_weather_narrative_request(model: str, location: str, summary: str) -> Dict[str, Any]:
+    """messages.create() arguments for the weather narrative"""
+    return {
+        "model": model,
+        "max_tokens": 500,
+        "system": cached_system(WEATHER_NARRATIVE_INSTRUCTIONS, model),
+        "messages": [{"role": "user", "content": f"Location: {location}\n{summary}"}]
+    }
+
+
+# ============================================================================
+# TOKEN ACCOUNTING
+# ============================================================================
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) for budgeting before a call"""
+    return max(1, len(text) // 4)
+
+
+def estimate_request_tokens(request: Dict[str, Any]) -> int:
+    """Estimated input tokens for a messages.create() request"""
+    parts = [block["text"] for block in request.get("system", [])]
+    for message in request["messages"]:
+        content = message["content"]
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(str(block) for block in content)
+    return estimate_tokens("".join(parts))
+
+
+def usage_record(agent: str, response: Any) -> Dict[str, int]:
+    """Token usage reported by the provider for one call"""
+    usage = getattr(response, 'usage', None)
+    return {
+        'agent': agent,
+        'input_tokens': getattr(usage, 'input_tokens', 0) or 0,
+        'cache_read_input_tokens': getattr(usage, 'cache_read_input_tokens', 0) or 0,
+        'cache_creation_input_tokens': getattr(usage, 'cache_creation_input_tokens', 0) or 0,
+        'output_tokens': getattr(usage, 'output_tokens', 0) or 0
+    }
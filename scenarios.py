@@ -0,0 +1,164 @@
+"""
+What-If Scenario Evaluation for Boba BI
+Runs the scheduler over a grid of constraint variants without any LLM calls
+
+Usage:
+    results = run_scenarios(traffic_data, dates, employees, weather_multipliers, {
+        'min_staff_per_shift': [1, 2, 3],
+        'max_hours_per_week': [32, 40],
+        'orders_per_staff': [12, 15, 18],
+        'weather_scale': [0, 1, 1.5]
+    })
+
+Every combination of the grid's values is one variant. weather_scale scales
+each date's weather effect (0 ignores the weather, 1 uses the forecast
+multipliers as computed). Pass the scheduler's capacity model and the hours
+already worked (see BobaBI.scheduler_agent) so the baseline variant is the
+schedule the scheduler would produce; with a capacity model, orders_per_staff
+has no effect. Variants are evaluated in chunks on a shared process pool;
+each chunk carries its own (small) inputs, so one pool serves every request.
+"""
+
+import os
+import math
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from boba_bi import (
+    build_schedule,
+    FIXED_SHIFTS,
+    MIN_STAFF_PER_SHIFT,
+    MAX_HOURS_PER_WEEK,
+    ORDERS_PER_STAFF
+)
+from capacity import CapacityModel
+
+# Grid parameter -> (baseline value, smallest allowed value)
+SCENARIO_PARAMETERS = {
+    'min_staff_per_shift': (MIN_STAFF_PER_SHIFT, 0),
+    'max_hours_per_week': (MAX_HOURS_PER_WEEK, 0),
+    'orders_per_staff': (ORDERS_PER_STAFF, 1),
+    'weather_scale': (1.0, 0)
+}
+MAX_SCENARIOS = 10000
+SCENARIO_WORKERS = int(os.getenv('SCENARIO_WORKERS', str(os.cpu_count() or 1)))
+PARALLEL_MIN_SCENARIOS = 200  # Smaller grids finish faster in-process than the IPC round trip
+
+
+# ============================================================================
+# GRID AND METRICS
+# ============================================================================
+
+def expand_grid(grid: Dict[str, Any]) -> List[Dict[str, float]]:
+    """All combinations of the grid's values; unspecified parameters keep their baseline"""
+    unknown = set(grid) - set(SCENARIO_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown scenario parameters: {', '.join(sorted(unknown))}")
+
+    axes = []
+    for name, (baseline, minimum) in SCENARIO_PARAMETERS.items():
+        values = grid.get(name, [baseline])
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        if not values:
+            raise ValueError(f"{name} needs at least one value")
+        for value in values:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not value >= minimum:
+                raise ValueError(f"{name} values must be numbers >= {minimum}")
+        axes.append(values)
+
+    if math.prod(len(values) for values in axes) > MAX_SCENARIOS:
+        raise ValueError(f"Grid expands to more than {MAX_SCENARIOS} scenarios")
+    return [dict(zip(SCENARIO_PARAMETERS, combination)) for combination in itertools.product(*axes)]
+
+
+def schedule_metrics(schedule: List[Dict]) -> Dict[str, Any]:
+    """Coverage (share of needed staff-shifts filled), understaffed shifts and total hours"""
+    shift_hours = {name: info['hours'] for name, info in FIXED_SHIFTS.items()}
+    needed = sum(shift['staff_needed'] for shift in schedule)
+    filled = sum(min(shift['staff_assigned'], shift['staff_needed']) for shift in schedule)
+    return {
+        'coverage': round(filled / needed, 4) if needed else 1.0,
+        'understaffed_shifts': sum(1 for shift in schedule if shift['staff_assigned'] < shift['staff_needed']),
+        'total_hours': sum(shift['staff_assigned'] * shift_hours[shift['shift']] for shift in schedule),
+        'staff_needed': needed,
+        'staff_assigned': sum(shift['staff_assigned'] for shift in schedule)
+    }
+
+
+def evaluate_scenario(inputs: Dict[str, Any], variant: Dict[str, float],
+                      capacity: Optional[CapacityModel] = None) -> Dict[str, Any]:
+    """Schedule metrics for one variant of the constraints"""
+    scale = variant['weather_scale']
+    multipliers = {date: 1 + (m - 1) * scale for date, m in inputs['weather_multipliers'].items()}
+    schedule = build_schedule(
+        inputs['traffic_data'], inputs['dates'], inputs['employees'], multipliers,
+        min_staff_per_shift=variant['min_staff_per_shift'],
+        max_hours_per_week=variant['max_hours_per_week'],
+        orders_per_staff=variant['orders_per_staff'],
+        hours_worked=inputs['hours_worked'],
+        capacity=capacity
+    )
+    return {'variant': variant, **schedule_metrics(schedule)}
+
+
+def _evaluate_chunk(args: Tuple[Dict[str, Any], List[Dict[str, float]]]) -> List[Dict[str, Any]]:
+    inputs, variants = args
+    # The model holds a lock, so chunks carry its profile and each process rebuilds it once
+    settings = inputs['capacity']
+    capacity = CapacityModel(*settings) if settings is not None else None
+    return [evaluate_scenario(inputs, variant, capacity) for variant in variants]
+
+
+# ============================================================================
+# PROCESS POOL
+# ============================================================================
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def scenario_pool() -> ProcessPoolExecutor:
+    """
+    Process-wide pool for scenario chunks, started on first use
+
+    Workers come from a forkserver (spawn where unavailable), never a fork
+    of the server process, whose other threads may hold locks at that moment.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=SCENARIO_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def run_scenarios(traffic_data: Dict, dates: List[str], employees: List[Dict],
+                  weather_multipliers: Dict[str, float], grid: Dict[str, Any],
+                  workers: Optional[int] = None, capacity: Optional[CapacityModel] = None,
+                  hours_worked: Optional[Dict[str, Dict[Any, int]]] = None) -> List[Dict[str, Any]]:
+    """
+    Evaluate every variant in the grid, in grid order
+
+    Large grids are split into one chunk per worker process; workers=1 (or a
+    grid under PARALLEL_MIN_SCENARIOS) evaluates in this process.
+    """
+    variants = expand_grid(grid)
+    inputs = {
+        'traffic_data': traffic_data,
+        'dates': list(dates),
+        'employees': [dict(emp) for emp in employees],
+        'weather_multipliers': dict(weather_multipliers),
+        'hours_worked': hours_worked,
+        'capacity': (capacity.profile, capacity.target_wait_minutes, capacity.service_level) if capacity else None
+    }
+    workers = SCENARIO_WORKERS if workers is None else workers
+    if workers <= 1 or len(variants) < PARALLEL_MIN_SCENARIOS:
+        return _evaluate_chunk((inputs, variants))
+
+    size = math.ceil(len(variants) / workers)
+    chunks = [(inputs, variants[i:i + size]) for i in range(0, len(variants), size)]
+    return [result for chunk in scenario_pool().map(_evaluate_chunk, chunks) for result in chunk]
@@ -0,0 +1,249 @@
+"""
+Schedule History for Boba BI
+Stores generated schedules in SQLite, indexed for per-employee hour queries
+
+Tables:
+    shifts        one row per (date, shift) with its staffing numbers
+    assignments   one row per employee per shift; the primary key
+                  (employee_id, date, shift) serves per-employee range scans
+                  and a (date, slot) index serves schedule reads
+    week_hours    hours and shift count per (employee_id, week_start),
+                  updated in the same transaction as assignments
+
+Recording a schedule replaces whatever was stored for its (date, shift)
+slots, so re-planning a week never double counts. Hour caps read the
+week_hours aggregate and schedule reads page by (date, shift) keyset, so
+every query is a fixed number of index lookups however much history
+accumulates.
+
+Usage:
+    history = ScheduleHistory('boba_bi_history.sqlite3')
+    history.record(result['schedule'])
+    rows, cursor = history.shifts(start='2025-06-02', limit=50)
+    history.employee_hours('2025-06-02', '2025-06-08')
+"""
+
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from boba_bi import FIXED_SHIFTS, week_start
+
+SCHEDULE_HISTORY_PATH = os.getenv('SCHEDULE_HISTORY_PATH', ':memory:')
+HISTORY_PAGE_SIZE = 100
+MAX_HISTORY_PAGE_SIZE = 1000
+
+# Shifts sort by start time within a day, not by name
+SHIFT_SLOTS = {name: index for index, name in enumerate(FIXED_SHIFTS)}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shifts (
+    date TEXT NOT NULL, slot INTEGER NOT NULL, shift TEXT NOT NULL, day TEXT, shift_time TEXT,
+    predicted_orders_per_hour REAL, staff_needed INTEGER, staff_assigned INTEGER,
+    PRIMARY KEY (date, slot)
+);
+CREATE TABLE IF NOT EXISTS assignments (
+    employee_id NOT NULL, date TEXT NOT NULL, slot INTEGER NOT NULL, position INTEGER NOT NULL,
+    name TEXT, week_start TEXT NOT NULL, hours INTEGER NOT NULL,
+    PRIMARY KEY (employee_id, date, slot)
+);
+CREATE INDEX IF NOT EXISTS assignments_by_shift ON assignments (date, slot);
+CREATE TABLE IF NOT EXISTS week_hours (
+    employee_id NOT NULL, week_start TEXT NOT NULL, hours INTEGER NOT NULL, shifts INTEGER NOT NULL,
+    PRIMARY KEY (employee_id, week_start)
+);
+CREATE INDEX IF NOT EXISTS week_hours_by_week ON week_hours (week_start);
+"""
+
+
+def _parse_cursor(cursor: Optional[str]) -> Optional[Tuple[str, int]]:
+    """'2025-06-02:1' -> ('2025-06-02', 1); raises ValueError for anything else"""
+    if not cursor:
+        return None
+    date, _, slot = cursor.rpartition(':')
+    if not date or not slot.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return date, int(slot)
+
+
+class ScheduleHistory:
+    """SQLite store of recorded schedules with a per-employee weekly hours aggregate"""
+
+    def __init__(self, path: str = SCHEDULE_HISTORY_PATH):
+        self.path = path
+        self.version = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def record(self, schedule: List[Dict], employees: Iterable[Dict] = ()) -> int:
+        """
+        Store schedule entries, replacing earlier entries for the same (date, shift)
+
+        Entries without employee_ids (older schedules) are mapped to ids by
+        name through employees. Returns the number of shifts stored.
+        """
+        ids_by_name = {emp['name']: emp['employee_id'] for emp in employees}
+        shift_rows, assignment_rows = [], []
+        for entry in schedule:
+            date, slot = entry['date'], SHIFT_SLOTS[entry['shift']]
+            hours, week = FIXED_SHIFTS[entry['shift']]['hours'], week_start(entry['date'])
+            names = entry.get('employees', [])
+            ids = entry.get('employee_ids') or [ids_by_name[name] for name in names if name in ids_by_name]
+            shift_rows.append((date, slot, entry['shift'], entry.get('day'), entry.get('shift_time'),
+                               entry.get('predicted_orders_per_hour'), entry.get('staff_needed'),
+                               entry.get('staff_assigned', len(ids))))
+            assignment_rows.extend(
+                (employee_id, date, slot, position, names[position] if position < len(names) else None, week, hours)
+                for position, employee_id in enumerate(ids)
+            )
+        slots = [(row[0], row[1]) for row in shift_rows]
+
+        with self._lock, self._db:
+            # Take the replaced assignments out of the weekly aggregate first
+            self._db.executemany(
+                "UPDATE week_hours SET hours = week_hours.hours - a.hours, shifts = week_hours.shifts - 1 "
+                "FROM (SELECT employee_id, week_start, hours FROM assignments WHERE date = ? AND slot = ?) AS a "
+                "WHERE week_hours.employee_id = a.employee_id AND week_hours.week_start = a.week_start",
+                slots
+            )
+            self._db.executemany("DELETE FROM assignments WHERE date = ? AND slot = ?", slots)
+            self._db.executemany("INSERT OR REPLACE INTO shifts VALUES (?, ?, ?, ?, ?, ?, ?, ?)", shift_rows)
+            self._db.executemany("INSERT INTO assignments VALUES (?, ?, ?, ?, ?, ?, ?)", assignment_rows)
+            self._db.executemany(
+                "INSERT INTO week_hours VALUES (?, ?, ?, 1) ON CONFLICT (employee_id, week_start) "
+                "DO UPDATE SET hours = hours + excluded.hours, shifts = shifts + 1",
+                [(row[0], row[5], row[6]) for row in assignment_rows]
+            )
+            if slots:
+                weeks = sorted({week_start(date) for date, _ in slots})
+                self._db.execute(
+                    f"DELETE FROM week_hours WHERE week_start IN ({','.join('?' * len(weeks))}) AND shifts <= 0",
+                    weeks
+                )
+            self.version += 1
+        return len(shift_rows)
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def shifts(self, start: Optional[str] = None, end: Optional[str] = None,
+               limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        One page of recorded shifts ordered by (date, shift start); returns (rows, next cursor)
+
+        Pass the returned cursor back to continue after the last row; it is
+        None on the final page. Raises ValueError for a bad limit or cursor.
+        """
+        if not isinstance(limit, int) or not 1 <= limit <= MAX_HISTORY_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_HISTORY_PAGE_SIZE}")
+        after = _parse_cursor(cursor)
+        where, params = [], []
+        if start:
+            where.append("date >= ?")
+            params.append(start)
+        if end:
+            where.append("date <= ?")
+            params.append(end)
+        if after:
+            where.append("(date > ? OR (date = ? AND slot > ?))")
+            params.extend([after[0], after[0], after[1]])
+        sql = ("SELECT date, slot, shift, day, shift_time, predicted_orders_per_hour, staff_needed, staff_assigned "
+               f"FROM shifts {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY date, slot LIMIT ?")
+
+        with self._lock:
+            page = self._db.execute(sql, params + [limit + 1]).fetchall()
+            more, page = len(page) > limit, page[:limit]
+            staff = defaultdict(list)
+            if page:
+                for date, slot, employee_id, name in self._db.execute(
+                    "SELECT date, slot, employee_id, name FROM assignments "
+                    "WHERE date BETWEEN ? AND ? ORDER BY date, slot, position",
+                    (page[0][0], page[-1][0])
+                ):
+                    staff[(date, slot)].append((employee_id, name))
+
+        rows = []
+        for date, slot, shift, day, shift_time, orders, needed, assigned in page:
+            rows.append({
+                'date': date,
+                'day': day,
+                'shift': shift,
+                'shift_time': shift_time,
+                'predicted_orders_per_hour': orders,
+                'staff_needed': needed,
+                'staff_assigned': assigned,
+                'employees': [name for _, name in staff[(date, slot)]],
+                'employee_ids': [employee_id for employee_id, _ in staff[(date, slot)]]
+            })
+        next_cursor = f"{page[-1][0]}:{page[-1][1]}" if more else None
+        return rows, next_cursor
+
+    def employee_hours(self, start_date: str, end_date: str,
+                       employee_ids: Optional[Iterable[Any]] = None) -> Dict[Any, Dict[str, Any]]:
+        """{employee_id: {'name', 'hours', 'shifts'}} for shifts dated start_date..end_date (inclusive)"""
+        sql = ("SELECT employee_id, MAX(name), SUM(hours), COUNT(*) FROM assignments "
+               "WHERE date BETWEEN ? AND ?")
+        params: List[Any] = [start_date, end_date]
+        if employee_ids is not None:
+            ids = list(employee_ids)
+            sql += f" AND employee_id IN ({','.join('?' * len(ids))})"
+            params.extend(ids)
+        with self._lock:
+            rows = self._db.execute(sql + " GROUP BY employee_id ORDER BY employee_id", params).fetchall()
+        return {employee_id: {'name': name, 'hours': hours, 'shifts': shifts}
+                for employee_id, name, hours, shifts in rows}
+
+    def week_hours(self, week_starts: Iterable[str]) -> Dict[str, Dict[Any, int]]:
+        """{week_start: {employee_id: hours}} from the weekly aggregate"""
+        weeks = sorted(set(week_starts))
+        result: Dict[str, Dict[Any, int]] = {week: {} for week in weeks}
+        if not weeks:
+            return result
+        with self._lock:
+            for employee_id, week, hours in self._db.execute(
+                f"SELECT employee_id, week_start, hours FROM week_hours WHERE week_start IN ({','.join('?' * len(weeks))})",
+                weeks
+            ):
+                result[week][employee_id] = hours
+        return result
+
+    def hours_worked(self, dates: List[str]) -> Dict[str, Dict[Any, int]]:
+        """
+        Hours already recorded in the calendar weeks of dates, excluding dates themselves
+
+        This is the hours_worked seed for build_schedule(): re-planning some
+        dates of a week counts the rest of that week against the weekly cap,
+        but not the plan being replaced.
+        """
+        worked = self.week_hours(week_start(date) for date in dates)
+        if not dates:
+            return worked
+        with self._lock:
+            replaced = self._db.execute(
+                f"SELECT employee_id, week_start, SUM(hours) FROM assignments "
+                f"WHERE date IN ({','.join('?' * len(dates))}) GROUP BY employee_id, week_start",
+                list(dates)
+            ).fetchall()
+        for employee_id, week, hours in replaced:
+            remaining = worked[week].get(employee_id, 0) - hours
+            if remaining > 0:
+                worked[week][employee_id] = remaining
+            else:
+                worked[week].pop(employee_id, None)
+        return worked
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM shifts").fetchone()[0]
+
+    def close(self):
+        self._db.close()
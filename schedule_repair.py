@@ -0,0 +1,178 @@
+"""
+Incremental Schedule Repair for Boba BI
+Patches an existing schedule after a roster or demand change instead of rebuilding it
+
+Changes:
+    {"type": "unavailable", "employee_id": 3}                        all dates
+    {"type": "unavailable", "employee_id": 3, "dates": ["2025-06-02"], "shift": "evening"}
+    {"type": "demand", "date": "2025-06-02", "shift": "evening", "staff_needed": 4}
+    {"type": "demand", "date": "2025-06-02", "shift": "evening", "predicted_orders_per_hour": 70}
+
+Only the shifts a change touches are re-solved, plus understaffed shifts in
+calendar weeks where the change freed hours under MAX_HOURS_PER_WEEK. Every
+other shift keeps its assignment. Replacements are chosen the way
+build_schedule() chooses: availability, then shift preference, then fewest
+hours that week.
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from boba_bi import (
+    FIXED_SHIFTS,
+    MIN_STAFF_PER_SHIFT,
+    MAX_HOURS_PER_WEEK,
+    ORDERS_PER_STAFF,
+    get_available_employees,
+    week_start
+)
+
+
+def _shift_ids(shift: Dict, ids_by_name: Dict[str, Any]) -> List[Any]:
+    """Assigned employee ids (schedules from before employee_ids map names to the roster)"""
+    if 'employee_ids' in shift:
+        return list(shift['employee_ids'])
+    return [ids_by_name[name] for name in shift['employees'] if name in ids_by_name]
+
+
+def _apply_changes(changes: List[Dict], slots: Dict[Tuple[str, str], int], dates: List[str],
+                   min_staff_per_shift: int, orders_per_staff: float):
+    """Validate changes into ({slot: blocked employee ids}, {slot: (staff_needed, orders/hr or None)})"""
+    blocked = defaultdict(set)
+    demand = {}
+    for change in changes:
+        kind = change.get('type') if isinstance(change, dict) else None
+        if kind == 'unavailable':
+            if 'employee_id' not in change:
+                raise ValueError("unavailable change needs an employee_id")
+            shifts = [change['shift']] if change.get('shift') else list(FIXED_SHIFTS)
+            for date in change.get('dates') or dates:
+                for shift in shifts:
+                    if (date, shift) not in slots:
+                        raise ValueError(f"No {shift} shift on {date} in the schedule")
+                    blocked[(date, shift)].add(change['employee_id'])
+        elif kind == 'demand':
+            slot = (change.get('date'), change.get('shift'))
+            if slot not in slots:
+                raise ValueError(f"No {slot[1]} shift on {slot[0]} in the schedule")
+            if 'staff_needed' in change:
+                needed, orders = change['staff_needed'], None
+                if not isinstance(needed, int) or needed < 0:
+                    raise ValueError("staff_needed must be a non-negative integer")
+            elif isinstance(change.get('predicted_orders_per_hour'), (int, float)):
+                orders = change['predicted_orders_per_hour']
+                needed = max(min_staff_per_shift, int(orders / orders_per_staff))
+            else:
+                raise ValueError("demand change needs staff_needed or predicted_orders_per_hour")
+            demand[slot] = (needed, orders)
+        else:
+            raise ValueError(f"Unknown change type: {kind!r} (use 'unavailable' or 'demand')")
+    return blocked, demand
+
+
+def repair_schedule(schedule: List[Dict], employees: List[Dict], changes: List[Dict],
+                    max_hours_per_week: int = MAX_HOURS_PER_WEEK,
+                    min_staff_per_shift: int = MIN_STAFF_PER_SHIFT,
+                    orders_per_staff: float = ORDERS_PER_STAFF) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Apply changes to a schedule; returns (repaired schedule, diff)
+
+    The input schedule is not modified. The diff has one entry per shift
+    whose assignment or demand changed: {'date', 'shift', 'removed',
+    'added', 'staff_needed', 'staff_assigned'}, with names in removed/added.
+    Raises ValueError for malformed changes or unknown shifts.
+    """
+    slots = {(shift['date'], shift['shift']): index for index, shift in enumerate(schedule)}
+    dates = list(dict.fromkeys(shift['date'] for shift in schedule))
+    blocked, demand = _apply_changes(changes, slots, dates, min_staff_per_shift, orders_per_staff)
+
+    roster = {emp['employee_id']: emp for emp in employees}
+    ids_by_name = {emp['name']: emp['employee_id'] for emp in employees}
+    weeks = {date: week_start(date) for date in dates}
+
+    # Hour caps are per calendar week, so only the weeks a change touches are loaded
+    touched_weeks = {weeks[date] for date, _ in demand}
+    touched_weeks.update(weeks[slot[0]] for slot, employee_ids in blocked.items()
+                         if employee_ids.intersection(_shift_ids(schedule[slots[slot]], ids_by_name)))
+    week_slots = [slot for slot in slots if weeks[slot[0]] in touched_weeks]
+    assigned = {slot: _shift_ids(schedule[slots[slot]], ids_by_name) for slot in week_slots}
+    needed = {slot: schedule[slots[slot]]['staff_needed'] for slot in week_slots}
+    hours = defaultdict(int)
+    for (date, shift), ids in assigned.items():
+        for employee_id in ids:
+            hours[(weeks[date], employee_id)] += FIXED_SHIFTS[shift]['hours']
+
+    dirty, freed_weeks = set(), set()
+
+    def drop(slot, employee_id):
+        assigned[slot].remove(employee_id)
+        hours[(weeks[slot[0]], employee_id)] -= FIXED_SHIFTS[slot[1]]['hours']
+        freed_weeks.add(weeks[slot[0]])
+        dirty.add(slot)
+
+    for slot, employee_ids in blocked.items():
+        for employee_id in [e for e in assigned.get(slot, ()) if e in employee_ids]:
+            drop(slot, employee_id)
+    for slot, (staff_needed, _) in demand.items():
+        needed[slot] = staff_needed
+        dirty.add(slot)
+        # Lower demand releases the most recently assigned (lowest ranked) staff
+        while len(assigned[slot]) > staff_needed:
+            drop(slot, assigned[slot][-1])
+
+    # Freed hours can let understaffed shifts elsewhere in the same week be filled
+    candidates = {}
+    to_fill = sorted(dirty | {slot for slot in week_slots
+                              if weeks[slot[0]] in freed_weeks and len(assigned[slot]) < needed[slot]},
+                     key=lambda slot: slots[slot])
+    for slot in to_fill:
+        date, shift = slot
+        if len(assigned[slot]) >= needed[slot]:
+            continue
+        day_name = schedule[slots[slot]]['day']
+        group = (day_name in ('Saturday', 'Sunday'), shift)
+        if group not in candidates:
+            candidates[group] = get_available_employees(employees, day_name, shift)
+        week, shift_hours = weeks[date], FIXED_SHIFTS[shift]['hours']
+        taken = set(assigned[slot]) | blocked.get(slot, set())
+        available = sorted(
+            (emp for emp in candidates[group] if emp['employee_id'] not in taken),
+            key=lambda x: (x['preference_score'], -hours[(week, x['employee_id'])]),
+            reverse=True
+        )
+        for emp in available:
+            if len(assigned[slot]) >= needed[slot]:
+                break
+            if hours[(week, emp['employee_id'])] + shift_hours <= max_hours_per_week:
+                assigned[slot].append(emp['employee_id'])
+                hours[(week, emp['employee_id'])] += shift_hours
+                dirty.add(slot)
+
+    # Rebuild only the shifts that changed; everything else is passed through
+    repaired, diff = list(schedule), []
+    for slot in sorted(dirty, key=lambda slot: slots[slot]):
+        original = schedule[slots[slot]]
+        before = _shift_ids(original, ids_by_name)
+        after = assigned[slot]
+        if after == before and needed[slot] == original['staff_needed'] and slot not in demand:
+            continue
+        kept, previous = set(after), set(before)
+        shift = dict(original)
+        shift.update({
+            'staff_needed': needed[slot],
+            'staff_assigned': len(after),
+            'employees': [roster[e]['name'] if e in roster else str(e) for e in after],
+            'employee_ids': list(after)
+        })
+        if slot in demand and demand[slot][1] is not None:
+            shift['predicted_orders_per_hour'] = round(demand[slot][1], 1)
+        repaired[slots[slot]] = shift
+        diff.append({
+            'date': slot[0],
+            'shift': slot[1],
+            'removed': [roster[e]['name'] if e in roster else str(e) for e in before if e not in kept],
+            'added': [roster[e]['name'] for e in after if e not in previous],
+            'staff_needed': needed[slot],
+            'staff_assigned': len(after)
+        })
+    return repaired, diff
@@ -0,0 +1,282 @@
+"""
+Shared-Memory POS Data for Boba BI
+One loader process publishes POS columns and hourly aggregates; server workers attach read-only
+
+Usage:
+    python shared_pos.py publish --weeks 100     # Load/generate and publish a new generation
+    python shared_pos.py unlink                  # Remove all published segments
+    BOBA_BI_SHARED_POS=1 python api_server.py    # Workers attach instead of generating data
+
+Each publish writes a complete new segment file <prefix>_g<generation>.bin
+on tmpfs (/dev/shm where available), then atomically replaces a small JSON
+control file pointing at it. Workers mmap segments read-only, so every
+process shares the same physical pages. They re-read the control file (at
+most every BOBA_BI_SHM_REFRESH_SECONDS) and switch to the new generation;
+the previous segment is kept for one more generation so in-flight attaches
+never race an unlink, and a mapping stays valid until its last reader drops it.
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import tempfile
+import argparse
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, Optional
+from zoneinfo import ZoneInfo
+from time_buckets import SHOP_TIMEZONE
+
+MAGIC = b'BOBAPOS1'
+HEADER = struct.Struct('<8sQQQq')  # magic, generation, count, n_hours, first_hour
+COLUMNS = [('order_id', 'q'), ('ts_us', 'q'), ('items', 'q'), ('prep_time_minutes', 'q')]
+AGGREGATES = ['hour_orders', 'hour_items', 'hour_prep_minutes']
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+US_PER_HOUR = 3600 * 1000000
+
+DEFAULT_PREFIX = os.getenv('BOBA_BI_SHM_PREFIX', 'boba_pos')
+SHM_DIR = os.getenv('BOBA_BI_SHM_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+REFRESH_SECONDS = float(os.getenv('BOBA_BI_SHM_REFRESH_SECONDS', '1'))
+
+
+def to_epoch_us(timestamp: str, tz: ZoneInfo) -> int:
+    """ISO timestamp to POSIX microseconds; naive values are wall-clock time in tz"""
+    dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz)
+    delta = dt - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def from_epoch_us(ts_us: int, tz: ZoneInfo) -> str:
+    """POSIX microseconds back to a naive wall-clock ISO timestamp in tz"""
+    return (EPOCH + timedelta(microseconds=ts_us)).astimezone(tz).replace(tzinfo=None).isoformat()
+
+
+def _control_path(prefix: str, shm_dir: str) -> str:
+    return os.path.join(shm_dir, f"{prefix}.json")
+
+
+def _segment_path(prefix: str, shm_dir: str, generation: int) -> str:
+    return os.path.join(shm_dir, f"{prefix}_g{generation}.bin")
+
+
+def _read_control(prefix: str, shm_dir: str) -> Dict:
+    try:
+        with open(_control_path(prefix, shm_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# ============================================================================
+# PUBLISHER (loader process)
+# ============================================================================
+
+class SharedPosPublisher:
+    """Builds POS columns + hourly aggregates and publishes them as a new generation"""
+
+    def __init__(self, prefix: str = DEFAULT_PREFIX, shm_dir: str = SHM_DIR,
+                 tz: Optional[str] = None):
+        self.prefix = prefix
+        self.shm_dir = shm_dir
+        self.tz = ZoneInfo(tz or SHOP_TIMEZONE)
+
+    def publish(self, transactions: Iterable[Dict]) -> int:
+        """Publish transactions; returns the new generation number"""
+        columns = {name: array(code) for name, code in COLUMNS}
+        for tx in transactions:
+            columns['order_id'].append(int(tx['order_id']))
+            columns['ts_us'].append(to_epoch_us(tx['timestamp'], self.tz))
+            columns['items'].append(int(tx['items']))
+            columns['prep_time_minutes'].append(int(tx['prep_time_minutes']))
+        count = len(columns['order_id'])
+
+        # Hourly aggregates over absolute (UTC-aligned) hours
+        ts_us = columns['ts_us']
+        first_hour = min(ts_us) // US_PER_HOUR if count else 0
+        n_hours = (max(ts_us) // US_PER_HOUR - first_hour + 1) if count else 0
+        aggregates = {name: array('q', bytes(8 * n_hours)) for name in AGGREGATES}
+        for i in range(count):
+            bucket = ts_us[i] // US_PER_HOUR - first_hour
+            aggregates['hour_orders'][bucket] += 1
+            aggregates['hour_items'][bucket] += columns['items'][i]
+            aggregates['hour_prep_minutes'][bucket] += columns['prep_time_minutes'][i]
+
+        generation = _read_control(self.prefix, self.shm_dir).get('generation', 0) + 1
+        segment = _segment_path(self.prefix, self.shm_dir, generation)
+        tmp_path = segment + f".{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, generation, count, n_hours, first_hour))
+            for name, _ in COLUMNS:
+                columns[name].tofile(f)
+            for name in AGGREGATES:
+                aggregates[name].tofile(f)
+        # New inode: never truncate a file an older reader may still have mapped
+        os.replace(tmp_path, segment)
+
+        # Atomic switch: write a temp file, then rename over the control file
+        control = {'generation': generation, 'segment': segment, 'count': count, 'tz': str(self.tz)}
+        tmp_path = _control_path(self.prefix, self.shm_dir) + f".{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(control, f)
+        os.replace(tmp_path, _control_path(self.prefix, self.shm_dir))
+
+        _remove(_segment_path(self.prefix, self.shm_dir, generation - 2))
+        return generation
+
+    def unlink_all(self):
+        """Remove the control file and any segments still published"""
+        generation = _read_control(self.prefix, self.shm_dir).get('generation', 0)
+        for g in range(max(1, generation - 1), generation + 1):
+            _remove(_segment_path(self.prefix, self.shm_dir, g))
+        _remove(_control_path(self.prefix, self.shm_dir))
+
+
+# ============================================================================
+# READ-ONLY VIEW (server workers)
+# ============================================================================
+
+class _Generation:
+    """One read-only mapped segment; the mapping lives as long as any column view"""
+
+    def __init__(self, segment: str):
+        with open(segment, 'rb') as f:
+            buf = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        magic, self.generation, self.count, self.n_hours, self.first_hour = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Segment {segment} is not a Boba BI POS segment")
+
+        self.columns: Dict[str, memoryview] = {}
+        offset = HEADER.size
+        for name, code in COLUMNS:
+            self.columns[name] = buf[offset:offset + 8 * self.count].cast(code)
+            offset += 8 * self.count
+        for name in AGGREGATES:
+            self.columns[name] = buf[offset:offset + 8 * self.n_hours].cast('q')
+            offset += 8 * self.n_hours
+
+
+class SharedPosView:
+    """
+    List-like, read-only view of the latest published POS generation
+
+    Iterating yields transaction dicts for compatibility with code written
+    against plain lists; hot paths should use columns() and hourly() instead.
+    .version is the generation number, so versioned caches invalidate when
+    the loader publishes.
+    """
+
+    def __init__(self, prefix: str = DEFAULT_PREFIX, shm_dir: str = SHM_DIR,
+                 refresh_seconds: float = REFRESH_SECONDS):
+        self.prefix = prefix
+        self.shm_dir = shm_dir
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._current: Optional[_Generation] = None
+        self._checked = 0.0
+        self.tz = None
+        self.refresh(force=True)
+        if self._current is None:
+            raise RuntimeError(f"No POS data published under '{prefix}'; run: python shared_pos.py publish")
+
+    def refresh(self, force: bool = False):
+        """Attach to a newer generation if the loader has published one"""
+        now = time.monotonic()
+        if not force and now - self._checked < self.refresh_seconds:
+            return
+        self._checked = now
+
+        control = _read_control(self.prefix, self.shm_dir)
+        if not control or (self._current and control['generation'] == self._current.generation):
+            return
+        with self._lock:
+            if self._current and control['generation'] == self._current.generation:
+                return
+            try:
+                new = _Generation(control['segment'])
+            except OSError:
+                return  # Superseded while we looked; pick up the next generation later
+            # Readers still iterating the old generation keep its mapping alive
+            self.tz = ZoneInfo(control['tz'])
+            self._current = new
+
+    @property
+    def version(self) -> int:
+        self.refresh()
+        return self._current.generation
+
+    def columns(self) -> Dict[str, memoryview]:
+        """Read-only column views: order_id, ts_us, items, prep_time_minutes, hour_*"""
+        self.refresh()
+        return self._current.columns
+
+    def hourly(self):
+        """(first_hour, hour_orders, hour_items, hour_prep_minutes) over UTC-aligned epoch hours"""
+        self.refresh()
+        current = self._current
+        return (current.first_hour, current.columns['hour_orders'],
+                current.columns['hour_items'], current.columns['hour_prep_minutes'])
+
+    def __len__(self) -> int:
+        self.refresh()
+        return self._current.count
+
+    def __getitem__(self, index: int) -> Dict:
+        cols = self._current.columns
+        return {
+            'order_id': cols['order_id'][index],
+            'timestamp': from_epoch_us(cols['ts_us'][index], self.tz),
+            'items': cols['items'][index],
+            'prep_time_minutes': cols['prep_time_minutes'][index]
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        self.refresh()
+        current, tz = self._current, self.tz
+        cols = current.columns
+        order_id, ts_us, items, prep = cols['order_id'], cols['ts_us'], cols['items'], cols['prep_time_minutes']
+        for i in range(current.count):
+            yield {
+                'order_id': order_id[i],
+                'timestamp': from_epoch_us(ts_us[i], tz),
+                'items': items[i],
+                'prep_time_minutes': prep[i]
+            }
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish Boba BI POS data to shared memory")
+    parser.add_argument('command', choices=['publish', 'unlink'])
+    parser.add_argument('--weeks', type=int, default=100, help="Weeks of synthetic data to publish")
+    parser.add_argument('--prefix', default=DEFAULT_PREFIX)
+    args = parser.parse_args()
+
+    publisher = SharedPosPublisher(prefix=args.prefix)
+    if args.command == 'unlink':
+        publisher.unlink_all()
+        print(f"✅ Removed shared POS segments for '{args.prefix}'")
+        return
+
+    from boba_bi import generate_synthetic_pos_data
+    generation = publisher.publish(generate_synthetic_pos_data(weeks=args.weeks))
+    print(f"✅ Published generation {generation} to shared memory ('{args.prefix}')")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
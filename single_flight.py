@@ -0,0 +1,120 @@
+"""
+Single-Flight Request Coalescing for Boba BI
+Concurrent identical requests share one in-flight computation
+"""
+
+import re
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r'\s+', ' ', query).strip().lower().rstrip('?!. ')
+
+
+def schedule_request_key(query: str, dates: List[str], data_version: Hashable) -> Tuple:
+    """Coalescing key for a schedule request"""
+    return (normalize_query(query), dates[0], dates[-1], data_version)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Run at most one computation per key at a time
+
+    The first caller for a key executes the function; callers arriving while
+    it is in flight block and receive the same result (or exception), so the
+    result is shared and must not be mutated. The key is released as soon as
+    the computation finishes, so later requests start a fresh run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (result, shared) where shared is True if another caller computed it"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
+
+    def stats(self) -> Dict[str, int]:
+        """Computations started vs. requests served from an in-flight run"""
+        with self._lock:
+            return {'executions': self.executions, 'shared': self.shared, 'in_flight': len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines running on one event loop
+
+    The computation runs as its own task and every caller, the first one
+    included, awaits it through asyncio.shield(): a cancelled caller stops
+    waiting but the run carries on for the others. Like SingleFlight, all
+    callers receive the same result object, so treat it as read-only.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.executions = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared) where shared is True if another caller computed it"""
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.shared += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task), shared
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved when every caller was cancelled
+
+    def stats(self) -> Dict[str, int]:
+        """Computations started vs. requests served from an in-flight run"""
+        return {'executions': self.executions, 'shared': self.shared, 'in_flight': len(self._calls)}
@@ -3,21 +3,73 @@ Supabase Configuration and Data Access Layer for Boba BI
 Handles all database operations with Supabase
 """
 
+from __future__ import annotations
+
 import os
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
-from supabase import create_client, Client
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+from time_buckets import SHIFT_HOURS, get_zone, weekday_hour_counts, shift_traffic_summary
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# supabase and python-dotenv are imported on first use, so importing this
+# module (and boba_bi_supabase) stays cheap and has no side effects
+_environment_loaded = False
+
+# Run once in the Supabase SQL editor. Assignments carry their date and hours
+# so per-employee hours are one indexed, database-side aggregate instead of
+# pulling schedule_details and splitting name strings. Rows saved before the
+# migration are backfilled from their schedules.
+SCHEDULE_HISTORY_SQL = """
+ALTER TABLE schedule_assignments
+    ADD COLUMN IF NOT EXISTS schedule_date DATE,
+    ADD COLUMN IF NOT EXISTS hours INTEGER;
+
+UPDATE schedule_assignments a
+SET schedule_date = s.schedule_date,
+    hours = 8  -- both FIXED_SHIFTS are 8 hours; new rows store their own
+FROM schedules s
+WHERE a.schedule_id = s.id AND a.schedule_date IS NULL;
+
+CREATE INDEX IF NOT EXISTS schedule_assignments_employee_date
+    ON schedule_assignments (employee_id, schedule_date);
+CREATE INDEX IF NOT EXISTS schedule_assignments_date
+    ON schedule_assignments (schedule_date);
+CREATE INDEX IF NOT EXISTS schedules_date_shift
+    ON schedules (schedule_date, shift);
+
+-- Hours per employee per calendar week (Monday start) for a date range
+CREATE OR REPLACE FUNCTION employee_week_hours(start_date DATE, end_date DATE)
+RETURNS TABLE (employee_id INTEGER, name TEXT, week_start DATE, hours BIGINT, shifts BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT a.employee_id, e.name, date_trunc('week', a.schedule_date)::date,
+           SUM(a.hours), COUNT(*)
+    FROM schedule_assignments a
+    JOIN employees e USING (employee_id)
+    WHERE a.schedule_date BETWEEN start_date AND end_date
+    GROUP BY 1, 2, 3
+$$;
+"""
 
 # ============================================================================
 # SUPABASE CLIENT INITIALIZATION
 # ============================================================================
 
+def load_environment():
+    """Load .env into the environment (once; later calls are no-ops)"""
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _environment_loaded = True
+
+
 def get_supabase_client() -> Client:
     """Initialize and return Supabase client"""
+    from supabase import create_client
+
+    load_environment()
     url = os.getenv('SUPABASE_URL')
     key = os.getenv('SUPABASE_KEY')
     
@@ -159,21 +211,26 @@ def save_schedule(supabase: Client, schedule_data: List[Dict]) -> bool:
             response = supabase.table('schedules').insert(schedule_record).execute()
             schedule_id = response.data[0]['id']
             
-            # Insert employee assignments
+            # Insert employee assignments (dated, with hours, for the hour aggregates)
             if shift.get('employees'):
-                # Get employee IDs from names
-                employee_names = shift['employees']
-                employees = supabase.table('employees')\
-                    .select('employee_id, name')\
-                    .in_('name', employee_names)\
-                    .execute()
+                employee_ids = shift.get('employee_ids')
+                if not employee_ids:
+                    # Older schedules only carry names
+                    employees = supabase.table('employees')\
+                        .select('employee_id, name')\
+                        .in_('name', shift['employees'])\
+                        .execute()
+                    employee_ids = [emp['employee_id'] for emp in employees.data]
                 
+                start, end = SHIFT_HOURS[shift['shift']]
                 assignments = [
                     {
                         'schedule_id': schedule_id,
-                        'employee_id': emp['employee_id']
+                        'employee_id': employee_id,
+                        'schedule_date': shift['date'],
+                        'hours': end - start
                     }
-                    for emp in employees.data
+                    for employee_id in employee_ids
                 ]
                 
                 if assignments:
@@ -189,9 +246,16 @@ def save_schedule(supabase: Client, schedule_data: List[Dict]) -> bool:
 def get_schedule(
     supabase: Client,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    limit: Optional[int] = None,
+    after: Optional[Tuple[str, str]] = None
 ) -> List[Dict]:
-    """Fetch schedule with employee assignments"""
+    """
+    Fetch schedule with employee assignments
+    
+    Pages by keyset: pass limit, then after=(schedule_date, shift) of the
+    last row received to continue from there.
+    """
     try:
         query = supabase.table('schedule_details').select('*')
         
@@ -199,8 +263,14 @@ def get_schedule(
             query = query.gte('schedule_date', start_date)
         if end_date:
             query = query.lte('schedule_date', end_date)
+        if after:
+            date, shift = after
+            query = query.or_(f'schedule_date.gt.{date},and(schedule_date.eq.{date},shift.gt.{shift})')
         
-        response = query.order('schedule_date').order('shift').execute()
+        query = query.order('schedule_date').order('shift')
+        if limit:
+            query = query.limit(limit)
+        response = query.execute()
         return response.data
     except Exception as e:
         print(f"Error fetching schedule: {e}")
@@ -224,9 +294,10 @@ def clear_schedules(supabase: Client) -> bool:
 
 def get_traffic_analysis(
     supabase: Client,
-    days_back: int = 28
+    days_back: int = 28,
+    tz: Optional[str] = None
 ) -> Dict[str, Dict[str, float]]:
-    """Analyze traffic patterns from Supabase data"""
+    """Analyze traffic patterns from Supabase data, bucketed by the store's local time"""
     from datetime import timezone
     
     # Make cutoff_date timezone-aware (UTC)
@@ -239,65 +310,39 @@ def get_traffic_analysis(
             limit=50000
         )
         
-        # Group by day and shift
-        from collections import defaultdict
-        traffic = defaultdict(lambda: {'morning': [], 'evening': []})
-        
-        for tx in transactions:
-            # Handle both string and datetime objects
-            if isinstance(tx['timestamp'], str):
-                tx_time = datetime.fromisoformat(tx['timestamp'].replace('Z', '+00:00'))
-            else:
-                tx_time = tx['timestamp']
-            
-            # Convert to timezone-aware if needed
-            if tx_time.tzinfo is None:
-                tx_time = tx_time.replace(tzinfo=timezone.utc)
-            
-            day_name = tx_time.strftime('%A')
-            hour = tx_time.hour
-            
-            if 8 <= hour < 16:
-                traffic[day_name]['morning'].append(tx)
-            elif 16 <= hour < 24:
-                traffic[day_name]['evening'].append(tx)
-        
-        # Calculate averages
-        summary = {}
-        for day, shifts in traffic.items():
-            summary[day] = {
-                'morning': len(shifts['morning']) / 8 if shifts['morning'] else 0,
-                'evening': len(shifts['evening']) / 8 if shifts['evening'] else 0
-            }
-        
-        return summary
+        # UTC timestamps are converted to the store's local weekday/hour before bucketing
+        since = cutoff_date.astimezone(get_zone(tz)).replace(tzinfo=None)
+        counts = weekday_hour_counts((tx['timestamp'] for tx in transactions), tz, since=since)
+        return shift_traffic_summary(counts)
     except Exception as e:
         print(f"Error analyzing traffic: {e}")
         return {}
 
 
+def get_employee_week_hours(
+    supabase: Client,
+    start_date: str,
+    end_date: str
+) -> List[Dict]:
+    """Hours per employee per calendar week in a date range, aggregated in the database (one round trip)"""
+    try:
+        response = supabase.rpc('employee_week_hours', {'start_date': start_date, 'end_date': end_date}).execute()
+        return response.data
+    except Exception as e:
+        print(f"Error fetching weekly hours: {e}")
+        return []
+
+
 def get_employee_hours(
     supabase: Client,
     start_date: str,
     end_date: str
 ) -> Dict[str, int]:
     """Calculate total hours worked by each employee in date range"""
-    try:
-        schedules = get_schedule(supabase, start_date, end_date)
-        
-        hours = {}
-        for shift in schedules:
-            if shift.get('employees'):
-                employee_names = shift['employees'].split(', ')
-                shift_hours = 8  # Each shift is 8 hours
-                
-                for name in employee_names:
-                    hours[name] = hours.get(name, 0) + shift_hours
-        
-        return hours
-    except Exception as e:
-        print(f"Error calculating hours: {e}")
-        return {}
+    hours = {}
+    for row in get_employee_week_hours(supabase, start_date, end_date):
+        hours[row['name']] = hours.get(row['name'], 0) + row['hours']
+    return hours
 
 
 # ============================================================================
@@ -0,0 +1,204 @@
+"""
+Incremental Supabase Sync for Boba BI
+Keeps a local SQLite copy of pos_transactions, employees and schedules
+
+Usage:
+    sync = SupabaseSync(get_supabase_client())
+    sync.sync()                       # Cold start: full load; afterwards: delta only
+    pos_data = sync.rows('pos_transactions')
+
+Append-style tables are fetched with keyset pagination ordered by
+(timestamp, id), starting from the stored high-watermark minus an overlap
+window (SUPABASE_SYNC_OVERLAP_MINUTES) so rows committed late with an
+earlier timestamp are still picked up. Re-fetched rows are upserted by
+primary key, so the overlap never duplicates data. Small mutable tables
+(employees) are reloaded in full on every sync. Upstream deletes are not
+tracked; sync(full=True) rebuilds a table from scratch.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SYNC_CACHE_PATH = os.getenv('SUPABASE_SYNC_CACHE', 'boba_bi_cache.sqlite3')
+SYNC_OVERLAP_MINUTES = int(os.getenv('SUPABASE_SYNC_OVERLAP_MINUTES', '15'))
+SYNC_PAGE_SIZE = 1000  # PostgREST's default max-rows per request
+SYNC_HISTORY_WEEKS = 100
+
+# time_column=None means the table is small and mutable: reload it in full
+SYNC_TABLES = {
+    'pos_transactions': {'time_column': 'timestamp', 'id_column': 'order_id'},
+    'schedules': {'time_column': 'created_at', 'id_column': 'id'},
+    'employees': {'time_column': None, 'id_column': 'employee_id'}
+}
+
+
+def _parse(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _sort_key(value: Optional[str]) -> str:
+    """Sortable text for a timestamp column (offset-aware values normalized to UTC)"""
+    if not value:
+        return ''
+    dt = _parse(value)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat(timespec='microseconds')
+
+
+def _shift(value: str, delta: timedelta) -> str:
+    """Move a timestamp string back in time, keeping its naive/aware form"""
+    return (_parse(value) - delta).isoformat()
+
+
+# ============================================================================
+# LOCAL CACHE (SQLite)
+# ============================================================================
+
+class LocalCache:
+    """SQLite store of synced rows (JSON per row) plus per-table watermarks"""
+
+    def __init__(self, path: str = SYNC_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS _sync_state ("
+            "table_name TEXT PRIMARY KEY, watermark_ts TEXT, watermark_id, synced_at TEXT)"
+        )
+        self._db.commit()
+
+    def _ensure(self, table: str):
+        self._db.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (id PRIMARY KEY, sort_ts TEXT, data TEXT)')
+        self._db.execute(f'CREATE INDEX IF NOT EXISTS "{table}_sort" ON "{table}" (sort_ts, id)')
+
+    def watermark(self, table: str) -> Optional[Tuple[str, Any]]:
+        """(timestamp, id) of the newest synced row, or None before the first sync"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT watermark_ts, watermark_id FROM _sync_state WHERE table_name = ?", (table,)
+            ).fetchone()
+        return (row[0], row[1]) if row and row[0] is not None else None
+
+    def upsert(self, table: str, rows: List[Dict], id_column: str, time_column: Optional[str],
+               watermark: Optional[Tuple[str, Any]] = None, replace: bool = False):
+        """Insert or replace rows by id and record the new watermark in one transaction"""
+        records = [(row[id_column], _sort_key(row.get(time_column)) if time_column else '',
+                    json.dumps(row, default=str)) for row in rows]
+        with self._lock, self._db:
+            self._ensure(table)
+            if replace:
+                self._db.execute(f'DELETE FROM "{table}"')
+            self._db.executemany(f'INSERT OR REPLACE INTO "{table}" (id, sort_ts, data) VALUES (?, ?, ?)', records)
+            self._db.execute(
+                "INSERT OR REPLACE INTO _sync_state (table_name, watermark_ts, watermark_id, synced_at) "
+                "VALUES (?, ?, ?, ?)",
+                (table, watermark[0] if watermark else None, watermark[1] if watermark else None,
+                 datetime.now(timezone.utc).isoformat())
+            )
+
+    def rows(self, table: str, since: Optional[datetime] = None) -> List[Dict]:
+        """Cached rows ordered by (timestamp, id); since (aware or naive UTC) filters by timestamp"""
+        floor = ''
+        if since is not None:
+            floor = (since.astimezone(timezone.utc).replace(tzinfo=None) if since.tzinfo else since).isoformat()
+        with self._lock:
+            self._ensure(table)
+            cursor = self._db.execute(
+                f'SELECT data FROM "{table}" WHERE sort_ts >= ? ORDER BY sort_ts, id', (floor,)
+            )
+            return [json.loads(data) for (data,) in cursor]
+
+    def count(self, table: str) -> int:
+        with self._lock:
+            self._ensure(table)
+            return self._db.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+# ============================================================================
+# SYNC
+# ============================================================================
+
+class SupabaseSync:
+    """High-watermark delta sync from Supabase tables into a LocalCache"""
+
+    def __init__(self, supabase: Any, cache: Optional[LocalCache] = None,
+                 overlap: timedelta = timedelta(minutes=SYNC_OVERLAP_MINUTES),
+                 page_size: int = SYNC_PAGE_SIZE,
+                 history: timedelta = timedelta(weeks=SYNC_HISTORY_WEEKS),
+                 tables: Optional[Dict[str, Dict]] = None):
+        self.supabase = supabase
+        self.cache = cache or LocalCache()
+        self.overlap = overlap
+        self.page_size = page_size
+        self.history = history
+        self.tables = tables or SYNC_TABLES
+
+    def sync(self, tables: Optional[Iterable[str]] = None, full: bool = False) -> Dict[str, Dict]:
+        """Sync tables (default all); returns {table: {'mode', 'fetched', 'rows', 'watermark'}}"""
+        results = {}
+        for table in tables or self.tables:
+            config = self.tables[table]
+            if config['time_column'] is None:
+                results[table] = self._sync_snapshot(table, config)
+            else:
+                results[table] = self._sync_incremental(table, config, full)
+        return results
+
+    def rows(self, table: str, since: Optional[datetime] = None) -> List[Dict]:
+        return self.cache.rows(table, since)
+
+    def _sync_snapshot(self, table: str, config: Dict) -> Dict:
+        rows = self.supabase.table(table).select('*').execute().data
+        self.cache.upsert(table, rows, config['id_column'], None, replace=True)
+        return {'mode': 'full', 'fetched': len(rows), 'rows': len(rows), 'watermark': None}
+
+    def _sync_incremental(self, table: str, config: Dict, full: bool) -> Dict:
+        time_column, id_column = config['time_column'], config['id_column']
+        watermark = None if full else self.cache.watermark(table)
+        if watermark is None:
+            mode = 'full'
+            since = (datetime.now(timezone.utc) - self.history).isoformat()
+        else:
+            mode = 'delta'
+            since = _shift(watermark[0], self.overlap)
+
+        fetched, replace, newest = 0, mode == 'full', watermark
+        for page in self._pages(table, time_column, id_column, since):
+            fetched += len(page)
+            last = page[-1]
+            if newest is None or _sort_key(last[time_column]) >= _sort_key(newest[0]):
+                newest = (last[time_column], last[id_column])
+            # Each page commits with its watermark, so an interrupted sync resumes from there
+            self.cache.upsert(table, page, id_column, time_column, newest, replace=replace)
+            replace = False
+        if replace:  # Full load of an empty table
+            self.cache.upsert(table, [], id_column, time_column, None, replace=True)
+
+        return {'mode': mode, 'fetched': fetched, 'rows': self.cache.count(table),
+                'watermark': newest[0] if newest else None}
+
+    def _pages(self, table: str, time_column: str, id_column: str, since: str):
+        """Keyset pagination over rows with time_column >= since, ordered by (time, id)"""
+        cursor = None
+        while True:
+            query = self.supabase.table(table).select('*')
+            if cursor is None:
+                query = query.gte(time_column, since)
+            else:
+                ts, last_id = cursor
+                query = query.or_(f'{time_column}.gt."{ts}",and({time_column}.eq."{ts}",{id_column}.gt.{last_id})')
+            page = query.order(time_column).order(id_column).limit(self.page_size).execute().data
+            if not page:
+                return
+            yield page
+            if len(page) < self.page_size:
+                return
+            cursor = (page[-1][time_column], page[-1][id_column])
@@ -154,6 +154,1806 @@ def test_tool_functions():
         print_status("Tool Functions", False, str(e))
         return False
 
+def test_weather_provider():
+    """Test local weather provider and traffic multipliers"""
+    print_header("Testing Weather Provider")
+    
+    try:
+        from weather_provider import FixtureWeatherProvider, compute_weather_multipliers
+        
+        dates = ["2025-07-01", "2025-07-02", "2025-07-03"]
+        provider = FixtureWeatherProvider()
+        forecasts = provider.get_forecasts("San Diego, CA", dates)
+        
+        # Same location and date must always give the same forecast
+        again = FixtureWeatherProvider().get_forecasts("San Diego, CA", dates)
+        if forecasts == again:
+            print_status("Deterministic Forecasts", True, f"{len(forecasts)} days")
+        else:
+            print_status("Deterministic Forecasts", False)
+            return False
+        
+        # Repeated lookups are served from the per-location, per-day cache
+        if provider.get_forecasts("San Diego, CA", dates)[0] is forecasts[0]:
+            print_status("Forecast Cache", True)
+        else:
+            print_status("Forecast Cache", False)
+            return False
+        
+        # Fixture entries override climate normals
+        provider.fixture = {"San Diego, CA": {
+            "2025-01-05": {"high_f": 80, "precip_probability": 0.0},
+            "2025-01-06": {"high_f": 60, "precip_probability": 0.9},
+            "2025-01-07": {"high_f": 70, "precip_probability": 0.1}
+        }}
+        multipliers = compute_weather_multipliers(
+            provider.get_forecasts("San Diego, CA", ["2025-01-05", "2025-01-06", "2025-01-07"])
+        )
+        if multipliers == {"2025-01-05": 1.2, "2025-01-06": 0.7, "2025-01-07": 1.0}:
+            print_status("Weather Multipliers", True, str(multipliers))
+        else:
+            print_status("Weather Multipliers", False, str(multipliers))
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("Weather Provider", False, str(e))
+        return False
+
+def test_prompt_compaction():
+    """Test compact prompts and the shape of their stable system prefixes"""
+    print_header("Testing Prompt Compaction")
+    
+    try:
+        import json
+        from prompt_builder import (build_data_analyst_request, build_weather_narrative_request, cached_system,
+                                    estimate_request_tokens, estimate_tokens)
+        
+        traffic = {day: {'morning': 61.25, 'evening': 112.625} for day in
+                   ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']}
+        query = "How should I schedule my employees for next week?"
+        legacy_prompt = f"""You are a Data Analyst Agent for Boba BI. Analyze the following traffic data and provide insights.
+
+Historical Traffic Data (Average Orders per Hour, Last 4 Weeks):
+{json.dumps(traffic, indent=2)}
+
+Business Owner Query: {query}
+
+Provide a concise analysis of:
+1. Peak hours by day
+2. Recommended staffing levels (orders per hour / 15 = staff needed)
+3. Key patterns and trends
+
+Keep response under 200 words."""
+        
+        model = 'claude-3-5-haiku-20241022'
+        compact = build_data_analyst_request(model, traffic, query)
+        legacy_tokens, compact_tokens = estimate_tokens(legacy_prompt), estimate_request_tokens(compact)
+        if compact_tokens < legacy_tokens:
+            print_status("Input Tokens", True, f"{legacy_tokens} -> {compact_tokens} estimated")
+        else:
+            print_status("Input Tokens", False, f"{legacy_tokens} -> {compact_tokens}")
+            return False
+        
+        # Per-call data stays out of the system prefix: the same bytes go out on every call
+        quiet = {'Monday': {'morning': 5.0, 'evening': 9.0}}
+        prefix = lambda request: json.dumps(request['system'], sort_keys=True).encode()
+        analyst = [build_data_analyst_request(model, t, q) for t, q in [(traffic, query), (quiet, "Why so slow?")]]
+        weather = [build_weather_narrative_request(model, place, text)
+                   for place, text in [('San Diego, CA', 'Hot'), ('Portland, OR', 'Rain')]]
+        stable = all(prefix(pair[0]) == prefix(pair[1]) and pair[0]['messages'] != pair[1]['messages']
+                     for pair in (analyst, weather))
+        if stable and prefix(analyst[0]) != prefix(weather[0]):
+            print_status("Stable Prefixes", True, "each agent sends identical system bytes, data only in messages")
+        else:
+            print_status("Stable Prefixes", False)
+            return False
+        
+        # cache_control only where the provider would cache (2048+ tokens on Haiku, 1024+ otherwise)
+        blocks = analyst[0]['system'] + weather[0]['system']
+        long_text = "Shop handbook. " * 600
+        if (not any('cache_control' in block for block in blocks)
+                and 'cache_control' in cached_system(long_text, model)[0]
+                and 'cache_control' not in cached_system(long_text[:6000], model)[0]
+                and 'cache_control' in cached_system(long_text[:6000], 'claude-sonnet-4')[0]):
+            print_status("Cache Markers", True, "short instruction prefixes are not marked for caching")
+        else:
+            print_status("Cache Markers", False)
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("Prompt Compaction", False, str(e))
+        return False
+
+def test_offline_llm_client():
+    """Test the offline LLM stand-in end to end"""
+    print_header("Testing Offline LLM Client")
+    
+    try:
+        import time
+        import asyncio
+        from boba_bi import BobaBI, generate_synthetic_pos_data, generate_employee_data
+        from llm_client import AsyncOfflineLLMClient, OfflineLLMClient
+        
+        client = OfflineLLMClient(latency_ms=5, jitter_ms=2, seed=42)
+        
+        # Tool-enabled requests get a tool_use turn first, then a final answer
+        tools = [{"name": "web_search", "description": "Search", "input_schema": {"type": "object"}}]
+        messages = [{"role": "user", "content": "Weather for San Diego?"}]
+        first = client.messages.create(model="offline", max_tokens=100, tools=tools, messages=messages)
+        tool_block = first.content[0]
+        messages += [
+            {"role": "assistant", "content": first.content},
+            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": tool_block.id, "content": "Sunny"}]}
+        ]
+        second = client.messages.create(model="offline", max_tokens=100, tools=tools, messages=messages)
+        if first.stop_reason == "tool_use" and tool_block.name == "web_search" and second.stop_reason == "end_turn":
+            print_status("Tool Use Turns", True)
+        else:
+            print_status("Tool Use Turns", False)
+            return False
+        
+        # Full orchestration without network access
+        boba_bi = BobaBI(api_key=None, pos_data=generate_synthetic_pos_data(weeks=5),
+                         employees=generate_employee_data(num_employees=10),
+                         narrate_weather=True, client=client)
+        start = time.perf_counter()
+        result = boba_bi.orchestrator("Schedule next week")
+        elapsed = time.perf_counter() - start
+        stats = client.stats()
+        if len(result['schedule']) == 14 and result['traffic_analysis'].startswith("[offline analysis"):
+            overhead_ms = (elapsed - stats['simulated_seconds']) * 1000
+            print_status("Offline Orchestration", True, f"{stats['calls']} LLM calls, ~{overhead_ms:.0f}ms system overhead")
+        else:
+            print_status("Offline Orchestration", False)
+            return False
+        
+        # Without an API key the async path follows the injected client
+        class CountingClient(OfflineLLMClient):
+            pass
+        counting = CountingClient()
+        async_boba_bi = BobaBI(api_key=None, pos_data=boba_bi.pos_data, employees=boba_bi.employees,
+                               client=counting)
+        result = asyncio.run(async_boba_bi.orchestrator_async("Schedule next week"))
+        twin = boba_bi.get_async_client().client
+        if (len(result['schedule']) == 14 and counting.calls > 0
+                and isinstance(twin, AsyncOfflineLLMClient) and twin.latency_ms == client.latency_ms):
+            print_status("Injected Async Client", True, f"{counting.calls} calls on the injected client")
+        else:
+            print_status("Injected Async Client", False)
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("Offline LLM Client", False, str(e))
+        return False
+
+def test_request_coalescing():
+    """Test single-flight coalescing of identical schedule requests"""
+    print_header("Testing Request Coalescing")
+    
+    try:
+        import threading
+        from boba_bi import BobaBI, generate_synthetic_pos_data, generate_employee_data, next_week_dates
+        from llm_client import OfflineLLMClient
+        from single_flight import SingleFlight, schedule_request_key
+        
+        client = OfflineLLMClient(latency_ms=200)
+        boba_bi = BobaBI(api_key=None, pos_data=generate_synthetic_pos_data(weeks=5),
+                         employees=generate_employee_data(num_employees=10), client=client)
+        flight = SingleFlight()
+        dates = next_week_dates()
+        queries = ["Schedule next week?", "schedule  NEXT week", " Schedule next week. "] * 3
+        
+        if len({schedule_request_key(q, dates, boba_bi.data_version) for q in queries}) == 1:
+            print_status("Query Normalization", True)
+        else:
+            print_status("Query Normalization", False)
+            return False
+        
+        results = []
+        def request(query):
+            key = schedule_request_key(query, dates, boba_bi.data_version)
+            results.append(flight.do(key, lambda: boba_bi.orchestrator(query, dates=dates))[0])
+        
+        threads = [threading.Thread(target=request, args=(q,)) for q in queries]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        if client.stats()['calls'] == 1 and len(results) == len(queries) and all(r is results[0] for r in results):
+            print_status("Shared Computation", True, f"{len(queries)} requests, {flight.stats()['executions']} run")
+        else:
+            print_status("Shared Computation", False, str(flight.stats()))
+            return False
+        
+        # A cancelled first caller leaves the shared async run to the others
+        import asyncio
+        from single_flight import AsyncSingleFlight
+        async def cancelled_leader():
+            async_flight, runs = AsyncSingleFlight(), []
+            async def work():
+                await asyncio.sleep(0.05)
+                runs.append(1)
+                return {'schedule': []}
+            leader = asyncio.ensure_future(async_flight.do('key', work))
+            await asyncio.sleep(0)
+            followers = [asyncio.ensure_future(async_flight.do('key', work)) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            shared = await asyncio.gather(*followers)
+            return leader.cancelled(), shared, runs, async_flight.stats()
+        cancelled, shared, runs, stats = asyncio.run(cancelled_leader())
+        if cancelled and runs == [1] and all(r == ({'schedule': []}, True) for r in shared) and not stats['in_flight']:
+            print_status("Cancelled Leader", True, "followers got the shared result")
+        else:
+            print_status("Cancelled Leader", False, f"{shared} {stats}")
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("Request Coalescing", False, str(e))
+        return False
+
+def test_llm_limiter():
+    """Test LLM rate limiting, priorities and load shedding"""
+    print_header("Testing LLM Limiter")
+    
+    try:
+        import threading
+        import time
+        from llm_limiter import LLMLimiter, LLMOverloadedError, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+        
+        # 600 requests/minute = one request every 100ms once the burst is spent
+        limiter = LLMLimiter(requests_per_minute=600, tokens_per_minute=1000000, max_queue_seconds=5)
+        limiter.requests.tokens = 0
+        
+        order = []
+        def call(name, priority):
+            limiter.acquire(100, priority=priority)
+            order.append(name)
+        
+        threads = [threading.Thread(target=call, args=(f"batch{i}", PRIORITY_BATCH)) for i in range(3)]
+        threads.append(threading.Thread(target=call, args=("interactive", PRIORITY_INTERACTIVE)))
+        threads[0].start()
+        time.sleep(0.02)
+        for t in threads[1:]:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        # The first batch call was already queued; the interactive one jumps the rest
+        if order.index("interactive") <= 1:
+            print_status("Priority Ordering", True, " -> ".join(order))
+        else:
+            print_status("Priority Ordering", False, " -> ".join(order))
+            return False
+        
+        # A call that cannot be served within the queue budget is shed immediately
+        tight = LLMLimiter(requests_per_minute=60, tokens_per_minute=1000000, max_queue_seconds=0.5)
+        tight.requests.tokens = 0
+        try:
+            tight.acquire(100)
+            print_status("Load Shedding", False, "call was admitted")
+            return False
+        except LLMOverloadedError:
+            print_status("Load Shedding", True)
+        
+        metrics = limiter.metrics()
+        if metrics['granted'] == 4 and PRIORITY_BATCH in metrics['wait_ms'] and tight.metrics()['shed'] == 1:
+            print_status("Queue Metrics", True, str(metrics['wait_ms']))
+        else:
+            print_status("Queue Metrics", False, str(metrics))
+            return False
+        
+        # A waiter cancelled by asyncio.wait_for() leaves the queue instead of taking the next slot
+        import asyncio
+        limiter = LLMLimiter(requests_per_minute=600, tokens_per_minute=1000000, max_queue_seconds=5)
+        limiter.requests.tokens = 0
+        async def abandon():
+            try:
+                await asyncio.wait_for(limiter.acquire_async(100), 0.02)
+            except asyncio.TimeoutError:
+                pass
+        asyncio.run(abandon())
+        queued = limiter.metrics()['queued']
+        time.sleep(0.12)
+        waited = limiter.acquire(100, timeout=0.05)
+        if queued == 0 and waited < 0.01 and limiter.metrics()['granted'] == 1:
+            print_status("Cancelled Waiters", True, "cancelled async waiter dropped, its slot went to the next call")
+        else:
+            print_status("Cancelled Waiters", False, f"{queued} queued, next call waited {waited * 1000:.0f}ms")
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("LLM Limiter", False, str(e))
+        return False
+
+def test_llm_resilience():
+    """Test LLM deadlines, retries, the circuit breaker and local fallbacks"""
+    print_header("Testing LLM Resilience")
+
+    try:
+        import asyncio
+        import time
+        from boba_bi import BobaBI, generate_synthetic_pos_data, generate_employee_data
+        from llm_client import OfflineLLMClient, AsyncOfflineLLMClient
+        from llm_limiter import LLMLimiter
+        from llm_resilience import LLMGuard, CircuitBreaker
+
+        class UpstreamError(Exception):
+            status_code = 503
+
+        class ScriptedClient(OfflineLLMClient):
+            """Fails the first `failures` calls, then answers like the offline client"""
+            def __init__(self, failures=0, latency_ms=0.0):
+                super().__init__(latency_ms=latency_ms)
+                self.failures = failures
+            def create(self, **request):
+                self.calls += 1
+                if self.calls <= self.failures:
+                    raise UpstreamError("service unavailable")
+                if self.latency_ms:
+                    time.sleep(self.latency_ms / 1000)
+                return self._respond(self.calls, request['model'], request['max_tokens'], request['messages'],
+                                     request.get('system'), None)
+
+        def system(client, guard):
+            limiter = LLMLimiter(requests_per_minute=1000000, tokens_per_minute=1e9)
+            return BobaBI(None, [], [], client=client, limiter=limiter, guard=guard)
+
+        traffic = {'Monday': {'morning': 30.0, 'evening': 60.0}, 'Saturday': {'morning': 90.0, 'evening': 120.0}}
+
+        # Transient errors are retried within the deadline
+        flaky = ScriptedClient(failures=2)
+        guard = LLMGuard(CircuitBreaker(failure_threshold=3), deadline_seconds=2, max_retries=2,
+                         retry_base_seconds=0.01, seed=1)
+        text = system(flaky, guard).data_analyst_agent("Next week", traffic)
+        if text.startswith('[offline analysis') and guard.stats()['retries'] == 2:
+            print_status("Jittered Retries", True, "two 503s retried, third attempt answered")
+        else:
+            print_status("Jittered Retries", False, f"{text[:40]} {guard.stats()}")
+            return False
+
+        # Local bugs (no HTTP status) surface unchanged: no retry, no fallback, no circuit failure
+        class BuggyClient(OfflineLLMClient):
+            def create(self, **request):
+                self.calls += 1
+                raise KeyError('messages')
+        buggy = BuggyClient()
+        guard = LLMGuard(CircuitBreaker(failure_threshold=2), deadline_seconds=2, retry_base_seconds=0.01)
+        raised = 0
+        for _ in range(3):
+            try:
+                system(buggy, guard).data_analyst_agent("Next week", traffic)
+            except KeyError:
+                raised += 1
+        stats = guard.stats()
+        if (raised == 3 and buggy.calls == 3 and stats['retries'] == 0 and stats['fallbacks'] == 0
+                and stats['circuit']['state'] == 'closed' and stats['circuit']['consecutive_failures'] == 0):
+            print_status("Non-Retryable Errors", True, "KeyError raised as is, circuit stays closed")
+        else:
+            print_status("Non-Retryable Errors", False, f"{raised} raised, {buggy.calls} calls, {stats}")
+            return False
+
+        # A hung call is abandoned at the deadline and the local analysis is returned
+        hung = ScriptedClient(latency_ms=1000)
+        guard = LLMGuard(CircuitBreaker(failure_threshold=2, reset_seconds=0.3), deadline_seconds=0.2)
+        boba_bi = system(hung, guard)
+        started = time.perf_counter()
+        text = boba_bi.data_analyst_agent("Next week", traffic)
+        elapsed = time.perf_counter() - started
+        if text.startswith('Local traffic analysis') and 'Saturday evening (120/hr)' in text and elapsed < 0.5:
+            print_status("Deadline Fallback", True, f"local analysis after {elapsed * 1000:.0f}ms")
+        else:
+            print_status("Deadline Fallback", False, f"{elapsed:.2f}s: {text[:60]}")
+            return False
+
+        # A second timeout opens the circuit; further calls fail fast without reaching the client
+        boba_bi.data_analyst_agent("Next week", traffic)
+        calls = hung.calls
+        started = time.perf_counter()
+        text = boba_bi.data_analyst_agent("Next week", traffic)
+        fast = time.perf_counter() - started
+        if guard.breaker.state == 'open' and hung.calls == calls and fast < 0.05 and text.startswith('Local'):
+            print_status("Circuit Breaker", True, f"open after 2 timeouts, fallback in {fast * 1000:.1f}ms")
+        else:
+            print_status("Circuit Breaker", False, str(guard.stats()))
+            return False
+
+        # After the reset period one trial call closes it again
+        hung.latency_ms = 0
+        time.sleep(0.35)
+        text = boba_bi.data_analyst_agent("Next week", traffic)
+        if guard.breaker.state == 'closed' and text.startswith('[offline analysis') and guard.stats()['fallbacks'] == 3:
+            print_status("Half-Open Recovery", True, "trial call succeeded, circuit closed")
+        else:
+            print_status("Half-Open Recovery", False, str(guard.stats()))
+            return False
+
+        # A half-open trial that is cancelled or interrupted does not hold the circuit shut
+        def half_open_guard():
+            breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+            breaker.record_failure()
+            time.sleep(0.06)
+            return LLMGuard(breaker, deadline_seconds=2)
+        async def cancel_trial(guard):
+            task = asyncio.ensure_future(guard.call_async(lambda: asyncio.sleep(10)))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        async_guard, sync_guard = half_open_guard(), half_open_guard()
+        asyncio.run(cancel_trial(async_guard))
+        def interrupt(timeout):
+            raise KeyboardInterrupt()
+        try:
+            sync_guard.call(lambda: None, interrupt)
+        except KeyboardInterrupt:
+            pass
+        if async_guard.breaker.allow() and sync_guard.breaker.allow():
+            print_status("Cancelled Trial", True, "the next caller gets the half-open trial")
+        else:
+            print_status("Cancelled Trial", False)
+            return False
+
+        # Rate-limit queueing counts against the deadline: no waiter or call outlives the caller
+        slow = ScriptedClient()
+        limiter = LLMLimiter(requests_per_minute=60, tokens_per_minute=1e9)
+        limiter.requests.tokens = 0
+        boba_bi = BobaBI(None, [], [], client=slow, limiter=limiter, guard=LLMGuard(deadline_seconds=0.2))
+        started = time.perf_counter()
+        text = boba_bi.data_analyst_agent("Next week", traffic)
+        elapsed = time.perf_counter() - started
+        time.sleep(1.1)
+        if text.startswith('Local') and elapsed < 0.5 and limiter.metrics()['queued'] == 0 and slow.calls == 0:
+            print_status("Bounded Queueing", True, f"fallback after {elapsed * 1000:.0f}ms, no call sent later")
+        else:
+            print_status("Bounded Queueing", False, f"{elapsed:.2f}s, {slow.calls} calls, {limiter.metrics()}")
+            return False
+
+        # Async orchestration still returns a schedule within the deadline
+        boba_bi = BobaBI(None, generate_synthetic_pos_data(weeks=1), generate_employee_data(num_employees=10),
+                         client=ScriptedClient(), limiter=LLMLimiter(requests_per_minute=1000000, tokens_per_minute=1e9),
+                         async_client=AsyncOfflineLLMClient(latency_ms=2000),
+                         guard=LLMGuard(deadline_seconds=0.2))
+        boba_bi.narrate_weather = True
+        started = time.perf_counter()
+        result = asyncio.run(boba_bi.orchestrator_async("Next week"))
+        elapsed = time.perf_counter() - started
+        if (result['schedule'] and result['traffic_analysis'].startswith('Local traffic analysis')
+                and result['weather_analysis'].startswith('Weather') and elapsed < 1.0):
+            print_status("Async Fallback", True, f"{len(result['schedule'])} shifts in {elapsed * 1000:.0f}ms")
+        else:
+            print_status("Async Fallback", False, f"{elapsed:.2f}s")
+            return False
+
+        return True
+
+    except Exception as e:
+        print_status("LLM Resilience", False, str(e))
+        return False
+
+def test_asgi_server():
+    """Test the async ASGI app with many concurrent schedule requests"""
+    print_header("Testing ASGI Server")
+    
+    try:
+        import asyncio
+        import json
+        import threading
+        import time
+        os.environ.setdefault('BOBA_BI_OFFLINE_LLM', '1')
+        from asgi_server import BobaBIASGI
+        from llm_client import AsyncOfflineLLMClient
+        from llm_limiter import LLMLimiter
+        
+        async def call(app, method, path, body=b'', query=b''):
+            scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query}
+            sent = []
+            async def receive():
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            async def send(message):
+                sent.append(message)
+            await app(scope, receive, send)
+            return sent[0]['status'], json.loads(sent[1]['body'] or b'null')
+        
+        async def run():
+            app = BobaBIASGI()
+            await app.startup()
+            boba_bi = app.state.boba_bi
+            boba_bi.client.limiter = LLMLimiter(requests_per_minute=1000000, tokens_per_minute=1e9)
+            boba_bi._async_client = AsyncOfflineLLMClient(latency_ms=200)
+            
+            for path in ['/', '/api/employees', '/api/traffic/analysis', '/api/stats']:
+                status, _ = await call(app, 'GET', path)
+                if status != 200:
+                    return False, f"GET {path} -> {status}"
+            
+            # Non-object bodies and malformed numbers are client errors
+            for method, path, body, query in [('POST', '/api/schedule', b'[]', b''),
+                                              ('POST', '/api/scenarios', b'[1, 2]', b''),
+                                              ('GET', '/api/employees', b'', b'limit=ten'),
+                                              ('GET', '/api/traffic/analysis', b'', b'days=4x')]:
+                status, payload = await call(app, method, path, body, query)
+                if status != 400 or payload['success']:
+                    return False, f"{method} {path} {body or query} -> {status}"
+            
+            threads_before = threading.active_count()
+            start = time.perf_counter()
+            requests = [call(app, 'POST', '/api/schedule', json.dumps({'query': f"Schedule {i}"}).encode())
+                        for i in range(200)]
+            responses = await asyncio.gather(*requests)
+            elapsed = time.perf_counter() - start
+            threads = threading.active_count() - threads_before
+            ok = all(status == 200 for status, _ in responses)
+            return ok and elapsed < 10, f"200 requests in {elapsed:.2f}s using {threads} extra threads"
+        
+        passed, message = asyncio.run(run())
+        print_status("Concurrent Async Schedules", passed, message)
+        return passed
+        
+    except Exception as e:
+        print_status("ASGI Server", False, str(e))
+        return False
+
+def test_conditional_get():
+    """Test ETag/304 handling and compression of cached read responses"""
+    print_header("Testing Conditional GET")
+    
+    try:
+        import gzip
+        import json
+        from data_store import VersionedStore
+        from http_cache import ResponseCache
+        from boba_bi import generate_employee_data
+        
+        roster = VersionedStore(generate_employee_data(num_employees=10))
+        cache = ResponseCache()
+        builds = []
+        def build():
+            builds.append(1)
+            return {'success': True, 'data': roster.records}
+        
+        status, body, headers = cache.respond('employees', roster.version, build, None, 'gzip, deflate')
+        headers = dict(headers)
+        if status == 200 and headers.get('Content-Encoding') == 'gzip' and json.loads(gzip.decompress(body))['data'] == roster.records:
+            print_status("Compressed Response", True, f"{len(body)} bytes gzip")
+        else:
+            print_status("Compressed Response", False)
+            return False
+        
+        etag = headers['ETag']
+        status, body, _ = cache.respond('employees', roster.version, build, etag, 'gzip')
+        cache.respond('employees', roster.version, build, None, None)
+        if status == 304 and body == b'' and len(builds) == 1:
+            print_status("304 Not Modified", True, "payload built once for 3 polls")
+        else:
+            print_status("304 Not Modified", False)
+            return False
+        
+        roster.extend([{'employee_id': 11, 'name': 'New Hire'}])
+        status, _, headers = cache.respond('employees', roster.version, build, etag, None)
+        if status == 200 and dict(headers)['ETag'] != etag and len(builds) == 2:
+            print_status("Version Invalidation", True)
+        else:
+            print_status("Version Invalidation", False)
+            return False
+        
+        # Client-chosen keys cannot grow the cache past its bound; recently used entries survive
+        small = ResponseCache(max_entries=3)
+        small.get('week=0', 1, build)
+        for week in range(1, 10):
+            small.get('week=0', 1, build)
+            small.get(f"week={week}", 1, build)
+        builds.clear()
+        small.get('week=0', 1, build)
+        small.get('week=1', 1, build)
+        stats = small.stats()
+        if stats['entries'] == 3 and stats['evictions'] == 8 and len(builds) == 1:
+            print_status("Bounded Cache", True, f"{stats['entries']} entries kept, {stats['evictions']} evicted (LRU)")
+        else:
+            print_status("Bounded Cache", False, f"{stats}, {len(builds)} rebuilds")
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("Conditional GET", False, str(e))
+        return False
+
+def test_payload_shaping():
+    """Test field projection, cursor pagination and MessagePack negotiation"""
+    print_header("Testing Payload Shaping")
+
+    try:
+        import json
+        import http_cache
+        from http_cache import ResponseCache, choose_media_type, JSON_TYPE, MSGPACK_TYPE
+        from api_common import page_records, parse_fields, project_payload
+
+        result = {
+            'traffic_analysis': 'long narrative ' * 50,
+            'schedule': [{'date': f"2025-06-0{d}", 'shift': s, 'employees': ['A', 'B'], 'staff_needed': 2}
+                         for d in range(2, 9) for s in ('morning', 'evening')],
+            'dates': ['2025-06-02']
+        }
+        full = {'success': True, 'data': result}
+        projected = project_payload(full, 'schedule.date,schedule.employees,dates')
+        if (list(projected['data']) == ['schedule', 'dates'] and projected['data']['schedule'][0] == {
+                'date': '2025-06-02', 'employees': ['A', 'B']} and full['data'] is result
+                and parse_fields('schedule,schedule.date') == {'schedule': None}):
+            print_status("Field Projection", True, f"{len(json.dumps(full))} -> {len(json.dumps(projected))} bytes")
+        else:
+            print_status("Field Projection", False, str(projected['data'])[:100])
+            return False
+
+        roster = [{'employee_id': i, 'name': f"Employee {i}"} for i in range(25, 0, -1)]
+        seen, cursor, pages = [], None, 0
+        while True:
+            rows, cursor = page_records(roster, 'employee_id', 10, cursor)
+            seen.extend(row['employee_id'] for row in rows)
+            pages += 1
+            if cursor is None:
+                break
+        if seen == list(range(1, 26)) and pages == 3:
+            print_status("Cursor Pagination", True, f"25 employees in {pages} pages of 10")
+        else:
+            print_status("Cursor Pagination", False, str(seen))
+            return False
+
+        # MessagePack is optional: without the package every client gets JSON
+        cache = ResponseCache()
+        accept = 'application/msgpack, application/json;q=0.5'
+        status, body, headers = cache.respond('employees', 1, lambda: {'data': roster}, None, None, accept)
+        headers = dict(headers)
+        if http_cache.msgpack is None:
+            ok = headers['Content-Type'] == JSON_TYPE and json.loads(body)['data'] == roster
+            detail = "msgpack not installed, JSON served"
+        else:
+            ok = (headers['Content-Type'] == MSGPACK_TYPE and http_cache.msgpack.unpackb(body)['data'] == roster
+                  and cache.respond('employees', 1, lambda: {'data': roster}, None, None, None)[2][-1][1] == JSON_TYPE)
+            detail = f"{len(body)} bytes MessagePack vs {len(json.dumps({'data': roster}))} bytes JSON"
+        if ok and choose_media_type('application/json') == JSON_TYPE and choose_media_type(None) == JSON_TYPE:
+            print_status("Content Negotiation", True, detail)
+        else:
+            print_status("Content Negotiation", False, str(headers))
+            return False
+
+        return True
+
+    except Exception as e:
+        print_status("Payload Shaping", False, str(e))
+        return False
+
+def test_shared_pos():
+    """Test publishing POS data to shared memory and attaching from another process"""
+    print_header("Testing Shared-Memory POS Data")
+    
+    publisher = None
+    try:
+        import subprocess
+        import tempfile
+        from shared_pos import SharedPosPublisher, SharedPosView
+        from boba_bi import generate_synthetic_pos_data
+        
+        shm_dir = tempfile.mkdtemp()
+        prefix = f"boba_pos_test_{os.getpid()}"
+        publisher = SharedPosPublisher(prefix=prefix, shm_dir=shm_dir)
+        
+        pos_data = generate_synthetic_pos_data(weeks=1)
+        generation = publisher.publish(pos_data)
+        view = SharedPosView(prefix=prefix, shm_dir=shm_dir, refresh_seconds=0)
+        if view.version == generation and len(view) == len(pos_data) and list(view) == pos_data:
+            print_status("Publish and Attach", True, f"{len(view)} transactions round-trip exactly")
+        else:
+            print_status("Publish and Attach", False)
+            return False
+        
+        # A separate worker process attaches read-only and sees the same columns
+        script = (
+            "import sys; from shared_pos import SharedPosView; "
+            f"v = SharedPosView(prefix={prefix!r}, shm_dir={shm_dir!r}); "
+            "c = v.columns(); print(v.version, len(v), sum(c['items']), sum(v.hourly()[1]))"
+        )
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=60).stdout.split()
+        expected = [str(generation), str(len(pos_data)), str(sum(tx['items'] for tx in pos_data)), str(len(pos_data))]
+        if output == expected:
+            print_status("Worker Process Attach", True, f"generation {output[0]}, {output[2]} items")
+        else:
+            print_status("Worker Process Attach", False, f"got {output}, expected {expected}")
+            return False
+        
+        # Republishing switches readers to the new generation; N-2 is unlinked
+        publisher.publish(pos_data[:100])
+        publisher.publish(pos_data[:50])
+        old_removed = not os.path.exists(os.path.join(shm_dir, f"{prefix}_g{generation}.bin"))
+        if view.version == generation + 2 and len(view) == 50 and old_removed:
+            print_status("Generation Switch", True, f"now generation {view.version}, old segment unlinked")
+        else:
+            print_status("Generation Switch", False)
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("Shared-Memory POS Data", False, str(e))
+        return False
+    finally:
+        if publisher is not None:
+            publisher.unlink_all()
+            os.rmdir(publisher.shm_dir)
+
+def test_traffic_cube():
+    """Test range/granularity traffic queries against a brute-force count"""
+    print_header("Testing Traffic Cube")
+    
+    try:
+        from collections import Counter
+        from datetime import timedelta
+        from boba_bi import generate_synthetic_pos_data
+        from traffic_cube import build_traffic_cube, MAX_BUCKETS
+        
+        pos_data = generate_synthetic_pos_data(weeks=3)
+        cube = build_traffic_cube(pos_data)
+        start = datetime.now().replace(minute=30, second=0, microsecond=0) - timedelta(days=10)
+        end = start + timedelta(days=7, hours=5)
+        
+        in_range = [tx for tx in pos_data
+                    if start.replace(minute=0) <= datetime.fromisoformat(tx['timestamp']) < end.replace(minute=0) + timedelta(hours=1)]
+        by_day = Counter(tx['timestamp'][:10] for tx in in_range)
+        days = cube.query(start, end, 'day')
+        if len(days) == 8 and all(row['orders'] == by_day[row['start'][:10]] for row in days):
+            print_status("Daily Buckets", True, f"{len(days)} days, {sum(r['orders'] for r in days)} orders")
+        else:
+            print_status("Daily Buckets", False)
+            return False
+        
+        by_slot = Counter((datetime.fromisoformat(tx['timestamp']).strftime('%A'), datetime.fromisoformat(tx['timestamp']).hour)
+                          for tx in in_range)
+        profile = cube.query(start, end, 'hour_of_week')
+        busiest = max(profile, key=lambda row: row['orders'])
+        busiest_prep = [tx['prep_time_minutes'] for tx in in_range
+                        if (datetime.fromisoformat(tx['timestamp']).strftime('%A'), datetime.fromisoformat(tx['timestamp']).hour)
+                        == (busiest['weekday'], busiest['hour'])]
+        if (len(profile) == 168 and all(row['orders'] == by_slot[(row['weekday'], row['hour'])] for row in profile)
+                and busiest['mean_prep_minutes'] == round(sum(busiest_prep) / len(busiest_prep), 2)):
+            print_status("Hour-of-Week Profile", True, "168 buckets match")
+        else:
+            print_status("Hour-of-Week Profile", False)
+            return False
+        
+        try:
+            cube.query(start - timedelta(days=1000), end, 'hour')
+            print_status("Bucket Limit", False, f"expected > {MAX_BUCKETS} hourly buckets to be rejected")
+            return False
+        except ValueError:
+            print_status("Bucket Limit", True)
+        
+        # Live batches copy only the recent tail; earlier cubes keep their view
+        from traffic_cube import TrafficCube, TAIL_HOURS
+        first, last = cube.hourly()[0], cube.hourly()[0] + cube.n_hours - 1
+        window = (start - timedelta(days=30), end + timedelta(days=30))
+        before = cube.query(*window, 'hour')
+        live = cube
+        for hour in range(last - 2, last + 3 * TAIL_HOURS):
+            live = live.with_buckets({hour: [1, 2, 6], hour - 1: [1, 1, 4]})
+        late = live.with_buckets({first + 5: [3, 3, 9]})
+        rebuilt = TrafficCube.from_buckets({first + i: [late.hourly(m)[1][i] for m in TrafficCube.MEASURES]
+                                            for i in range(late.n_hours)})
+        if (cube.query(*window, 'hour') == before
+                and all(late.query(*window, g) == rebuilt.query(*window, g) for g in ('hour', 'hour_of_week'))
+                and len(live._hourly['orders'].tail) <= 2 * TAIL_HOURS):
+            print_status("Live Batches", True, f"{len(live._hourly['orders'].tail)}-hour copy-on-write tail")
+        else:
+            print_status("Live Batches", False)
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("Traffic Cube", False, str(e))
+        return False
+
+def test_time_buckets():
+    """Test timezone-aware bucketing across DST transitions"""
+    print_header("Testing Time Bucketing")
+    
+    try:
+        import random
+        from datetime import timezone
+        from zoneinfo import ZoneInfo
+        from boba_bi import generate_synthetic_pos_data
+        from time_buckets import offset_table, epoch_to_local_seconds, weekday_hour_counts
+        
+        la = ZoneInfo('America/Los_Angeles')
+        spring = int(datetime(2025, 3, 9, 10, tzinfo=timezone.utc).timestamp())
+        fall = int(datetime(2025, 11, 2, 9, tzinfo=timezone.utc).timestamp())
+        starts, offsets = offset_table(la, spring - 86400 * 30, fall + 86400 * 30)
+        if starts[1:] == [spring, fall] and offsets == [-8 * 3600, -7 * 3600, -8 * 3600]:
+            print_status("DST Transitions", True, "2025-03-09 10:00Z and 2025-11-02 09:00Z")
+        else:
+            print_status("DST Transitions", False, f"{starts} {offsets}")
+            return False
+        
+        # UTC evening rush, spring-forward gap and the repeated fall-back hour
+        counts = weekday_hour_counts([
+            '2025-07-05T02:30:00Z',        # Friday 19:30 PDT (Saturday 02:30 UTC)
+            '2025-03-09T09:59:59+00:00',   # Sunday 01:59:59 PST
+            '2025-03-09T10:00:00+00:00',   # Sunday 03:00:00 PDT
+            '2025-11-02T08:30:00+00:00',   # Sunday 01:30 PDT
+            '2025-11-02T09:30:00+00:00',   # Sunday 01:30 PST
+        ], la)
+        expected = {4 * 24 + 19: 1, 6 * 24 + 1: 3, 6 * 24 + 3: 1}
+        if {slot: n for slot, n in enumerate(counts) if n} == expected:
+            print_status("Local Weekday/Hour", True, "evening rush stays on Friday; DST hours bucket locally")
+        else:
+            print_status("Local Weekday/Hour", False, str({slot: n for slot, n in enumerate(counts) if n}))
+            return False
+        
+        # Batch conversion matches per-row zoneinfo, including half-hour zones
+        rng = random.Random(7)
+        epochs = sorted(rng.randrange(1700000000, 1770000000) for _ in range(5000))
+        for name in ('America/Los_Angeles', 'Asia/Kolkata', 'Australia/Lord_Howe'):
+            zone = ZoneInfo(name)
+            expected = [int((datetime.fromtimestamp(e, zone).replace(tzinfo=None) - datetime(1970, 1, 1)).total_seconds())
+                        for e in epochs]
+            if [int(x) for x in epoch_to_local_seconds(epochs, zone)] != expected:
+                print_status("Batch Conversion", False, name)
+                return False
+        print_status("Batch Conversion", True, "5000 epochs match zoneinfo in 3 zones")
+        
+        # Naive local strings and their UTC equivalents bucket identically
+        naive = [tx['timestamp'] for tx in generate_synthetic_pos_data(weeks=2)]
+        utc = [datetime.fromisoformat(ts).replace(tzinfo=la).astimezone(timezone.utc).isoformat() for ts in naive]
+        if weekday_hour_counts(naive, la) == weekday_hour_counts(utc, la):
+            print_status("Naive vs UTC Input", True, f"{len(naive)} transactions")
+        else:
+            print_status("Naive vs UTC Input", False)
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("Time Bucketing", False, str(e))
+        return False
+
+def test_supabase_sync():
+    """Test high-watermark delta sync into the local cache (with an in-memory Supabase stand-in)"""
+    print_header("Testing Supabase Sync")
+    
+    try:
+        import re
+        import tempfile
+        from datetime import timedelta, timezone
+        from supabase_sync import SupabaseSync, LocalCache
+        
+        class FakeQuery:
+            """Just enough of the PostgREST query builder for keyset pagination"""
+            def __init__(self, db, table):
+                self.rows, self.filters, self.n = list(db.tables[table]), [], None
+                db.requests += 1
+            def select(self, _):
+                return self
+            def gte(self, column, value):
+                self.filters.append(lambda r: r[column] >= value)
+                return self
+            def or_(self, expression):
+                column, ts, id_column, last_id = re.match(
+                    r'(\w+)\.gt\."([^"]+)",and\(\w+\.eq\."[^"]+",(\w+)\.gt\.(\w+)\)', expression).groups()
+                self.filters.append(lambda r: (r[column], r[id_column]) > (ts, int(last_id)))
+                return self
+            def order(self, column):
+                self.rows.sort(key=lambda r: r[column])
+                return self
+            def limit(self, n):
+                self.n = n
+                return self
+            def execute(self):
+                rows = [r for r in self.rows if all(f(r) for f in self.filters)]
+                rows.sort(key=lambda r: (r.get('timestamp', ''), r.get('order_id', 0)))
+                return type('Response', (), {'data': rows[:self.n] if self.n else rows})
+        
+        class FakeSupabase:
+            def __init__(self):
+                self.tables = {'pos_transactions': [], 'employees': [], 'schedules': []}
+                self.requests = 0
+            def table(self, name):
+                return FakeQuery(self, name)
+        
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        def order(i, at):
+            return {'order_id': i, 'timestamp': at.isoformat(), 'items': 2, 'prep_time_minutes': 5}
+        
+        db = FakeSupabase()
+        db.tables['pos_transactions'] = [order(i, now - timedelta(minutes=2500 - i)) for i in range(1, 2501)]
+        db.tables['employees'] = [{'employee_id': 1, 'name': 'Alex'}]
+        path = os.path.join(tempfile.mkdtemp(), 'cache.sqlite3')
+        tables = {k: v for k, v in SupabaseSync(db, cache=LocalCache(path)).tables.items() if k != 'schedules'}
+        
+        stats = SupabaseSync(db, cache=LocalCache(path), tables=tables).sync()
+        pos = stats['pos_transactions']
+        if pos['mode'] == 'full' and pos['fetched'] == 2500 and pos['rows'] == 2500 and db.requests == 4:
+            print_status("Cold Start", True, "2500 rows in 3 keyset pages + 1 roster request")
+        else:
+            print_status("Cold Start", False, str(stats))
+            return False
+        
+        # Restart: 5 new orders plus one late arrival stamped 5 minutes before the watermark
+        db.tables['pos_transactions'] += [order(2500 + i, now + timedelta(minutes=i)) for i in range(1, 6)]
+        db.tables['pos_transactions'].append(order(2506, now - timedelta(minutes=5)))
+        sync = SupabaseSync(db, cache=LocalCache(path), tables=tables, overlap=timedelta(minutes=15))
+        pos = sync.sync()['pos_transactions']
+        ids = [row['order_id'] for row in sync.rows('pos_transactions')]
+        if pos['mode'] == 'delta' and pos['fetched'] < 30 and pos['rows'] == 2506 and len(set(ids)) == 2506 and 2506 in ids:
+            print_status("Delta Sync", True, f"{pos['fetched']} rows fetched incl. late arrival, no duplicates")
+        else:
+            print_status("Delta Sync", False, str(pos))
+            return False
+        
+        since = now - timedelta(minutes=10)
+        recent = sync.rows('pos_transactions', since=since)
+        if all(datetime.fromisoformat(row['timestamp']) >= since for row in recent) and len(recent) == 17:
+            print_status("Cached Range Read", True, f"{len(recent)} rows since cutoff")
+        else:
+            print_status("Cached Range Read", False, str(len(recent)))
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("Supabase Sync", False, str(e))
+        return False
+
+def test_pos_ingestion():
+    """Test NDJSON/binary POS batch ingestion and incremental cube updates"""
+    print_header("Testing POS Batch Ingestion")
+    
+    try:
+        import json
+        import time
+        from datetime import timedelta
+        from data_store import VersionedStore
+        from pos_ingest import PosIngestor, encode_binary
+        from shared_pos import to_epoch_us
+        from time_buckets import get_zone, local_now
+        from traffic_cube import build_traffic_cube, buckets_from_transactions
+        from boba_bi import generate_synthetic_pos_data
+        
+        store = VersionedStore(generate_synthetic_pos_data(weeks=2))
+        cube = {'version': store.version, 'cube': build_traffic_cube(store)}
+        def apply(orders, old_version, new_version):
+            if cube['version'] == old_version:
+                cube['version'], cube['cube'] = new_version, cube['cube'].with_buckets(buckets_from_transactions(orders))
+        ingestor = PosIngestor(store, on_append=apply)
+        
+        now = local_now().replace(microsecond=0)
+        lines = [json.dumps({'timestamp': (now - timedelta(minutes=i)).isoformat(), 'items': 2, 'prep_time_minutes': 4})
+                 for i in range(1, 201)]
+        lines[10] = json.dumps({'timestamp': now.isoformat(), 'items': 0, 'prep_time_minutes': 4})
+        lines[20] = json.dumps({'timestamp': (now + timedelta(days=1)).isoformat(), 'items': 1, 'prep_time_minutes': 4})
+        before = len(store)
+        result = ingestor.ingest('\n'.join(lines).encode(), 'application/x-ndjson')
+        if (result['accepted'] == 198 and [e['index'] for e in result['errors']] == [10, 20]
+                and len(store) == before + 198):
+            print_status("NDJSON Batch", True, "198 accepted, 2 rejected with line indexes")
+        else:
+            print_status("NDJSON Batch", False, str(result))
+            return False
+        
+        zone = get_zone()
+        binary = encode_binary([(900000 + i, to_epoch_us((now - timedelta(seconds=i)).isoformat(), zone), 3, 5)
+                                for i in range(1, 101)])
+        first = ingestor.ingest(binary, 'application/x-boba-pos')
+        retry = ingestor.ingest(binary, 'application/x-boba-pos')
+        if first['accepted'] == 100 and retry['accepted'] == 0 and retry['duplicates'] == 100:
+            print_status("Binary Batch", True, f"{len(binary)} bytes, retry deduplicated")
+        else:
+            print_status("Binary Batch", False, f"{first} {retry}")
+            return False
+        
+        start, end = now - timedelta(days=15), now + timedelta(hours=1)
+        if cube['version'] == store.version and all(
+                cube['cube'].query(start, end, g) == build_traffic_cube(store).query(start, end, g)
+                for g in ('hour', 'day', 'hour_of_week')):
+            print_status("Incremental Aggregates", True, "cube matches a full rebuild")
+        else:
+            print_status("Incremental Aggregates", False)
+            return False
+        
+        bulk = '\n'.join(json.dumps({'timestamp': (now - timedelta(seconds=i)).isoformat(), 'items': 1,
+                                     'prep_time_minutes': 3}) for i in range(20000)).encode()
+        started = time.perf_counter()
+        accepted = ingestor.ingest(bulk, 'application/x-ndjson')['accepted']
+        rate = accepted / (time.perf_counter() - started)
+        if accepted == 20000 and rate > 10000:
+            print_status("Throughput", True, f"{rate:,.0f} orders/s")
+        else:
+            print_status("Throughput", False, f"{rate:,.0f} orders/s")
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("POS Batch Ingestion", False, str(e))
+        return False
+
+def test_scenarios():
+    """Test batch what-if scenario evaluation"""
+    print_header("Testing What-If Scenarios")
+    
+    try:
+        import time
+        from boba_bi import (generate_synthetic_pos_data, generate_employee_data, analyze_traffic_patterns,
+                             next_week_dates, build_schedule)
+        from scenarios import run_scenarios, expand_grid, schedule_metrics, PARALLEL_MIN_SCENARIOS
+        
+        traffic = analyze_traffic_patterns(generate_synthetic_pos_data(weeks=4))
+        employees = generate_employee_data(num_employees=10)
+        dates = next_week_dates()
+        weather = {date: 1.3 for date in dates}
+        grid = {
+            'min_staff_per_shift': [1, 2, 3, 4],
+            'max_hours_per_week': [24, 32, 40, 48],
+            'orders_per_staff': [10, 12, 15, 18, 20],
+            'weather_scale': [0, 0.5, 1, 1.5, 2]
+        }
+        
+        started = time.perf_counter()
+        serial = run_scenarios(traffic, dates, employees, weather, grid, workers=1)
+        elapsed = time.perf_counter() - started
+        parallel = run_scenarios(traffic, dates, employees, weather, grid, workers=2)
+        if len(serial) == 400 and serial == parallel:
+            print_status("Grid Evaluation", True, f"400 scenarios in {elapsed * 1000:.0f}ms, pool results identical")
+        else:
+            print_status("Grid Evaluation", False, f"{len(serial)} serial, {len(parallel)} parallel")
+            return False
+        
+        baseline = next(r for r in serial if r['variant'] == {'min_staff_per_shift': 2, 'max_hours_per_week': 40,
+                                                             'orders_per_staff': 15, 'weather_scale': 1})
+        expected = schedule_metrics(build_schedule(traffic, dates, employees, weather))
+        if {k: v for k, v in baseline.items() if k != 'variant'} == expected:
+            print_status("Baseline Variant", True, f"coverage {expected['coverage']:.0%}, "
+                         f"{expected['understaffed_shifts']} understaffed, {expected['total_hours']}h")
+        else:
+            print_status("Baseline Variant", False, f"{baseline} != {expected}")
+            return False
+        
+        # With the scheduler's capacity model and recorded hours, the baseline is the scheduler's own plan
+        from boba_bi import week_start
+        from capacity import build_capacity_model
+        capacity = build_capacity_model(generate_synthetic_pos_data(weeks=4))
+        worked = {week_start(dates[0]): {emp['employee_id']: 32 for emp in employees[:5]}}
+        baseline_grid = {'weather_scale': [1], 'orders_per_staff': [15] * PARALLEL_MIN_SCENARIOS}
+        serial = run_scenarios(traffic, dates, employees, weather, baseline_grid, workers=1,
+                               capacity=capacity, hours_worked=worked)
+        parallel = run_scenarios(traffic, dates, employees, weather, baseline_grid, workers=2,
+                                 capacity=capacity, hours_worked=worked)
+        expected = schedule_metrics(build_schedule(traffic, dates, employees, weather,
+                                                   hours_worked=worked, capacity=capacity))
+        if serial == parallel and {k: v for k, v in serial[0].items() if k != 'variant'} == expected:
+            print_status("Scheduler Inputs", True, f"queueing model and history hours honoured in the pool, "
+                         f"{expected['total_hours']}h")
+        else:
+            print_status("Scheduler Inputs", False, f"{serial[0]} != {expected}")
+            return False
+        
+        try:
+            expand_grid({'staff_per_order': [1]})
+            print_status("Grid Validation", False, "unknown parameter accepted")
+            return False
+        except ValueError:
+            print_status("Grid Validation", True, "unknown parameters rejected")
+        
+        return True
+        
+    except Exception as e:
+        print_status("What-If Scenarios", False, str(e))
+        return False
+
+def test_multi_week_horizon():
+    """Test multi-week scheduling with per-calendar-week hour limits"""
+    print_header("Testing Multi-Week Horizon")
+    
+    try:
+        import time
+        from collections import defaultdict
+        from boba_bi import (generate_synthetic_pos_data, generate_employee_data, analyze_traffic_patterns,
+                             build_schedule, horizon_dates, week_start, MAX_HOURS_PER_WEEK)
+        
+        traffic = analyze_traffic_patterns(generate_synthetic_pos_data(weeks=4))
+        employees = generate_employee_data(num_employees=10)
+        
+        # Starting on a Thursday, so the first and last calendar weeks are partial
+        dates = horizon_dates(12, start=datetime(2025, 6, 4))
+        schedule = build_schedule(traffic, dates, employees)
+        hours = defaultdict(lambda: defaultdict(int))
+        for shift in schedule:
+            for name in shift['employees']:
+                hours[week_start(shift['date'])][name] += 8
+        worst = max(max(week.values()) for week in hours.values())
+        if len(dates) == 84 and len(hours) == 13 and worst <= MAX_HOURS_PER_WEEK:
+            print_status("Calendar Week Limits", True, f"84 days over 13 calendar weeks, max {worst}h/week")
+        else:
+            print_status("Calendar Week Limits", False, f"{len(dates)} days, {len(hours)} weeks, max {worst}h")
+            return False
+        
+        # Hours reset each Monday: every full week is staffed like the first one
+        full_weeks = sorted(hours)[1:-1]
+        totals = {sum(hours[week].values()) for week in full_weeks}
+        if len(totals) == 1:
+            print_status("Rolling Accounting", True, f"{totals.pop()} staff-hours in each full week")
+        else:
+            print_status("Rolling Accounting", False, str(sorted(totals)))
+            return False
+        
+        roster = [dict(employees[i % 10], employee_id=i + 1, name=f"Employee {i}") for i in range(1000)]
+        started = time.perf_counter()
+        build_schedule(traffic, horizon_dates(13), roster, orders_per_staff=0.1)
+        elapsed = time.perf_counter() - started
+        if elapsed < 1.0:
+            print_status("Quarter Plan", True, f"13 weeks x 1000 employees in {elapsed * 1000:.0f}ms")
+        else:
+            print_status("Quarter Plan", False, f"{elapsed:.2f}s")
+            return False
+        
+        try:
+            horizon_dates(0)
+            print_status("Horizon Validation", False, "horizon_weeks=0 accepted")
+            return False
+        except ValueError:
+            print_status("Horizon Validation", True, "out-of-range horizons rejected")
+        
+        return True
+        
+    except Exception as e:
+        print_status("Multi-Week Horizon", False, str(e))
+        return False
+
+def test_schedule_repair():
+    """Test incremental schedule repair and its diff"""
+    print_header("Testing Schedule Repair")
+    
+    try:
+        import copy
+        import time
+        from collections import defaultdict
+        from boba_bi import (generate_synthetic_pos_data, generate_employee_data, analyze_traffic_patterns,
+                             build_schedule, horizon_dates, week_start, MAX_HOURS_PER_WEEK)
+        from schedule_repair import repair_schedule
+        
+        traffic = analyze_traffic_patterns(generate_synthetic_pos_data(weeks=4))
+        employees = generate_employee_data(num_employees=10)
+        roster = [dict(employees[i % 10], employee_id=i + 1, name=f"Employee {i}") for i in range(1000)]
+        dates = horizon_dates(13, start=datetime(2025, 6, 1))
+        schedule = build_schedule(traffic, dates, roster, orders_per_staff=2)
+        original = copy.deepcopy(schedule)
+        
+        callout = schedule[3]['employee_ids'][0]
+        changes = [
+            {'type': 'unavailable', 'employee_id': callout, 'dates': [dates[1]]},
+            {'type': 'demand', 'date': dates[2], 'shift': 'evening', 'staff_needed': schedule[5]['staff_needed'] + 3}
+        ]
+        started = time.perf_counter()
+        repaired, diff = repair_schedule(schedule, roster, changes, orders_per_staff=2)
+        elapsed = time.perf_counter() - started
+        
+        changed = {(s['date'], s['shift']) for s, before in zip(repaired, schedule) if s != before}
+        if schedule == original and changed == {(d['date'], d['shift']) for d in diff} and len(changed) <= 14:
+            print_status("Stable Repair", True, f"{len(diff)} of {len(schedule)} shifts changed in {elapsed * 1000:.1f}ms")
+        else:
+            print_status("Stable Repair", False, f"{len(changed)} shifts changed, diff {len(diff)}")
+            return False
+        
+        hours = defaultdict(int)
+        for shift in repaired:
+            for employee_id in shift['employee_ids']:
+                hours[(week_start(shift['date']), employee_id)] += 8
+        removed = all(callout not in s['employee_ids'] for s in repaired if s['date'] == dates[1])
+        if removed and max(hours.values()) <= MAX_HOURS_PER_WEEK and repaired[5]['staff_assigned'] > schedule[5]['staff_assigned']:
+            print_status("Constraints Kept", True, "call-out removed, demand raised, weekly caps respected")
+        else:
+            print_status("Constraints Kept", False)
+            return False
+        
+        try:
+            repair_schedule(schedule, roster, [{'type': 'demand', 'date': '1999-01-01', 'shift': 'morning', 'staff_needed': 1}])
+            print_status("Change Validation", False, "unknown shift accepted")
+            return False
+        except ValueError:
+            print_status("Change Validation", True, "changes to unknown shifts rejected")
+        
+        return True
+        
+    except Exception as e:
+        print_status("Schedule Repair", False, str(e))
+        return False
+
+def test_schedule_history():
+    """Test the indexed schedule history: weekly hour aggregates and pagination"""
+    print_header("Testing Schedule History")
+    
+    try:
+        from boba_bi import (generate_synthetic_pos_data, generate_employee_data, analyze_traffic_patterns,
+                             build_schedule, horizon_dates, MAX_HOURS_PER_WEEK)
+        from schedule_history import ScheduleHistory
+        
+        traffic = analyze_traffic_patterns(generate_synthetic_pos_data(weeks=4))
+        employees = generate_employee_data(num_employees=10)
+        history = ScheduleHistory(':memory:')
+        dates = horizon_dates(26, start=datetime(2024, 6, 2)) + horizon_dates(26, start=datetime(2024, 12, 1))
+        for i in range(0, len(dates), 7):
+            history.record(build_schedule(traffic, dates[i:i + 7], employees, orders_per_staff=2))
+        
+        # Re-recording a week replaces it instead of adding to it
+        week = dates[:7]
+        before = history.employee_hours(week[0], week[-1])
+        history.record(build_schedule(traffic, week, employees, orders_per_staff=2))
+        after = history.employee_hours(week[0], week[-1])
+        aggregate = history.week_hours([week[0]])[week[0]]
+        if after == before and aggregate == {k: v['hours'] for k, v in after.items()}:
+            print_status("Weekly Aggregate", True, f"{len(after)} employees, replaced plans not double counted")
+        else:
+            print_status("Weekly Aggregate", False, f"{aggregate} vs {after}")
+            return False
+        
+        # Re-planning the rest of a week counts the recorded first days against the cap
+        worked = history.hours_worked(week[3:])
+        history.record(build_schedule(traffic, week[3:], employees, orders_per_staff=2, hours_worked=worked))
+        totals = history.employee_hours(week[0], week[-1])
+        if worked[week[0]] and max(v['hours'] for v in totals.values()) <= MAX_HOURS_PER_WEEK:
+            print_status("Cross-Week Caps", True, f"max {max(v['hours'] for v in totals.values())}h in a partially re-planned week")
+        else:
+            print_status("Cross-Week Caps", False, str(totals))
+            return False
+        
+        # The Supabase seed matches the history's for every week of a plan
+        from boba_bi_supabase import BobaBISupabase
+        class FakeRPC:
+            """employee_week_hours() over the history's assignments"""
+            def rpc(self, name, params):
+                rows = history._db.execute(
+                    "SELECT employee_id, MAX(name), week_start, SUM(hours), COUNT(*) FROM assignments "
+                    "WHERE date BETWEEN ? AND ? GROUP BY employee_id, week_start",
+                    (params['start_date'], params['end_date'])).fetchall()
+                data = [dict(zip(('employee_id', 'name', 'week_start', 'hours', 'shifts'), row)) for row in rows]
+                return type('Query', (), {'execute': lambda self: type('Response', (), {'data': data})})()
+        supabase_bi = BobaBISupabase.__new__(BobaBISupabase)
+        supabase_bi.supabase = FakeRPC()
+        span = dates[3:12]
+        seeded = supabase_bi.hours_worked(span)
+        if seeded == history.hours_worked(span) and sum(1 for hours in seeded.values() if hours) == 2:
+            print_status("Supabase Seed", True, f"{len(seeded)} weeks seeded like the local history")
+        else:
+            print_status("Supabase Seed", False, f"{seeded} vs {history.hours_worked(span)}")
+            return False
+        
+        rows, cursor, pages = [], None, 0
+        while True:
+            page, cursor = history.shifts(limit=100, cursor=cursor)
+            rows.extend(page)
+            pages += 1
+            if cursor is None:
+                break
+        ordered = sorted(rows, key=lambda r: (r['date'], r['shift'] != 'morning'))
+        if len(rows) == history.count() == len(dates) * 2 and rows == ordered and pages == 8:
+            print_status("Pagination", True, f"{len(rows)} shifts in {pages} keyset pages")
+        else:
+            print_status("Pagination", False, f"{len(rows)} rows, {pages} pages")
+            return False
+        
+        try:
+            history.shifts(cursor='bogus')
+            print_status("Cursor Validation", False, "bad cursor accepted")
+            return False
+        except ValueError:
+            print_status("Cursor Validation", True, "malformed cursors rejected")
+        
+        return True
+        
+    except Exception as e:
+        print_status("Schedule History", False, str(e))
+        return False
+
+def test_traffic_anomalies():
+    """Test streaming anomaly detection and excluding anomalies from traffic summaries"""
+    print_header("Testing Traffic Anomaly Detection")
+    
+    try:
+        import time
+        from datetime import timedelta
+        from boba_bi import analyze_traffic_patterns
+        from time_buckets import local_now
+        from traffic_cube import local_hour_index
+        from traffic_anomalies import TrafficAnomalyDetector
+        
+        # Eight weeks of a flat 20 orders/hour, an outage at 18:00 and a spike the next day at 18:00
+        now = local_now().replace(minute=0, second=0, microsecond=0)
+        spike = now.replace(hour=18) if now.hour >= 20 else now.replace(hour=18) - timedelta(days=1)
+        outage = spike - timedelta(days=1)
+        orders, hour = [], now - timedelta(weeks=8)
+        while hour < now:
+            count = 100 if hour == spike else 0 if hour == outage else 20
+            orders.extend({'timestamp': (hour + timedelta(minutes=i % 60)).isoformat()} for i in range(count))
+            hour += timedelta(hours=1)
+        
+        detector = TrafficAnomalyDetector(z_threshold=3.5)
+        spike_index = local_hour_index(spike)
+        before = [o for o in orders if o['timestamp'] < spike.isoformat()]
+        started = time.perf_counter()
+        detector.observe_orders(before)
+        per_event_us = (time.perf_counter() - started) / len(before) * 1e6
+        
+        flagged_at = None
+        for n in range(1, 101):
+            detector.observe(spike_index)
+            if flagged_at is None and detector.anomalies(limit=1)[0]['kind'] == 'spike':
+                flagged_at = n
+        detector.observe_orders([o for o in orders if o['timestamp'] >= (spike + timedelta(hours=1)).isoformat()])
+        
+        found = {a['kind']: a for a in detector.anomalies()}
+        if (set(found) == {'spike', 'drop'} and found['spike']['status'] == 'closed' and found['spike']['orders'] == 100
+                and found['drop']['hour'] == outage.isoformat() and flagged_at and flagged_at < 50):
+            print_status("Online Detection", True, f"spike flagged at order {flagged_at} of 100 while the hour was open, "
+                         f"outage flagged at close ({per_event_us:.1f}us/event)")
+        else:
+            print_status("Online Detection", False, f"{detector.anomalies()} flagged at {flagged_at}")
+            return False
+        
+        day, shift = spike.strftime('%A'), 'evening'
+        raw = analyze_traffic_patterns(orders)[day][shift]
+        cleaned = analyze_traffic_patterns(orders, anomalies=detector)[day][shift]
+        if raw - cleaned == (100 - 20) / 8:
+            print_status("Summary Exclusion", True, f"{day} evening {raw} -> {cleaned} orders/hr with anomalies excluded")
+        else:
+            print_status("Summary Exclusion", False, f"raw {raw}, cleaned {cleaned}")
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("Traffic Anomalies", False, str(e))
+        return False
+
+def test_demand_sketches():
+    """Test KLL quantile sketches, store merging and percentile staffing"""
+    print_header("Testing Demand Percentile Sketches")
+
+    try:
+        import bisect
+        import random
+        from datetime import datetime, timedelta
+        from boba_bi import BobaBI
+        from traffic_cube import local_hour_index
+        from demand_sketches import KLLSketch, DemandSketches, parse_percentile
+
+        # Rank error of a bounded sketch over 100k skewed values, alone and merged
+        rng = random.Random(7)
+        values = [rng.expovariate(1 / 20) for _ in range(100000)]
+        ordered = sorted(values)
+        whole, left, right = KLLSketch(128), KLLSketch(128), KLLSketch(128)
+        for i, value in enumerate(values):
+            whole.update(value)
+            (left if i % 2 else right).update(value)
+        merged = KLLSketch.from_dict(left.to_dict()).merge(right)
+        errors = [abs(bisect.bisect_left(ordered, sketch.quantile(q)) / len(ordered) - q)
+                  for sketch in (whole, merged) for q in (0.5, 0.9, 0.99)]
+        retained = max(whole._size(), merged._size())
+        if max(errors) < 0.02 and retained <= 3 * 128 + len(whole.levels) and merged.count == len(values):
+            print_status("KLL Sketch", True, f"max rank error {max(errors):.4f}, {retained} of {len(values)} values kept")
+        else:
+            print_status("KLL Sketch", False, f"rank errors {errors}, {retained} values kept")
+            return False
+
+        # Store 'a': 20 orders/hour except 18:00, which alternates 10 / 50 by week; store 'b': flat 40
+        first_hour = local_hour_index(datetime(2025, 6, 2))  # A Monday
+        hourly_a = [(10 if i // 168 % 2 == 0 else 50) if i % 24 == 18 else 20 for i in range(8 * 168 + 1)]
+        store_a, store_b = DemandSketches(), DemandSketches()
+        store_a.seed_hourly('a', first_hour, hourly_a)
+        store_b.seed_hourly('b', first_hour, [40] * (8 * 168 + 1))
+        p50, p90 = store_a.traffic_summary(0.5), store_a.traffic_summary(0.9)
+        # Scaled to analyze_traffic_patterns(): 4 weeks of the hour's orders per shift hour
+        if p50['Saturday']['evening'] == (7 * 20 + 10) * 4 / 8 and p90['Saturday']['evening'] == (7 * 20 + 50) * 4 / 8:
+            print_status("Percentile Summary", True, f"Saturday evening p50 {p50['Saturday']['evening']}, "
+                         f"p90 {p90['Saturday']['evening']} orders/hr")
+        else:
+            print_status("Percentile Summary", False, f"p50 {p50['Saturday']}, p90 {p90['Saturday']}")
+            return False
+
+        regional = DemandSketches.from_dict(store_a.to_dict()).merge(store_b)
+        monday_10 = 10
+        if (regional.stores() == ['a', 'b'] and regional.sketch(monday_10).quantile(0.9) == 40
+                and regional.sketch(monday_10, ['a']).quantile(0.9) == 20
+                and regional.sketch(monday_10).count == 16):
+            print_status("Regional Merge", True, "a + b buckets merge; per-store views still available")
+        else:
+            print_status("Regional Merge", False, str(regional.stats()))
+            return False
+
+        # Live orders close hours into their buckets; the scheduler staffs to the percentile
+        version = store_a.version
+        late = datetime(2025, 6, 2) + timedelta(weeks=8, hours=1)
+        store_a.observe_orders([{'timestamp': late.isoformat()}], store='a')
+        boba_bi = BobaBI(None, [], [], client=object(), demand_sketches=store_a)
+        boba_bi.staffing_percentile = parse_percentile('p90')
+        if store_a.version > version and boba_bi.traffic_summary() == store_a.traffic_summary(0.9):
+            print_status("Percentile Staffing", True, "BOBA_BI_STAFFING_PERCENTILE=p90 drives traffic_summary()")
+        else:
+            print_status("Percentile Staffing", False)
+            return False
+
+        # All-store buckets are kept merged; closing an hour re-sorts only its slot
+        regional.hourly_quantiles(0.9)
+        regional.observe(first_hour + 8 * 168 + 5, 30, store='b')
+        regional.observe(first_hour + 8 * 168 + 6, 30, store='b')
+        stale = [slot for slot, sketch in regional._merged.items() if sketch._cdf is None]
+        if (regional.quantile_rows([0.5, 0.9]) == regional.quantile_rows([0.5, 0.9], ['a', 'b'])
+                and stale == [5]):
+            print_status("Maintained Merge", True, "all-store rows match an on-demand merge")
+        else:
+            print_status("Maintained Merge", False, f"stale slots {stale}")
+            return False
+
+        return True
+
+    except Exception as e:
+        print_status("Demand Sketches", False, str(e))
+        return False
+
+def test_capacity_model():
+    """Test the Erlang C staffing tables and queueing-based schedules"""
+    print_header("Testing Queueing Capacity Model")
+    
+    try:
+        import math
+        import time
+        from boba_bi import generate_synthetic_pos_data, generate_employee_data, build_schedule, next_week_dates
+        from capacity import (build_capacity_model, erlang_c, required_staff, staffing_table,
+                              wait_exceeds_probability)
+        
+        # Textbook check: 10 Erlangs on 11 agents waits with probability ~0.682
+        if abs(erlang_c(11, 10) - 0.6821) < 0.001:
+            print_status("Erlang C", True, f"C(11, 10) = {erlang_c(11, 10):.4f}")
+        else:
+            print_status("Erlang C", False, f"C(11, 10) = {erlang_c(11, 10):.4f}")
+            return False
+        
+        # Table entries are the smallest staff meeting the target at each load
+        table = staffing_table(5, 5.5, 0.8, cv2=0.1)
+        loads = [i * 0.37 for i in range(100)]
+        staff = list(required_staff(loads, 5.5, 5, 0.8, cv2=0.1))
+        def minimal(load):
+            load = math.ceil(load / table.step - 1e-9) * table.step
+            c = math.floor(load) + 1 if load > 0 else 0
+            while load > 0 and wait_exceeds_probability(c, load, table.wait_ratio, table.spread) > 0.2:
+                c += 1
+            return c
+        if staff == [minimal(load) for load in loads] and staff == sorted(staff):
+            print_status("Lookup Table", True, f"{len(loads)} loads match direct search, up to {staff[-1]} staff")
+        else:
+            print_status("Lookup Table", False)
+            return False
+        
+        model = build_capacity_model(generate_synthetic_pos_data(weeks=6))
+        profile = model.profile
+        weekend = model.shift_staff('Saturday', 'evening')
+        quiet = model.shift_staff('Monday', 'morning')
+        if 3 <= profile['mean_service_minutes'] <= 8 and weekend > quiet and model.shift_staff('Saturday', 'evening', 1.5) >= weekend:
+            print_status("Workload Profile", True, f"prep {profile['mean_service_minutes']:.1f} min, "
+                         f"Mon AM {quiet} staff, Sat PM {weekend} staff")
+        else:
+            print_status("Workload Profile", False, f"Mon AM {quiet}, Sat PM {weekend}")
+            return False
+        
+        employees = generate_employee_data(num_employees=10)
+        dates = next_week_dates()
+        started = time.perf_counter()
+        for _ in range(100):
+            schedule = build_schedule({}, dates, employees, capacity=model)
+        elapsed = (time.perf_counter() - started) / 100
+        if all(s['staff_needed'] == max(2, model.shift_staff(s['day'], s['shift'])) for s in schedule):
+            print_status("Scheduler Integration", True, f"queueing staffing, {elapsed * 1000:.2f}ms per weekly plan")
+        else:
+            print_status("Scheduler Integration", False)
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("Queueing Capacity Model", False, str(e))
+        return False
+
+def test_precompute():
+    """Test the off-peak precompute scheduler and precomputed schedule results"""
+    print_header("Testing Background Precompute")
+    
+    try:
+        import time
+        import tempfile
+        from datetime import datetime
+        os.environ.setdefault('BOBA_BI_OFFLINE_LLM', '1')
+        import api_common
+        from llm_client import OfflineLLMClient
+        from llm_limiter import LLMLimiter, PRIORITY_BATCH
+        from precompute import PrecomputeScheduler, parse_times, next_run
+        
+        times = parse_times('14:30, 03:00')
+        afternoon = next_run(datetime(2025, 6, 2, 3, 0), times)
+        overnight = next_run(datetime(2025, 6, 2, 15, 0), times)
+        try:
+            parse_times('25:00')
+            rejected = False
+        except ValueError:
+            rejected = True
+        if afternoon == datetime(2025, 6, 2, 14, 30) and overnight == datetime(2025, 6, 3, 3, 0) and rejected:
+            print_status("Run Times", True, "next slot strictly after now, invalid times rejected")
+        else:
+            print_status("Run Times", False, f"{afternoon}, {overnight}")
+            return False
+        
+        # Two "workers" share one lock file: only the one that takes the lock runs the jobs
+        runs = []
+        clock = lambda: datetime(2025, 6, 2, 12, 59, 59, 900000)
+        lock_path = os.path.join(tempfile.mkdtemp(), 'precompute.lock')
+        schedulers = [PrecomputeScheduler({'count': lambda: runs.append(1)}, times='13:00', clock=clock,
+                                          lock_path=lock_path) for _ in range(2)]
+        for scheduler in schedulers:
+            scheduler.start()
+        deadline = time.monotonic() + 5
+        while sum(s.stats()['runs'] + s.stats()['skipped'] for s in schedulers) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.2)
+        stats = [scheduler.stats() for scheduler in schedulers]
+        for scheduler in schedulers:
+            scheduler.stop()
+        owner = next((s for s in stats if s['owner']), stats[0])
+        if (len(runs) == 1 and sorted(s['skipped'] for s in stats) == [0, 1]
+                and owner['next_run'] == '2025-06-03T13:00:00' and owner['jobs']['count']['ok']):
+            print_status("Scheduled Run", True, f"one of two workers ran at 13:00, next {owner['next_run']}")
+        else:
+            print_status("Scheduled Run", False, f"{len(runs)} runs, {stats}")
+            return False
+        
+        api_common.initialize()
+        boba_bi = api_common.boba_bi
+        boba_bi.client.client = OfflineLLMClient(latency_ms=0)
+        limiter = boba_bi.client.limiter = LLMLimiter(requests_per_minute=1000000, tokens_per_minute=1e9)
+        boba_bi.mark_data_changed()
+        history = api_common.schedule_history
+        history_version = history.version
+        status = api_common.precompute.run_now()
+        draft_recorded = history.version != history_version
+        executions = api_common.schedule_flight.stats()['executions']
+        started = time.perf_counter()
+        result = api_common.run_orchestrator(api_common.DEFAULT_SCHEDULE_QUERY)
+        elapsed = time.perf_counter() - started
+        reused = api_common.schedule_flight.stats()['executions'] == executions
+        served_version = history.version
+        api_common.run_orchestrator(api_common.DEFAULT_SCHEDULE_QUERY)
+        if draft_recorded or served_version != history_version + 1 or history.version != served_version:
+            print_status("Draft Recording", False, "precomputed draft recorded before (or more than once after) "
+                         "it was served")
+            return False
+        print_status("Draft Recording", True, "draft kept out of the history until first served, recorded once")
+        if (all(job['ok'] for job in status.values()) and reused and result.get('schedule')
+                and PRIORITY_BATCH in limiter.metrics()['wait_ms']):
+            print_status("Precomputed Schedule", True, f"{len(status)} jobs at batch priority, "
+                         f"served in {elapsed * 1000:.2f}ms without running the agents")
+        else:
+            print_status("Precomputed Schedule", False, f"{status}, reused={reused}")
+            return False
+        
+        boba_bi.mark_data_changed()
+        api_common.run_orchestrator(api_common.DEFAULT_SCHEDULE_QUERY)
+        if api_common.schedule_flight.stats()['executions'] == executions + 1:
+            print_status("Data Change", True, "new data version recomputes")
+        else:
+            print_status("Data Change", False, "stale precomputed result served")
+            return False
+        
+        # Another worker on the same shared POS data: own (empty) result cache, same SQLite file
+        from precompute import ResultCache, SharedResults
+        local_results, local_shared = api_common.schedule_results, api_common.shared_results
+        try:
+            api_common.shared_results = SharedResults(os.path.join(tempfile.mkdtemp(), 'results.sqlite3'))
+            boba_bi.mark_data_changed()
+            api_common.precompute.run_now()
+            api_common.schedule_results = ResultCache()
+            executions = api_common.schedule_flight.stats()['executions']
+            served = api_common.run_orchestrator(api_common.DEFAULT_SCHEDULE_QUERY)
+            loaded = api_common.shared_results.stats()['hits'] == 1
+            reused = api_common.schedule_flight.stats()['executions'] == executions
+        finally:
+            api_common.schedule_results, api_common.shared_results = local_results, local_shared
+        if loaded and reused and served.get('schedule'):
+            print_status("Shared Drafts", True, "a worker without the draft loaded the owner's result")
+        else:
+            print_status("Shared Drafts", False, f"loaded={loaded}, reused={reused}")
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("Background Precompute", False, str(e))
+        return False
+
+def test_backtest():
+    """Test week-by-week backtesting of forecasts and schedules"""
+    print_header("Testing Historical Backtest")
+    
+    try:
+        import time
+        from datetime import datetime
+        from boba_bi import generate_synthetic_pos_data, generate_employee_data
+        from backtest import run_backtest, backtest_weeks, PARALLEL_MIN_WEEKS
+        from traffic_cube import TrafficCube, build_traffic_cube, local_hour_index
+        
+        # Flat demand: 15 orders in every shift hour, so the forecast is exact
+        first = local_hour_index(datetime(2025, 1, 6))
+        flat = [15 if hour % 24 >= 8 else 0 for hour in range(first, first + 10 * 168)]
+        cube = TrafficCube(first, flat, flat, flat)
+        roster = [{'employee_id': i, 'name': f"Staff {i}", 'availability': 'all',
+                   'shift_preference': 'no_preference', 'max_hours_per_week': 40} for i in range(30)]
+        report = run_backtest({'flat': cube}, roster)
+        total = report['total']
+        if (total['weeks'] == 6 and report['weeks'][0]['week'] == '2025-02-03' and total['forecast_mae'] == 0
+                and total['understaffed_hours'] == 0 and total['overstaffed_hours'] == 0
+                and total['hours'] == 6 * 7 * 16 and total['window_scale_staff_hours'] > 0):
+            print_status("Exact Forecast", True, f"{total['weeks']} weeks after 4 weeks of history, MAE 0, "
+                         f"no hours under- or overstaffed; {total['window_scale_staff_hours']} staff hours "
+                         f"from the 28-day summary scale")
+        else:
+            print_status("Exact Forecast", False, str(total))
+            return False
+        
+        history = build_traffic_cube(generate_synthetic_pos_data(weeks=100))
+        employees = generate_employee_data(num_employees=10)
+        first_hour, orders = history.hourly()
+        weeks = backtest_weeks(first_hour, history.n_hours)
+        cutoff = weeks[50] + 168 - first_hour
+        truncated = TrafficCube(first_hour, orders[:cutoff], orders[:cutoff], orders[:cutoff])
+        full = run_backtest({'main': history}, employees, workers=1)['weeks']
+        partial = run_backtest({'main': truncated}, employees, workers=1)['weeks']
+        if len(full) >= 95 and partial == full[:51]:
+            print_status("No Lookahead", True, f"{len(full)} weeks; first 51 unchanged without later data")
+        else:
+            print_status("No Lookahead", False, f"{len(full)} weeks, {len(partial)} truncated")
+            return False
+        
+        stores = {f"store-{i}": history for i in range(PARALLEL_MIN_WEEKS // len(weeks) + 1)}
+        started = time.perf_counter()
+        serial = run_backtest(stores, employees, workers=1)
+        elapsed = time.perf_counter() - started
+        parallel = run_backtest(stores, employees, workers=2)
+        summary = parallel['total']
+        if serial == parallel and summary['weeks'] == len(stores) * len(weeks) and elapsed < 10:
+            print_status("Store Fan-Out", True, f"{summary['weeks']} store-weeks in {elapsed:.2f}s, pool identical; "
+                         f"under {summary['understaffed_rate']:.1%}, over {summary['overstaffed_rate']:.1%}, "
+                         f"MAPE {summary['forecast_mape']:.1f}%")
+        else:
+            print_status("Store Fan-Out", False, f"{summary['weeks']} store-weeks in {elapsed:.2f}s")
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print_status("Historical Backtest", False, str(e))
+        return False
+
+def test_load_test():
+    """Test the load-test harness against a local HTTP server"""
+    print_header("Testing Load-Test Harness")
+    
+    try:
+        import asyncio
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from load_test import parse_mix, run_load
+        
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                status = 500 if self.path == '/api/stats' else 200
+                body = json.dumps({'success': status == 200}).encode()
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            do_GET = do_POST = _reply
+            def log_message(self, *args):
+                pass
+        
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            mix = parse_mix('employees=3,stats=1,pos_batch=1')
+            result = asyncio.run(run_load('127.0.0.1', server.server_port, mix, concurrency=8,
+                                          duration=30, max_requests=200, pid=os.getpid()))
+        finally:
+            server.shutdown()
+        
+        endpoints = result['endpoints']
+        if (result['total']['requests'] == 200 and set(endpoints) == set(mix)
+                and endpoints['stats']['error_rate'] == 1.0 and endpoints['employees']['errors'] == 0
+                and endpoints['employees']['p50_ms'] <= endpoints['employees']['p99_ms']
+                and result['server_memory_mb']['peak'] > 0):
+            print_status("Mixed Load", True, f"{result['total']['throughput_rps']} req/s, "
+                         f"p95 {result['total']['p95_ms']}ms, stats errors counted")
+        else:
+            print_status("Mixed Load", False, json.dumps(result['total']))
+            return False
+        
+        try:
+            parse_mix('nonexistent=1')
+            print_status("Mix Validation", False, "unknown endpoint accepted")
+            return False
+        except ValueError:
+            print_status("Mix Validation", True, "unknown endpoints rejected")
+        
+        return True
+        
+    except Exception as e:
+        print_status("Load-Test Harness", False, str(e))
+        return False
+
+def test_import_time():
+    """Test that importing the modules is fast and free of side effects"""
+    print_header("Testing Import Time")
+    
+    try:
+        import subprocess
+        
+        modules = ['boba_bi', 'api_common', 'supabase_config', 'boba_bi_supabase', 'scenarios', 'schedule_repair']
+        heavy = {'anthropic', 'supabase', 'dotenv', 'flask', 'uvicorn'}
+        budget_ms = 500
+        code = f"import {', '.join(modules)}; print(api_common._initialized)"
+        run = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=60)
+        if run.returncode != 0:
+            print_status("Import", False, run.stderr.strip().splitlines()[-1])
+            return False
+        
+        # "import time: self [us] | cumulative | imported package", nesting shown by indentation
+        cumulative, imported = {}, set()
+        for line in run.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                _, total, name = line.split('|')
+                if total.strip().isdigit():
+                    cumulative[name.strip()] = int(total) / 1000
+                    imported.add(name.strip().split('.')[0])
+        
+        slow = {m: round(cumulative.get(m, 0)) for m in modules if cumulative.get(m, 0) > budget_ms}
+        if slow:
+            print_status("Import Budget", False, f"over {budget_ms}ms: {slow}")
+            return False
+        worst = max(modules, key=lambda m: cumulative.get(m, 0))
+        print_status("Import Budget", True, f"slowest {worst} {cumulative.get(worst, 0):.0f}ms (budget {budget_ms}ms)")
+        
+        if imported & heavy:
+            print_status("Lazy Dependencies", False, f"imported eagerly: {sorted(imported & heavy)}")
+            return False
+        print_status("Lazy Dependencies", True, "no SDK or server imports at module load")
+        
+        if run.stdout.strip() != 'False':
+            print_status("No Side Effects", False, f"import printed: {run.stdout.strip()[:80]}")
+            return False
+        print_status("No Side Effects", True, "server state is built on first use")
+        
+        return True
+        
+    except Exception as e:
+        print_status("Import Time", False, str(e))
+        return False
+
 def test_file_creation():
     """Test file creation capabilities"""
     print_header("Testing File Operations")
@@ -234,6 +2034,31 @@ def main():
         'api_key': test_api_key(),
         'data_generation': test_data_generation(),
         'tool_functions': test_tool_functions(),
+        'weather_provider': test_weather_provider(),
+        'prompt_compaction': test_prompt_compaction(),
+        'offline_llm_client': test_offline_llm_client(),
+        'request_coalescing': test_request_coalescing(),
+        'llm_limiter': test_llm_limiter(),
+        'llm_resilience': test_llm_resilience(),
+        'asgi_server': test_asgi_server(),
+        'conditional_get': test_conditional_get(),
+        'payload_shaping': test_payload_shaping(),
+        'shared_pos': test_shared_pos(),
+        'traffic_cube': test_traffic_cube(),
+        'time_buckets': test_time_buckets(),
+        'supabase_sync': test_supabase_sync(),
+        'pos_ingestion': test_pos_ingestion(),
+        'scenarios': test_scenarios(),
+        'multi_week_horizon': test_multi_week_horizon(),
+        'schedule_repair': test_schedule_repair(),
+        'schedule_history': test_schedule_history(),
+        'traffic_anomalies': test_traffic_anomalies(),
+        'demand_sketches': test_demand_sketches(),
+        'capacity_model': test_capacity_model(),
+        'precompute': test_precompute(),
+        'backtest': test_backtest(),
+        'load_test': test_load_test(),
+        'import_time': test_import_time(),
         'file_operations': test_file_creation(),
         'api_server_deps': test_api_server()
     }
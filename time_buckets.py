@@ -0,0 +1,221 @@
+"""
+Time Bucketing for Boba BI
+Batch conversion of POS timestamps to shop-local weekday / hour buckets
+
+Both traffic analysis paths (in-memory POS data and Supabase) bucket through
+these functions, so a store's evening rush lands in the same shift whether
+its timestamps arrive as naive local strings, UTC ISO strings or epoch
+columns. Conversion uses a per-range table of UTC offsets (one entry per DST
+transition) instead of a timezone lookup per row; numpy is used when
+installed and a pure-Python path otherwise.
+"""
+
+import os
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+try:
+    import numpy as np
+except ImportError:  # Optional - pure-Python fallback below
+    np = None
+
+SHOP_TIMEZONE = os.getenv('SHOP_TIMEZONE', "America/Los_Angeles")  # Naive POS timestamps are local wall-clock time here
+SHIFT_HOURS = {'morning': (8, 16), 'evening': (16, 24)}  # Local [start, end) hours, mirrors FIXED_SHIFTS
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+OFFSET_SCAN_SECONDS = 6 * 3600  # Transitions closer together than this are not expected
+
+
+def get_zone(tz=None) -> ZoneInfo:
+    """ZoneInfo for a name (default SHOP_TIMEZONE) or an existing zone"""
+    if isinstance(tz, ZoneInfo):
+        return tz
+    return ZoneInfo(tz or SHOP_TIMEZONE)
+
+
+def local_now(tz=None) -> datetime:
+    """Current naive wall-clock time in the shop's timezone"""
+    return datetime.now(get_zone(tz)).replace(tzinfo=None)
+
+
+# ============================================================================
+# UTC -> LOCAL CONVERSION
+# ============================================================================
+
+def _utc_offset(zone: ZoneInfo, epoch: int) -> int:
+    return int(datetime.fromtimestamp(epoch, zone).utcoffset().total_seconds())
+
+
+def offset_table(zone: ZoneInfo, start: int, end: int) -> Tuple[List[int], List[int]]:
+    """
+    UTC offsets in effect over epoch seconds [start, end]
+
+    Returns (starts, offsets): offsets[i] applies from starts[i] until
+    starts[i + 1]. Transition instants are located exactly by bisection.
+    """
+    starts, offsets = [start], [_utc_offset(zone, start)]
+    t = start
+    while t < end:
+        nxt = min(t + OFFSET_SCAN_SECONDS, end)
+        if _utc_offset(zone, nxt) != offsets[-1]:
+            lo, hi = t, nxt
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if _utc_offset(zone, mid) == offsets[-1]:
+                    lo = mid
+                else:
+                    hi = mid
+            starts.append(hi)
+            offsets.append(_utc_offset(zone, hi))
+        t = nxt
+    return starts, offsets
+
+
+def epoch_to_local_seconds(epochs: Sequence[int], tz=None):
+    """
+    Local wall-clock seconds (seconds since 1970-01-01 00:00 local) for epoch seconds
+
+    Returns a numpy array when numpy is installed, otherwise a list.
+    """
+    zone = get_zone(tz)
+    if len(epochs) == 0:
+        return []
+    if np is not None:
+        values = np.asarray(epochs, dtype=np.int64)
+        starts, offsets = offset_table(zone, int(values.min()), int(values.max()))
+        index = np.searchsorted(np.asarray(starts, dtype=np.int64), values, side='right') - 1
+        return values + np.asarray(offsets, dtype=np.int64)[index]
+
+    starts, offsets = offset_table(zone, min(epochs), max(epochs))
+    if len(offsets) == 1:
+        offset = offsets[0]
+        return [epoch + offset for epoch in epochs]
+    return [epoch + offsets[bisect_right(starts, epoch) - 1] for epoch in epochs]
+
+
+def epoch_us_to_seconds(column: Sequence[int]):
+    """Epoch microseconds (e.g. a shared_pos ts_us column) to whole epoch seconds"""
+    if np is not None:
+        return np.asarray(column, dtype=np.int64) // 1000000
+    return [us // 1000000 for us in column]
+
+
+# ============================================================================
+# BUCKETING
+# ============================================================================
+
+def _local_seconds(dt: datetime) -> int:
+    return (dt.toordinal() - EPOCH_ORDINAL) * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+def weekday_hour_counts_epoch(epochs: Sequence[int], tz=None, since: Optional[datetime] = None) -> List[int]:
+    """
+    168 counts indexed weekday * 24 + hour (Monday = 0) in the shop's local time
+
+    epochs are POSIX seconds; since is a naive local cutoff (inclusive).
+    """
+    local = epoch_to_local_seconds(epochs, tz)
+    floor = _local_seconds(since) if since is not None else None
+    if np is not None and len(local):
+        values = np.asarray(local, dtype=np.int64)
+        if floor is not None:
+            values = values[values >= floor]
+        # 1970-01-01 was a Thursday (weekday 3)
+        slots = ((values // 86400 + 3) % 7) * 24 + (values % 86400) // 3600
+        return np.bincount(slots, minlength=168).tolist()
+
+    counts = [0] * 168
+    for seconds in local:
+        if floor is not None and seconds < floor:
+            continue
+        counts[((seconds // 86400 + 3) % 7) * 24 + (seconds % 86400) // 3600] += 1
+    return counts
+
+
+def weekday_hour_counts(timestamps: Iterable, tz=None, since: Optional[datetime] = None) -> List[int]:
+    """
+    168 weekday * 24 + hour counts for ISO strings / datetimes
+
+    Naive values are already shop-local wall-clock time and are bucketed as
+    they are parsed; offset-aware values (e.g. UTC from Supabase) are
+    collected and converted to the shop's timezone in one batch.
+    """
+    counts = [0] * 168
+    aware_epochs = []
+    parse = datetime.fromisoformat
+    floor = since or datetime.min
+    for value in timestamps:
+        if value.__class__ is str:
+            try:
+                value = parse(value)
+            except ValueError:  # 'Z' suffix before Python 3.11
+                value = parse(value.replace('Z', '+00:00'))
+        if value.tzinfo is not None:
+            aware_epochs.append(int(value.timestamp()))
+        elif value >= floor:
+            counts[value.weekday() * 24 + value.hour] += 1
+
+    if aware_epochs:
+        for slot, count in enumerate(weekday_hour_counts_epoch(aware_epochs, tz, since)):
+            counts[slot] += count
+    return counts
+
+
+def weekday_hour_slots_epoch(epochs: Sequence[int], tz=None, since: Optional[datetime] = None):
+    """Per-row weekday * 24 + hour slot for epoch seconds, -1 for rows before since (array with numpy)"""
+    local = epoch_to_local_seconds(epochs, tz)
+    floor = _local_seconds(since) if since is not None else None
+    if np is not None and len(local):
+        values = np.asarray(local, dtype=np.int64)
+        slots = ((values // 86400 + 3) % 7) * 24 + (values % 86400) // 3600
+        return slots if floor is None else np.where(values >= floor, slots, -1)
+    return [-1 if floor is not None and seconds < floor else
+            ((seconds // 86400 + 3) % 7) * 24 + (seconds % 86400) // 3600 for seconds in local]
+
+
+def weekday_hour_slots(timestamps: Iterable, tz=None, since: Optional[datetime] = None) -> List[int]:
+    """
+    Per-row weekday * 24 + hour slot for ISO strings / datetimes, -1 before since
+
+    Same conversion rules as weekday_hour_counts(), for callers that
+    aggregate other columns (items, prep time) by slot.
+    """
+    slots, aware, aware_epochs = [], [], []
+    parse = datetime.fromisoformat
+    floor = since or datetime.min
+    for value in timestamps:
+        if value.__class__ is str:
+            try:
+                value = parse(value)
+            except ValueError:  # 'Z' suffix before Python 3.11
+                value = parse(value.replace('Z', '+00:00'))
+        if value.tzinfo is not None:
+            aware.append(len(slots))
+            aware_epochs.append(int(value.timestamp()))
+            slots.append(-1)
+        else:
+            slots.append(value.weekday() * 24 + value.hour if value >= floor else -1)
+
+    if aware_epochs:
+        for position, slot in zip(aware, weekday_hour_slots_epoch(aware_epochs, tz, since)):
+            slots[position] = int(slot)
+    return slots
+
+
+def shift_traffic_summary(counts: List[int], shifts: Dict[str, Tuple[int, int]] = SHIFT_HOURS) -> Dict[str, Dict[str, float]]:
+    """
+    {weekday: {shift: orders / shift hours}} from weekday-hour counts
+
+    Days without any orders inside a shift are omitted, matching the
+    original per-row analysis.
+    """
+    summary = {}
+    for day_index, day in enumerate(WEEKDAYS):
+        base = day_index * 24
+        totals = {name: sum(counts[base + hour] for hour in range(start, end))
+                  for name, (start, end) in shifts.items()}
+        if any(totals.values()):
+            summary[day] = {name: totals[name] / (end - start) for name, (start, end) in shifts.items()}
+    return summary
@@ -0,0 +1,210 @@
+"""
+Streaming Traffic Anomaly Detection for Boba BI
+Flags unusual order volume per local hour as POS events arrive
+
+Each weekday x hour bucket (168 of them) keeps an exponentially weighted
+mean and variance of its hourly order count. Events only increment the
+count of the hour in progress: constant memory and constant work per event.
+When the stream moves past an hour, that hour is scored against its
+bucket and folded into the statistics (hours without orders count as 0).
+
+    z = (orders - mean) / sqrt(max(variance, mean, 1))
+
+The Poisson floor (variance >= mean) keeps quiet buckets from flagging a
+single order. |z| >= ANOMALY_Z_THRESHOLD is an anomaly: spikes are flagged
+while the hour is still open, as soon as its count crosses the bound; drops
+(outages, closures) are flagged when the hour closes. Anomalous hours do not
+update the statistics, so one viral afternoon does not raise next week's
+baseline. Events for hours that have already closed are counted as late and
+ignored.
+
+Usage:
+    detector = TrafficAnomalyDetector()
+    detector.seed_hourly(first_hour, hourly_orders)    # e.g. from a TrafficCube
+    detector.observe_orders(batch)                     # live POS orders
+    detector.anomalies(limit=20)
+"""
+
+import os
+import math
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from traffic_cube import HOURS_PER_WEEK, WEEKDAYS, hour_start, local_hour_index
+
+ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', '3.5'))
+ANOMALY_ALPHA = float(os.getenv('ANOMALY_ALPHA', '0.1'))  # EWMA weight of the newest week
+ANOMALY_MIN_SAMPLES = 4       # Weeks of history a bucket needs before it can flag
+MAX_ANOMALIES = 1000          # Most recent anomalies kept
+MAX_GAP_HOURS = HOURS_PER_WEEK  # Longer silences are a data gap, not a week of zeros
+
+
+def _slot(hour: int) -> int:
+    """Weekday * 24 + hour for a local hour index (ordinal 1 is a Monday)"""
+    return ((hour // 24 - 1) % 7) * 24 + hour % 24
+
+
+class TrafficAnomalyDetector:
+    """Online EWMA detector over hourly order counts per weekday x hour"""
+
+    def __init__(self, z_threshold: float = ANOMALY_Z_THRESHOLD, alpha: float = ANOMALY_ALPHA,
+                 min_samples: int = ANOMALY_MIN_SAMPLES, max_anomalies: int = MAX_ANOMALIES):
+        self.z_threshold = z_threshold
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.mean = [0.0] * HOURS_PER_WEEK
+        self.variance = [0.0] * HOURS_PER_WEEK
+        self.samples = [0] * HOURS_PER_WEEK
+        self.version = 0
+        self.events = 0
+        self.late = 0
+        self.hours_scored = 0
+        self._anomalies = deque(maxlen=max_anomalies)
+        self._hour: Optional[int] = None
+        self._count = 0
+        self._open: Optional[Dict[str, Any]] = None  # Spike flagged in the hour still in progress
+        self._lock = threading.Lock()
+
+    # ----- scoring -----
+
+    def _z(self, slot: int, count: float) -> Optional[float]:
+        if self.samples[slot] < self.min_samples:
+            return None
+        mean = self.mean[slot]
+        return (count - mean) / math.sqrt(max(self.variance[slot], mean, 1.0))
+
+    def _record(self, hour: int, count: int, z: float, status: str) -> Dict[str, Any]:
+        slot = _slot(hour)
+        start = hour_start(hour)
+        anomaly = {
+            'hour': start.isoformat(),
+            'date': start.date().isoformat(),
+            'weekday': WEEKDAYS[slot // 24],
+            'hour_of_day': slot % 24,
+            'orders': count,
+            'expected': round(self.mean[slot], 1),
+            'z': round(z, 2),
+            'kind': 'spike' if z > 0 else 'drop',
+            'status': status,
+            '_hour': hour
+        }
+        self._anomalies.append(anomaly)
+        self.version += 1
+        return anomaly
+
+    def _close(self, hour: int, count: int):
+        """Score a finished hour and fold it into its bucket unless anomalous"""
+        slot = _slot(hour)
+        z = self._z(slot, count)
+        self.hours_scored += 1
+        if z is not None and abs(z) >= self.z_threshold:
+            if self._open is not None:
+                self._open.update(orders=count, z=round(z, 2), status='closed')
+                self.version += 1
+            else:
+                self._record(hour, count, z, 'closed')
+            return
+        if self._open is not None:  # Spike faded below the bound by the end of the hour
+            self._open.update(orders=count, z=round(z, 2) if z is not None else 0.0, status='cleared')
+            self.version += 1
+        # EWMA with a running-average warm-up (weight 1/n until it drops below alpha)
+        self.samples[slot] += 1
+        weight = max(self.alpha, 1.0 / self.samples[slot])
+        diff = count - self.mean[slot]
+        step = weight * diff
+        self.mean[slot] += step
+        self.variance[slot] = (1 - weight) * (self.variance[slot] + diff * step)
+
+    def _advance(self, hour: int):
+        """Close the hour in progress and any silent hours up to (not including) hour"""
+        current = self._hour
+        self._close(current, self._count)
+        self._open = None
+        if hour - current <= MAX_GAP_HOURS:
+            for silent in range(current + 1, hour):
+                self._close(silent, 0)
+        self._hour, self._count = hour, 0
+
+    # ----- input -----
+
+    def observe(self, hour: int, count: int = 1):
+        """Add count orders to local hour index `hour` (O(1) per event)"""
+        with self._lock:
+            self.events += count
+            if self._hour is None:
+                self._hour = hour
+            elif hour < self._hour:
+                self.late += count
+                return
+            elif hour > self._hour:
+                self._advance(hour)
+            self._count += count
+            if self._open is None:
+                z = self._z(_slot(hour), self._count)
+                if z is not None and z >= self.z_threshold:
+                    self._open = self._record(hour, self._count, z, 'open')
+            else:
+                self._open['orders'] = self._count
+                self.version += 1
+
+    def observe_orders(self, orders: Iterable[Dict]):
+        """Feed POS orders with naive shop-local timestamps (ISO strings or datetimes)"""
+        parse = datetime.fromisoformat
+        hours = sorted(local_hour_index(parse(ts) if ts.__class__ is str else ts)
+                       for ts in (order['timestamp'] for order in orders))
+        # A batch may arrive out of order; consecutive orders in one hour are one update
+        start = 0
+        for i in range(1, len(hours) + 1):
+            if i == len(hours) or hours[i] != hours[start]:
+                self.observe(hours[start], i - start)
+                start = i
+
+    def seed_hourly(self, first_hour: int, hourly_orders: Sequence[int]):
+        """Replay an hourly history (e.g. TrafficCube.hourly()); the last hour stays open"""
+        for offset, count in enumerate(hourly_orders):
+            self.observe(first_hour + offset, count)
+
+    # ----- output -----
+
+    def anomalies(self, since: Optional[datetime] = None, limit: Optional[int] = None,
+                  before: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Flagged hours, newest first, starting at or after since and before `before` (naive local)"""
+        floor = local_hour_index(since) if since is not None else None
+        ceiling = local_hour_index(before) if before is not None else None
+        # Rows are updated in place as hours close, so copy them under the lock
+        with self._lock:
+            rows = [a for a in reversed(self._anomalies)
+                    if (floor is None or a['_hour'] >= floor) and (ceiling is None or a['_hour'] < ceiling)]
+            if limit is not None:
+                rows = rows[:limit]
+            return [{k: v for k, v in a.items() if k != '_hour'} for a in rows]
+
+    def count_corrections(self, since: datetime) -> Dict[int, float]:
+        """
+        {weekday * 24 + hour: expected - observed} for anomalous hours since `since`
+
+        Adding these to weekday-hour counts replaces each anomalous hour by
+        its bucket's expected volume, which excludes it from traffic
+        summaries without rescanning transactions.
+        """
+        floor = local_hour_index(since)
+        corrections: Dict[int, float] = {}
+        with self._lock:
+            for anomaly in self._anomalies:
+                if anomaly['_hour'] >= floor and anomaly['status'] != 'cleared':
+                    slot = _slot(anomaly['_hour'])
+                    corrections[slot] = corrections.get(slot, 0.0) + anomaly['expected'] - anomaly['orders']
+        return corrections
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'events': self.events,
+                'late_events': self.late,
+                'hours_scored': self.hours_scored,
+                'anomalies': len(self._anomalies),
+                'current_hour': hour_start(self._hour).isoformat() if self._hour is not None else None,
+                'current_orders': self._count
+            }
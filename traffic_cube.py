@@ -0,0 +1,305 @@
+"""
+Traffic Cube for Boba BI
+Prefix sums over local hourly buckets for arbitrary range / granularity queries
+
+Every query is answered from cumulative sums, so its cost depends only on the
+number of buckets returned, not on how much history is stored:
+
+    cube = build_traffic_cube(pos_data)
+    cube.query(datetime(2025, 6, 1), datetime(2025, 7, 1), 'day')
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from time_buckets import EPOCH_ORDINAL, epoch_to_local_seconds, get_zone
+
+GRANULARITIES = ('hour', 'day', 'week', 'hour_of_week')
+HOURS_PER_WEEK = 168
+MAX_BUCKETS = 10000
+TAIL_HOURS = HOURS_PER_WEEK  # Recent hours each cube copies on write; older ones are shared
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def local_hour_index(dt: datetime) -> int:
+    """Hour number of a naive local datetime (hours since 0001-01-01 00:00)"""
+    return dt.toordinal() * 24 + dt.hour
+
+
+def hour_start(index: int) -> datetime:
+    """Naive local datetime at the start of an hour number"""
+    return datetime.combine(date.fromordinal(index // 24), datetime.min.time()) + timedelta(hours=index % 24)
+
+
+def _hour_of_week(index: int) -> int:
+    # Ordinal 1 (0001-01-01) is a Monday
+    return ((index // 24 - 1) % 7) * 24 + index % 24
+
+
+def _cumulative(values: List[int]) -> List[int]:
+    total, cum = 0, [0]
+    for value in values:
+        total += value
+        cum.append(total)
+    return cum
+
+
+def _strided_cumulative(values: List[int]) -> List[int]:
+    """S[i] = values[i] + values[i-168] + ... (running sum within each hour-of-week)"""
+    strided = list(values)
+    for i in range(HOURS_PER_WEEK, len(strided)):
+        strided[i] += strided[i - HOURS_PER_WEEK]
+    return strided
+
+
+class _Column:
+    """
+    Values [0, len) as a shared append-only head plus a private tail
+
+    Only head[:frozen] belongs to this column. Later cubes append to the same
+    head list, which never changes the entries an earlier cube can see.
+    """
+
+    __slots__ = ('head', 'frozen', 'tail')
+
+    def __init__(self, head: List[int], frozen: int, tail: List[int]):
+        self.head = head
+        self.frozen = frozen
+        self.tail = tail
+
+    def __getitem__(self, i: int) -> int:
+        return self.head[i] if i < self.frozen else self.tail[i - self.frozen]
+
+    def __len__(self) -> int:
+        return self.frozen + len(self.tail)
+
+    def to_list(self) -> List[int]:
+        return self.head[:self.frozen] + self.tail
+
+    def freeze(self, count: int) -> '_Column':
+        """Column with the first count tail values moved to the head"""
+        if len(self.head) == self.frozen:
+            head = self.head  # Nobody appended past our share yet: extend in place
+        else:
+            head = self.head[:self.frozen]
+        head.extend(self.tail[:count])
+        return _Column(head, self.frozen + count, self.tail[count:])
+
+
+def _split(values: List[int], frozen: int) -> _Column:
+    return _Column(values[:frozen], frozen, values[frozen:])
+
+
+def plan_query(start: datetime, end: datetime, granularity: str):
+    """
+    Validate a query and return (start_hour, end_hour, first bucket edge, step)
+
+    Raises ValueError for an unknown granularity, an empty range or a result
+    larger than MAX_BUCKETS.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if end <= start:
+        raise ValueError("end must be after start")
+
+    start_hour, end_hour = local_hour_index(start), local_hour_index(end)
+    if end > hour_start(end_hour):
+        end_hour += 1  # Include the partial last hour
+
+    step = {'hour': 1, 'day': 24, 'week': HOURS_PER_WEEK, 'hour_of_week': HOURS_PER_WEEK}[granularity]
+    # Align bucket edges to local midnight / Monday midnight
+    if granularity == 'day':
+        edge = start_hour - start_hour % 24
+    elif granularity == 'week':
+        edge = start_hour - _hour_of_week(start_hour)
+    else:
+        edge = start_hour
+    if granularity != 'hour_of_week' and (end_hour - edge + step - 1) // step > MAX_BUCKETS:
+        raise ValueError(f"Query would return more than {MAX_BUCKETS} buckets; use a coarser granularity")
+    return start_hour, end_hour, edge, step
+
+
+class TrafficCube:
+    """
+    Orders, items and prep minutes per local hour, stored as prefix sums
+
+    Hours are naive local wall-clock hours (the shop's own day and week
+    boundaries). Plain cumulative sums answer contiguous ranges; per
+    hour-of-week strided sums answer the weekday x hour profile in O(168).
+    """
+
+    MEASURES = ('orders', 'items', 'prep_minutes')
+
+    def __init__(self, first_hour: int, orders: List[int], items: List[int], prep_minutes: List[int]):
+        self.first_hour = first_hour
+        self.n_hours = len(orders)
+        frozen = max(0, self.n_hours - TAIL_HOURS)
+        hourly = {'orders': orders, 'items': items, 'prep_minutes': prep_minutes}
+        self._hourly = {m: _split(hourly[m], frozen) for m in self.MEASURES}
+        self._cum = {m: _split(_cumulative(hourly[m]), frozen + 1) for m in self.MEASURES}
+        self._strided = {m: _split(_strided_cumulative(hourly[m]), frozen) for m in self.MEASURES}
+
+    @classmethod
+    def from_buckets(cls, buckets: Dict[int, List[int]]) -> 'TrafficCube':
+        """Build from {local hour index: [orders, items, prep_minutes]}"""
+        if not buckets:
+            return cls(0, [], [], [])
+        first, last = min(buckets), max(buckets)
+        columns = [[0] * (last - first + 1) for _ in cls.MEASURES]
+        for hour, values in buckets.items():
+            for column, value in zip(columns, values):
+                column[hour - first] += value
+        return cls(first, *columns)
+
+    def with_buckets(self, buckets: Dict[int, List[int]]) -> 'TrafficCube':
+        """
+        New cube with additional orders merged in (copy-on-write)
+
+        Only the last TAIL_HOURS or so are copied: live orders land there,
+        so a batch costs O(tail + hours touched) however long the history
+        is. Older hours are shared with this cube and only ever appended to;
+        orders earlier than the tail rebuild from the earliest hour they
+        touch. Readers holding this cube are unaffected.
+        """
+        if not buckets:
+            return self
+        if not self.n_hours or min(buckets) < self.first_hour:
+            merged = {self.first_hour + i: [self._hourly[m][i] for m in self.MEASURES]
+                      for i in range(self.n_hours) if self._hourly['orders'][i]}
+            for hour, values in buckets.items():
+                bucket = merged.setdefault(hour, [0, 0, 0])
+                for k, value in enumerate(values):
+                    bucket[k] += value
+            return TrafficCube.from_buckets(merged)
+
+        n_hours = max(self.n_hours, max(buckets) - self.first_hour + 1)
+        start = min(min(buckets) - self.first_hour, self.n_hours)
+        frozen = min(self._hourly['orders'].frozen, start)
+        cube = TrafficCube.__new__(TrafficCube)
+        cube.first_hour = self.first_hour
+        cube.n_hours = n_hours
+        cube._hourly, cube._cum, cube._strided = {}, {}, {}
+        for k, m in enumerate(self.MEASURES):
+            old_hourly, old_cum, old_strided = self._hourly[m], self._cum[m], self._strided[m]
+            hourly = [old_hourly[i] for i in range(frozen, self.n_hours)] + [0] * (n_hours - self.n_hours)
+            for hour, values in buckets.items():
+                hourly[hour - self.first_hour - frozen] += values[k]
+            cum = [old_cum[i] for i in range(frozen, start + 1)] + [0] * (n_hours - start)
+            strided = [old_strided[i] for i in range(frozen, start)] + hourly[start - frozen:]
+            for i in range(start, n_hours):
+                cum[i + 1 - frozen] = cum[i - frozen] + hourly[i - frozen]
+                if i >= HOURS_PER_WEEK:
+                    strided[i - frozen] += strided[i - HOURS_PER_WEEK - frozen] if i - HOURS_PER_WEEK >= frozen \
+                        else old_strided[i - HOURS_PER_WEEK]
+            hourly, cum, strided = (_Column(old_hourly.head, frozen, hourly), _Column(old_cum.head, frozen + 1, cum[1:]),
+                                    _Column(old_strided.head, frozen, strided))
+            settled = n_hours - TAIL_HOURS - frozen
+            if settled > TAIL_HOURS:
+                hourly, cum, strided = hourly.freeze(settled), cum.freeze(settled), strided.freeze(settled)
+            cube._hourly[m], cube._cum[m], cube._strided[m] = hourly, cum, strided
+        return cube
+
+    def hourly(self, measure: str = 'orders') -> Tuple[int, List[int]]:
+        """(first local hour index, per-hour values) for one measure"""
+        return self.first_hour, self._hourly[measure].to_list()
+
+    # ----- range sums -----
+
+    def _clamp(self, hour: int) -> int:
+        return min(max(hour - self.first_hour, 0), self.n_hours)
+
+    def totals(self, start_hour: int, end_hour: int) -> Dict:
+        """Sums over local hours [start_hour, end_hour) in O(1)"""
+        a, b = self._clamp(start_hour), self._clamp(end_hour)
+        return self._row({m: self._cum[m][b] - self._cum[m][a] for m in self.MEASURES})
+
+    def _strided_total(self, measure: str, a: int, b: int, residue: int) -> int:
+        """Sum of relative indices i in [a, b) with i % 168 == residue"""
+        first = a + (residue - a) % HOURS_PER_WEEK
+        last = b - 1 - (b - 1 - residue) % HOURS_PER_WEEK
+        if first > last:
+            return 0
+        strided = self._strided[measure]
+        return strided[last] - (strided[first - HOURS_PER_WEEK] if first >= HOURS_PER_WEEK else 0)
+
+    @staticmethod
+    def _row(sums: Dict[str, int]) -> Dict:
+        orders = sums['orders']
+        return {
+            'orders': orders,
+            'items': sums['items'],
+            'mean_prep_minutes': round(sums['prep_minutes'] / orders, 2) if orders else None
+        }
+
+    # ----- queries -----
+
+    def query(self, start: datetime, end: datetime, granularity: str = 'day') -> List[Dict]:
+        """
+        Buckets covering naive local [start, end) at the given granularity
+
+        hour / day / week rows carry 'start' and 'end' (clipped to the
+        requested range); hour_of_week returns 168 rows keyed by weekday and
+        hour, summed over the range.
+        """
+        start_hour, end_hour, edge, step = plan_query(start, end, granularity)
+        if granularity == 'hour_of_week':
+            return self._hour_of_week_profile(start_hour, end_hour)
+
+        rows = []
+        while edge < end_hour:
+            lo, hi = max(edge, start_hour), min(edge + step, end_hour)
+            row = {'start': hour_start(lo).isoformat(), 'end': hour_start(hi).isoformat()}
+            row.update(self.totals(lo, hi))
+            rows.append(row)
+            edge += step
+        return rows
+
+    def _hour_of_week_profile(self, start_hour: int, end_hour: int) -> List[Dict]:
+        a, b = self._clamp(start_hour), self._clamp(end_hour)
+        offset = _hour_of_week(self.first_hour)
+        rows = []
+        for how in range(HOURS_PER_WEEK):
+            residue = (how - offset) % HOURS_PER_WEEK
+            row = {'weekday': WEEKDAYS[how // 24], 'hour': how % 24}
+            row.update(self._row({m: self._strided_total(m, a, b, residue) for m in self.MEASURES}))
+            rows.append(row)
+        return rows
+
+
+# ============================================================================
+# BUILDERS
+# ============================================================================
+
+def buckets_from_transactions(transactions: Iterable[Dict]) -> Dict[int, List[int]]:
+    """{local hour index: [orders, items, prep_minutes]} for transactions with naive local timestamps"""
+    buckets: Dict[int, List[int]] = {}
+    for tx in transactions:
+        hour = local_hour_index(datetime.fromisoformat(tx['timestamp']))
+        bucket = buckets.get(hour)
+        if bucket is None:
+            bucket = buckets[hour] = [0, 0, 0]
+        bucket[0] += 1
+        bucket[1] += tx['items']
+        bucket[2] += tx['prep_time_minutes']
+    return buckets
+
+
+def _buckets_from_hourly(hourly, tz: ZoneInfo) -> Dict[int, List[int]]:
+    """Re-bucket UTC-aligned epoch-hour aggregates (see shared_pos) into local hours"""
+    first_hour, orders, items, prep = hourly
+    occupied = [i for i in range(len(orders)) if orders[i]]
+    local = epoch_to_local_seconds([(first_hour + i) * 3600 for i in occupied], tz)
+    buckets: Dict[int, List[int]] = {}
+    for i, seconds in zip(occupied, local):
+        bucket = buckets.setdefault(int(seconds) // 3600 + EPOCH_ORDINAL * 24, [0, 0, 0])
+        bucket[0] += orders[i]
+        bucket[1] += items[i]
+        bucket[2] += prep[i]
+    return buckets
+
+
+def build_traffic_cube(pos_data, tz: Optional[str] = None) -> TrafficCube:
+    """TrafficCube for a POS store; uses precomputed hourly aggregates when available"""
+    if hasattr(pos_data, 'hourly'):
+        return TrafficCube.from_buckets(_buckets_from_hourly(pos_data.hourly(), get_zone(tz) if tz else pos_data.tz))
+    return TrafficCube.from_buckets(buckets_from_transactions(pos_data))
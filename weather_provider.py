@@ -0,0 +1,154 @@
+"""
+Weather Providers for Boba BI
+Deterministic weather forecasts and numeric traffic multipliers for the scheduler
+"""
+
+import json
+import os
+import hashlib
+import threading
+from datetime import datetime
+from typing import List, Dict, Optional
+
+# ============================================================================
+# WEATHER IMPACT RULES
+# ============================================================================
+
+HOT_WEATHER_F = 75          # Hot weather (>75°F): +20% traffic
+HOT_MULTIPLIER = 1.2
+RAIN_PROBABILITY = 0.5      # Rainy weather: -30% traffic
+RAIN_MULTIPLIER = 0.7
+
+# Typical San Diego daily highs (°F) and rain chance by month, used when no
+# fixture entry exists for a date
+MONTHLY_NORMALS = {
+    1: (65, 0.25), 2: (65, 0.25), 3: (66, 0.20), 4: (68, 0.10),
+    5: (69, 0.05), 6: (71, 0.03), 7: (75, 0.02), 8: (77, 0.02),
+    9: (77, 0.04), 10: (74, 0.08), 11: (70, 0.15), 12: (65, 0.22)
+}
+
+
+def weather_multiplier(forecast: Dict) -> float:
+    """Traffic multiplier for a single day's forecast"""
+    multiplier = 1.0
+    if forecast['high_f'] > HOT_WEATHER_F:
+        multiplier *= HOT_MULTIPLIER
+    if forecast['precip_probability'] >= RAIN_PROBABILITY:
+        multiplier *= RAIN_MULTIPLIER
+    return round(multiplier, 2)
+
+
+def compute_weather_multipliers(forecasts: List[Dict]) -> Dict[str, float]:
+    """Map each forecast date to its traffic multiplier"""
+    return {f['date']: weather_multiplier(f) for f in forecasts}
+
+
+def summarize_weather(forecasts: List[Dict], multipliers: Dict[str, float]) -> str:
+    """Deterministic plain-text summary of forecasts and their traffic impact"""
+    if not forecasts:
+        return "Weather analysis unavailable. Assuming baseline traffic."
+
+    lines = [f"Weather forecast for {forecasts[0]['location']}:"]
+    for f in forecasts:
+        day_name = datetime.fromisoformat(f['date']).strftime('%A')
+        change = round((multipliers[f['date']] - 1.0) * 100)
+        impact = f"{change:+d}% traffic" if change else "baseline traffic"
+        lines.append(
+            f"- {f['date']} ({day_name}): {f['condition']}, high {f['high_f']}°F, "
+            f"{int(f['precip_probability'] * 100)}% chance of rain -> {impact}"
+        )
+    return "\n".join(lines)
+
+
+# ============================================================================
+# PROVIDERS
+# ============================================================================
+
+class WeatherProvider:
+    """Base class for weather sources with a per-location, per-day cache"""
+
+    def __init__(self):
+        self._cache: Dict[tuple, Dict] = {}
+        self._lock = threading.Lock()
+
+    def fetch_forecast(self, location: str, date: str) -> Dict:
+        """Fetch the forecast for one location and day (implemented by subclasses)"""
+        raise NotImplementedError
+
+    def get_forecasts(self, location: str, dates: List[str]) -> List[Dict]:
+        """Return forecasts for each date, fetching only uncached days"""
+        forecasts = []
+        for date in dates:
+            key = (location, date)
+            with self._lock:
+                forecast = self._cache.get(key)
+            if forecast is None:
+                forecast = self.fetch_forecast(location, date)
+                with self._lock:
+                    self._cache[key] = forecast
+            forecasts.append(forecast)
+        return forecasts
+
+    def clear_cache(self):
+        """Drop all cached forecasts"""
+        with self._lock:
+            self._cache.clear()
+
+
+class FixtureWeatherProvider(WeatherProvider):
+    """
+    Local weather provider backed by a JSON fixture file
+
+    Fixture format:
+    {
+        "San Diego, CA": {
+            "2025-10-27": {"high_f": 78, "low_f": 62, "precip_probability": 0.1}
+        }
+    }
+
+    Dates missing from the fixture get a deterministic forecast derived from
+    monthly climate normals, so the same location and date always produce the
+    same weather.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__()
+        self.fixture: Dict[str, Dict[str, Dict]] = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.fixture = json.load(f)
+
+    def fetch_forecast(self, location: str, date: str) -> Dict:
+        entry = self.fixture.get(location, {}).get(date)
+        if entry is None:
+            entry = self._climate_forecast(location, date)
+
+        high_f = entry['high_f']
+        precip = entry.get('precip_probability', 0.0)
+        if precip >= RAIN_PROBABILITY:
+            condition = 'rain'
+        elif high_f > HOT_WEATHER_F:
+            condition = 'hot'
+        else:
+            condition = entry.get('condition', 'mild')
+
+        return {
+            'location': location,
+            'date': date,
+            'high_f': high_f,
+            'low_f': entry.get('low_f', high_f - 14),
+            'precip_probability': precip,
+            'condition': condition
+        }
+
+    @staticmethod
+    def _climate_forecast(location: str, date: str) -> Dict:
+        """Deterministic pseudo-forecast seeded by location and date"""
+        digest = hashlib.sha256(f"{location}|{date}".encode()).digest()
+        normal_high, rain_chance = MONTHLY_NORMALS[datetime.fromisoformat(date).month]
+
+        high_f = normal_high + (digest[0] % 11) - 5
+        rainy = digest[1] / 255 < rain_chance
+        precip = round(0.6 + (digest[2] % 40) / 100, 2) if rainy else round((digest[2] % 20) / 100, 2)
+
+        return {'high_f': high_f, 'low_f': high_f - 10 - digest[3] % 6, 'precip_probability': precip}